@@ -50,6 +50,6 @@ cdef extern from "JavaScriptCore/JSBase.h":
     ctypedef OpaqueJSValue* JSValueRef
     ctypedef OpaqueJSValue* JSObjectRef
     
-    JSValueRef JSEvaluateScript(JSContextRef ctx, JSStringRef script, JSObjectRef thisObject, JSStringRef sourceURL, int startingLineNumber, JSValueRef* exception)
+    JSValueRef JSEvaluateScript(JSContextRef ctx, JSStringRef script, JSObjectRef thisObject, JSStringRef sourceURL, int startingLineNumber, JSValueRef* exception) nogil
     bool JSCheckScriptSyntax(JSContextRef ctx, JSStringRef script, JSStringRef sourceURL, int startingLineNumber, JSValueRef* exception)
     void JSGarbageCollect(JSContextRef ctx)
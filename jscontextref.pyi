@@ -1,6 +1,8 @@
 cdef extern from "JavaScriptCore/JSContextRef.h":
     JSObjectRef JSContextGetGlobalObject(JSContextRef ctx)
 
+    JSGlobalContextRef JSContextGetGlobalContext(JSContextRef ctx)
+
     JSContextGroupRef JSContextGroupCreate()
 
     void JSContextGroupRelease(JSContextGroupRef group)
@@ -29,6 +29,9 @@ cdef extern from "JavaScriptCore/JSObjectRef.h":
 
     ctypedef struct JSClassDefinition
 
+    enum :
+        kJSClassAttributeNone, kJSClassAttributeNoAutomaticPrototype
+
     ctypedef unsigned JSClassAttributes
 
     ctypedef void (*JSObjectInitializeCallback) (
@@ -110,11 +113,13 @@ cdef extern from "JavaScriptCore/JSObjectRef.h":
 
     JSClassRef JSClassCreate(JSClassDefinition* definition)
 
+    void JSClassRelease(JSClassRef jsClass)
+
     JSValueRef JSObjectCallAsFunction(JSContextRef ctx, JSObjectRef object,
                                       JSObjectRef thisObject,
                                       size_t argumentCount,
                                       JSValueRef arguments[],
-                                      JSValueRef* exception)
+                                      JSValueRef* exception) nogil
 
     JSPropertyNameArrayRef JSObjectCopyPropertyNames(JSContextRef ctx,
                                                      JSObjectRef object)
@@ -129,6 +134,8 @@ cdef extern from "JavaScriptCore/JSObjectRef.h":
                                    JSStringRef propertyName,
                                    JSValueRef* exception)
 
+    JSValueRef JSObjectGetPrototype(JSContextRef ctx, JSObjectRef object)
+
     JSValueRef JSObjectGetPropertyAtIndex(JSContextRef ctx,
                                           JSObjectRef object,
                                           unsigned propertyIndex,
@@ -137,13 +144,17 @@ cdef extern from "JavaScriptCore/JSObjectRef.h":
     bool JSObjectHasProperty(JSContextRef ctx, JSObjectRef object,
                              JSStringRef propertyName)
 
-    JSObjectIsConstructor(JSContextRef ctx, JSObjectRef object)
+    bool JSObjectIsConstructor(JSContextRef ctx, JSObjectRef object)
 
     bool JSObjectIsFunction(JSContextRef ctx, JSObjectRef object)
 
     JSObjectRef JSObjectMake(JSContextRef ctx, JSClassRef jsClass,
                              void *data)
 
+    JSObjectRef JSObjectMakeArray(JSContextRef ctx, size_t argumentCount,
+                                  JSValueRef arguments[],
+                                  JSValueRef* exception)
+
     JSObjectRef JSObjectMakeError(JSContextRef ctx, size_t argumentCount,
                                   JSValueRef arguments[],
                                   JSValueRef* exception)
@@ -159,6 +170,9 @@ cdef extern from "JavaScriptCore/JSObjectRef.h":
                              JSPropertyAttributes attributes,
                              JSValueRef* exception)
 
+    void JSObjectSetPrototype(JSContextRef ctx, JSObjectRef object,
+                              JSValueRef value)
+
     void JSObjectSetPropertyAtIndex(JSContextRef ctx, JSObjectRef object,
                                     unsigned propertyIndex,
                                     JSValueRef value, JSValueRef* exception)
@@ -27,15 +27,34 @@ cdef extern from "JavaScriptCore/JSValueRef.h":
 
     JSType JSValueGetType(JSContextRef ctx, JSValueRef value)
 
+    ctypedef enum JSTypedArrayType:
+         kJSTypedArrayTypeInt8Array, kJSTypedArrayTypeInt16Array,
+         kJSTypedArrayTypeInt32Array, kJSTypedArrayTypeUint8Array,
+         kJSTypedArrayTypeUint8ClampedArray, kJSTypedArrayTypeUint16Array,
+         kJSTypedArrayTypeUint32Array, kJSTypedArrayTypeFloat32Array,
+         kJSTypedArrayTypeFloat64Array, kJSTypedArrayTypeArrayBuffer,
+         kJSTypedArrayTypeNone
+
+    JSTypedArrayType JSValueGetTypedArrayType(JSContextRef ctx,
+                                              JSValueRef value,
+                                              JSValueRef* exception)
+
     bool JSValueIsObjectOfClass(JSContextRef ctx, JSValueRef value,
                                 JSClassRef jsClass)
     
     bool JSValueIsObject(JSContextRef ctx, JSValueRef value)
 
+    bool JSValueIsArray(JSContextRef ctx, JSValueRef value)
+
     bool JSValueIsStrictEqual(JSContextRef ctx, JSValueRef a, JSValueRef b)
 
+    bool JSValueIsInstanceOfConstructor(JSContextRef ctx, JSValueRef value,
+                                        JSObjectRef constructor,
+                                        JSValueRef* exception)
+
     bool JSValueIsUndefined(JSContextRef ctx, JSValueRef value)
 
+
     JSValueRef JSValueMakeBoolean(JSContextRef ctx, bool boolean)
 
     JSValueRef JSValueMakeNull(JSContextRef ctx)
@@ -46,6 +65,12 @@ cdef extern from "JavaScriptCore/JSValueRef.h":
 
     JSValueRef JSValueMakeUndefined(JSContextRef ctx)
 
+    JSValueRef JSValueMakeFromJSONString(JSContextRef ctx, JSStringRef string)
+
+    JSStringRef JSValueCreateJSONString(JSContextRef ctx, JSValueRef value,
+                                        unsigned indent,
+                                        JSValueRef* exception)
+
     bool JSValueToBoolean(JSContextRef ctx, JSValueRef value)
 
     void JSValueProtect(JSContextRef ctx, JSValueRef value)
@@ -26,10 +26,23 @@ Two-way binding between CPython and WebKit's JavaScriptCore.
 
 import sys
 import types
+import inspect
 import collections
-import weakref
-
+import collections.abc
+import threading
+import queue
+import contextlib
+import asyncio
+import concurrent.futures
+
+cimport cython
 from cpython cimport bool as py_bool
+from cpython.object cimport Py_LT, Py_LE, Py_EQ, Py_NE, Py_GT
+from cpython.list cimport PyList_GET_ITEM, PyList_GET_SIZE
+from cpython.tuple cimport PyTuple_GET_ITEM, PyTuple_GET_SIZE
+from cpython.buffer cimport PyObject_CheckBuffer, PyObject_GetBuffer, \
+    PyBuffer_Release, PyBUF_C_CONTIGUOUS, PyBUF_FORMAT, PyBUF_WRITABLE, \
+    PyBUF_ND, PyBUF_STRIDES
 cdef:
     ctypedef unsigned short bool
 
@@ -40,6 +53,7 @@ include "jscontextref.pyi"
 include "jsstringref.pyi"
 include "jsvalueref.pyi"
 include "jsobjectref.pyi"
+include "jstypedarray.pyi"
 
 
 #
@@ -73,44 +87,194 @@ Null = NullType()
 
 
 #
-# Value conversion
+# Pointer tables
 #
 
-# Wrapper cache. All attempts at wrapping a single object should
-# return the same wrapper. This way, there is a one-to-one
-# relationship between wrappers and their wrapped objects. The
-# following dictionaries maintain this relationship:
+# Native hash tables associating pointers to pointers. They use open
+# addressing with linear probing. Keys are never NULL, so that NULL
+# marks the empty slots.
+
+ctypedef struct _PtrTable:
+    # Number of entries.
+    Py_ssize_t used
+    # Number of slots minus one. The number of slots is a power of 2.
+    size_t mask
+    void **keys
+    void **values
+
+# Initial number of slots.
+DEF PTR_TABLE_MIN_SIZE = 16
+
+cdef inline size_t ptrHash(void *key):
+    cdef size_t h = <size_t>key
+
+    # Pointers are aligned, so their low bits are mixed with the
+    # higher ones.
+    h ^= h >> 16
+    h *= 0x45d9f3b
+    h ^= h >> 16
+    return h
+
+cdef _PtrTable *ptrTableNew() except NULL:
+    """Create an empty table."""
+    cdef _PtrTable *table = <_PtrTable *>malloc(sizeof(_PtrTable))
+
+    if table == NULL:
+        raise MemoryError
+    table.used = 0
+    table.mask = PTR_TABLE_MIN_SIZE - 1
+    table.keys = <void **>calloc(PTR_TABLE_MIN_SIZE, sizeof(void *))
+    table.values = <void **>calloc(PTR_TABLE_MIN_SIZE, sizeof(void *))
+    if table.keys == NULL or table.values == NULL:
+        ptrTableFree(table)
+        raise MemoryError
+    return table
+
+cdef void ptrTableFree(_PtrTable *table):
+    free(table.keys)
+    free(table.values)
+    free(table)
+
+cdef inline size_t ptrTableSlot(_PtrTable *table, void *key):
+    """Return the slot holding ``key``, or the empty slot where it
+    would be inserted."""
+    cdef size_t i = ptrHash(key) & table.mask
+
+    while table.keys[i] != NULL and table.keys[i] != key:
+        i = (i + 1) & table.mask
+    return i
+
+cdef inline void *ptrTableGet(_PtrTable *table, void *key):
+    """Return the value associated to ``key``, or NULL if there is
+    none."""
+    return table.values[ptrTableSlot(table, key)]
+
+cdef int ptrTableResize(_PtrTable *table, size_t size) except -1:
+    """Move the entries of ``table`` to ``size`` new slots."""
+    cdef void **oldKeys = table.keys
+    cdef void **oldValues = table.values
+    cdef size_t oldSize = table.mask + 1
+    cdef void **keys = <void **>calloc(size, sizeof(void *))
+    cdef void **values = <void **>calloc(size, sizeof(void *))
+    cdef size_t i, j
+
+    if keys == NULL or values == NULL:
+        free(keys)
+        free(values)
+        raise MemoryError
+
+    table.keys = keys
+    table.values = values
+    table.mask = size - 1
+    for j in range(oldSize):
+        if oldKeys[j] != NULL:
+            i = ptrTableSlot(table, oldKeys[j])
+            table.keys[i] = oldKeys[j]
+            table.values[i] = oldValues[j]
+
+    free(oldKeys)
+    free(oldValues)
+    return 0
+
+cdef int ptrTableSet(_PtrTable *table, void *key,
+                     void *value) except -1:
+    """Associate ``value`` to ``key``."""
+    cdef size_t i = ptrTableSlot(table, key)
+
+    if table.keys[i] == NULL:
+        # Keep at least one third of the slots empty.
+        if 3 * <size_t>(table.used + 1) > 2 * (table.mask + 1):
+            ptrTableResize(table, 2 * (table.mask + 1))
+            i = ptrTableSlot(table, key)
+        table.keys[i] = key
+        table.used += 1
+    table.values[i] = value
+    return 0
+
+cdef void ptrTableRemove(_PtrTable *table, void *key):
+    """Remove ``key`` from the table, if present."""
+    cdef size_t i = ptrTableSlot(table, key)
+    cdef size_t j = i
+    cdef size_t k
+
+    if table.keys[i] == NULL:
+        return
+
+    # Move back the following entries of the cluster that would
+    # otherwise become unreachable from their home slot ``k``.
+    while True:
+        j = (j + 1) & table.mask
+        if table.keys[j] == NULL:
+            break
+        k = ptrHash(table.keys[j]) & table.mask
+        if (i < j and i < k <= j) or (i > j and (k > i or k <= j)):
+            continue
+        table.keys[i] = table.keys[j]
+        table.values[i] = table.values[j]
+        i = j
+
+    table.keys[i] = NULL
+    table.values[i] = NULL
+    table.used -= 1
 
-# A dictionary associating wrapped JavaScript objects to their Python
-# wrappers.  Keys are pointers to JavaScript objects cast to long int
-# (and converted to Python integers to store them in the
-# dictionary). Values are (weak references to) the corresponding
-# wrappers. Notice that casting to the long type is necessary because
-# pointers are larger than plain ints in 64-bit platforms.
-cdef object _pyWrappedJSObjs = weakref.WeakValueDictionary()
 
-# A dictionary associating wrapped Python objects to their JavaScript
-# wrappers. Keys are ids of Python objects, as returned by the id()
-# function. Values are pointers to the corresponding JavaScript
-# wrappers enclosed in PyCapsule instances. Wrappers are deleted from
-# this dictionary when they get garbage collected (see pyObjFinalize).
-cdef object _pyWrappedPyObjs = {}
+#
+# Value conversion
+#
 
+# Wrapper caches. All attempts at wrapping a single object in a
+# context should return the same wrapper. This way, there is a
+# one-to-one relationship between wrappers and their wrapped
+# objects. Every JSContext owns two pointer tables maintaining this
+# relationship:
+#
+# - jsWrappers associates wrapped JavaScript objects to their Python
+#   wrappers. Values are borrowed references, wrappers remove
+#   themselves from the table when they are deallocated.
+#
+# - pyWrappers associates wrapped Python objects to the private data
+#   of their JavaScript wrappers (see _PyWrapperData). Entries are
+#   removed when the wrappers get garbage collected (see
+#   pyObjFinalize).
+
+# Private data of the JavaScript wrappers for Python objects.
+ctypedef struct _PyWrapperData:
+    # The wrapped object. The wrapper owns a reference to it.
+    void *pyObj
+    JSObjectRef jsObject
+    # The pyWrappers table containing the wrapper, or NULL if the
+    # context owning the table is gone.
+    _PtrTable *cache
+    # The _ExposedClass of the wrapper, or NULL for generic wrappers.
+    # Exposed classes are never freed, so this reference is borrowed.
+    void *exposed
+    # The adopted JSContext owning the wrapper (see contextFromJS), or
+    # NULL. The wrapper owns a reference to it.
+    void *ctx
+
+cdef inline object pyObjectFromJS(JSObjectRef jsObj):
+    """Return the Python object wrapped by ``jsObj``."""
+    return <object>(<_PyWrapperData *>JSObjectGetPrivate(jsObj)).pyObj
 
 cdef object wrapJSObject(JSContextRef jsCtx, JSValueRef jsValue):
+    cdef JSContext ctx = contextFromJS(jsCtx)
+    cdef void *cached = ptrTableGet(ctx.jsWrappers, <void *>jsValue)
+    cdef JSTypedArrayType arrayType
     cdef object wrapper
 
-    try:
-        return _pyWrappedJSObjs[<long>jsValue]
-    except KeyError:
-        pass
+    if cached != NULL:
+        return <object>cached
 
     if JSObjectIsFunction(jsCtx, jsValue):
         wrapper = makeJSFunction(jsCtx, jsValue)
     else:
-        wrapper = makeJSObject(jsCtx, jsValue)
+        arrayType = JSValueGetTypedArrayType(jsCtx, jsValue, NULL)
+        if arrayType != kJSTypedArrayTypeNone:
+            wrapper = makeJSTypedArray(jsCtx, jsValue, arrayType)
+        else:
+            wrapper = makeJSObject(jsCtx, jsValue)
 
-    _pyWrappedJSObjs[<long>jsValue] = wrapper
+    ptrTableSet(ctx.jsWrappers, <void *>jsValue, <void *>wrapper)
     return wrapper
 
 cdef object jsToPython(JSContextRef jsCtx, JSValueRef jsValue):
@@ -139,91 +303,866 @@ cdef object jsToPython(JSContextRef jsCtx, JSValueRef jsValue):
     elif jsType == kJSTypeString:
         jsStr = JSValueToStringCopy(jsCtx, jsValue, NULL)
         try:
-            return PyUnicode_DecodeUTF16(<Py_UNICODE*>JSStringGetCharactersPtr(jsStr),
-                                         JSStringGetLength(jsStr) * 2,
-                                         NULL, 0)
+            return pyStringFromJS(jsStr)
         finally:
             JSStringRelease(jsStr)
     elif JSValueIsObjectOfClass(jsCtx, jsValue, pyObjectClass):
         # This is a wrapped Python object. Just unwrap it.
-        return <object>JSObjectGetPrivate(jsValue)
-    else:
-        return wrapJSObject(jsCtx, jsValue)
+        return pyObjectFromJS(<JSObjectRef>jsValue)
+    elif _jsConverters:
+        pyValue = convertJSObject(jsCtx, jsValue)
+        if pyValue is not _missing:
+            return pyValue
+
+    return wrapJSObject(jsCtx, jsValue)
 
 class JSException(Exception):
     """Python exception class to encapsulate JavaScript exceptions."""
 
-    def __init__(self, pyWrapped):
+    def __init__(self, pyWrapped, name=None, message=None):
         """Create a JavaScript exception object.#
 
         The parameter is the original exception object thrown by the
-        JavaScript code, wrapped as a Python object."""
+        JavaScript code, wrapped as a Python object. ``name`` and
+        ``message`` are looked up in it unless they are given."""
         self.pyWrapped = pyWrapped
-        try:
-            self.name = pyWrapped.name
-        except AttributeError:
-            self.name = '<Unknown error>'
-        try:
-            self.message = pyWrapped.message
-        except AttributeError:
-            self.message = '<no message>'
+        if name is not None:
+            self.name = name
+        else:
+            try:
+                self.name = pyWrapped.name
+            except AttributeError:
+                self.name = '<Unknown error>'
+        if message is not None:
+            self.message = message
+        else:
+            try:
+                self.message = pyWrapped.message
+            except AttributeError:
+                self.message = '<no message>'
 
     def __str__(self):
         return self.message
 
 cdef object jsExceptionToPython(JSContextRef jsCtx, JSValueRef jsException):
-    """Factory function for creating exception objects."""
-    return JSException(jsToPython(jsCtx, jsException))
+    """Factory function for creating exception objects.
+
+    The name and message of JavaScript objects are read directly,
+    without going through their Python wrappers."""
+    cdef JSObjectRef jsObject = <JSObjectRef>jsException
+    cdef object name = '<Unknown error>'
+    cdef object message = '<no message>'
+
+    if not JSValueIsObject(jsCtx, jsException) or \
+            JSValueIsObjectOfClass(jsCtx, jsException, pyObjectClass):
+        return JSException(jsToPython(jsCtx, jsException))
 
+    if JSObjectHasProperty(jsCtx, jsObject, jsErrorNameName):
+        name = jsToPython(jsCtx, JSObjectGetProperty(jsCtx, jsObject,
+                                                     jsErrorNameName, NULL))
+    if JSObjectHasProperty(jsCtx, jsObject, jsErrorMessageName):
+        message = jsToPython(jsCtx,
+                             JSObjectGetProperty(jsCtx, jsObject,
+                                                 jsErrorMessageName, NULL))
+    return JSException(wrapJSObject(jsCtx, jsException), name, message)
+
+
+# String conversion. Strings are copied between JavaScriptCore's UTF-16
+# buffers and the compact PEP 393 representation of Python strings
+# directly, without going through an intermediate encoding.
+
+# Byte order argument for PyUnicode_DecodeUTF16 selecting the native
+# byte order, which is the one used by JSStringRef buffers.
+cdef int _utf16NativeOrder = -1 if sys.byteorder == 'little' else 1
+
+# Strings up to this length are converted using a buffer on the stack.
+DEF STACK_STRING_SIZE = 128
 
 cdef object pyStringFromJS(JSStringRef jsString):
-    return PyUnicode_DecodeUTF16(<Py_UNICODE *>JSStringGetCharactersPtr(jsString),
-                                 JSStringGetLength(jsString) * 2,
-                                 NULL, 0)
+    """Create a Python string from a ``JSString``.
+
+    The result uses the narrowest PEP 393 representation able to hold
+    the string's characters."""
+    cdef JSChar *chars = JSStringGetCharactersPtr(jsString)
+    cdef Py_ssize_t length = JSStringGetLength(jsString)
+    cdef JSChar maxChar = 0
+    cdef JSChar c
+    cdef Py_ssize_t i
+    cdef Py_UCS1 *data
+    cdef int byteOrder = _utf16NativeOrder
+    cdef object pyStr
+
+    for i in range(length):
+        c = chars[i]
+        if c >= 0xd800 and c <= 0xdfff:
+            # Surrogates have to be combined by the UTF-16
+            # decoder. Lone surrogates are passed through as is,
+            # since they are legal in JavaScript strings.
+            return PyUnicode_DecodeUTF16(<char *>chars, length * 2,
+                                         "surrogatepass", &byteOrder)
+        if c > maxChar:
+            maxChar = c
+
+    pyStr = PyUnicode_New(length, maxChar)
+    if maxChar < 0x100:
+        # ASCII or Latin-1, narrow the characters to one byte each.
+        data = <Py_UCS1 *>PyUnicode_DATA(pyStr)
+        for i in range(length):
+            data[i] = <Py_UCS1>chars[i]
+    else:
+        # UCS-2 has the same layout as surrogate-free UTF-16.
+        memcpy(PyUnicode_DATA(pyStr), chars, length * sizeof(JSChar))
+
+    return pyStr
 
-cdef JSStringRef createJSStringFromPython(object pyStr):
+cdef JSStringRef createJSStringFromUnicode(unicode pyStr) except NULL:
+    """Create a ``JSString`` from a Python string.
+
+    This is a create function. Ownership of the result is transferred
+    to the caller."""
+    cdef JSChar stackBuf[STACK_STRING_SIZE]
+    cdef JSChar *buf = stackBuf
+    cdef Py_ssize_t length
+    cdef Py_ssize_t bufLength
+    cdef Py_ssize_t i, j
+    cdef int kind
+    cdef void *data
+    cdef Py_UCS4 c
+    cdef JSStringRef jsStr
+
+    PyUnicode_READY(pyStr)
+    length = PyUnicode_GET_LENGTH(pyStr)
+    kind = PyUnicode_KIND(pyStr)
+    data = PyUnicode_DATA(pyStr)
+
+    if kind == PyUnicode_2BYTE_KIND:
+        # UCS-2 data already is valid UTF-16.
+        return JSStringCreateWithCharacters(<JSChar *>data, length)
+
+    if PyUnicode_IS_ASCII(pyStr) and strlen(<char *>data) == length:
+        # ASCII data is valid (null terminated) UTF-8, which lets
+        # JavaScriptCore keep the string in its compact 8-bit form.
+        return JSStringCreateWithUTF8CString(<char *>data)
+
+    # Latin-1 characters have to be widened, and characters outside
+    # the BMP must be split into surrogate pairs.
+    bufLength = length
+    if kind == PyUnicode_4BYTE_KIND:
+        for i in range(length):
+            if (<Py_UCS4 *>data)[i] > 0xffff:
+                bufLength += 1
+
+    if bufLength > STACK_STRING_SIZE:
+        buf = <JSChar *>malloc(bufLength * sizeof(JSChar))
+        if buf == NULL:
+            raise MemoryError
+
+    if kind == PyUnicode_1BYTE_KIND:
+        for i in range(length):
+            buf[i] = (<Py_UCS1 *>data)[i]
+    else:
+        j = 0
+        for i in range(length):
+            c = (<Py_UCS4 *>data)[i]
+            if c > 0xffff:
+                c -= 0x10000
+                buf[j] = <JSChar>(0xd800 + (c >> 10))
+                buf[j + 1] = <JSChar>(0xdc00 + (c & 0x3ff))
+                j += 2
+            else:
+                buf[j] = <JSChar>c
+                j += 1
+
+    jsStr = JSStringCreateWithCharacters(buf, bufLength)
+    if buf != stackBuf:
+        free(buf)
+    return jsStr
+
+cdef JSStringRef createJSStringFromPython(object pyStr) except NULL:
     """Create a ``JSString`` from a Python object.
 
+    Objects other than strings are converted to strings first. This
+    is a create function. Ownership of the result is transferred to
+    the caller."""
+    if type(pyStr) is not unicode:
+        pyStr = unicode(pyStr)
+    return createJSStringFromUnicode(pyStr)
+
+cdef JSStringRef createJSStringFromUTF8(bytes data) except NULL:
+    """Create a ``JSString`` from UTF-8 encoded bytes, without decoding
+    them into a Python string first.
+
     This is a create function. Ownership of the result is transferred
     to the caller."""
-    pyStr = unicode(pyStr).encode('utf-8')
-    return JSStringCreateWithUTF8CString(pyStr)
+    cdef char *chars = data
 
-cdef JSObjectRef wrapPyObject(JSContextRef jsCtx, object pyValue):
-    cdef JSObjectRef wrapper
+    if strlen(chars) != len(data):
+        raise ValueError, "embedded null byte"
+    return JSStringCreateWithUTF8CString(chars)
 
-    try:
-        return <JSObjectRef>PyCapsule_GetPointer(_pyWrappedPyObjs[id(pyValue)], NULL)
-    except KeyError:
-        pass
 
-    wrapper = makePyObject(jsCtx, pyValue)
-    _pyWrappedPyObjs[id(pyValue)] = PyCapsule_New(wrapper, NULL, NULL)
-    return wrapper
+cdef class _JSString:
+    """Owner of a ``JSStringRef`` holding arbitrary text, such as the
+    source of a script.
+
+    The string is released when the object is garbage collected.
+    Property names use ``_JSName`` instead."""
+
+    cdef JSStringRef jsStr
+
+    def __dealloc__(self):
+        if self.jsStr != NULL:
+            JSStringRelease(self.jsStr)
 
-cdef JSValueRef pythonToJS(JSContextRef jsCtx, object pyValue):
+cdef _JSString makeJSString(object pyStr):
+    """Factory function for '_JSString' instances, holding the text of
+    ``pyStr`` (see ``createJSStringFromPython``)."""
+    cdef _JSString jsString = _JSString.__new__(_JSString)
+    jsString.jsStr = createJSStringFromPython(pyStr)
+    return jsString
+
+
+# Property name cache. Wrappers look up the same few property names
+# over and over again, so the ``JSStringRef`` objects created for
+# textual names are kept in a bounded cache shared by all wrapper
+# classes. The least recently used name is evicted when the cache is
+# full.
+
+cdef class _JSName:
+    """Owner of a ``JSStringRef`` used as a property name.
+
+    The string is released when the object is garbage collected, so
+    callers only need to keep a reference to the ``_JSName`` instance
+    for as long as they use its ``jsStr`` member."""
+
+    cdef JSStringRef jsStr
+
+    def __dealloc__(self):
+        if self.jsStr != NULL:
+            JSStringRelease(self.jsStr)
+
+cdef _JSName makeJSName(JSStringRef jsStr):
+    """Factory function for '_JSName' instances. Ownership of
+    ``jsStr`` is transferred to the new object."""
+    cdef _JSName jsName = _JSName.__new__(_JSName)
+    jsName.jsStr = jsStr
+    return jsName
+
+# Maximum number of names kept in the cache.
+cdef Py_ssize_t _jsNameCacheSize = 256
+
+# Cached names, in least to most recently used order. Keys are Python
+# strings, values are _JSName instances.
+cdef object _jsNameCache = collections.OrderedDict()
+
+cdef long _jsNameCacheHits = 0
+cdef long _jsNameCacheMisses = 0
+
+cdef _JSName jsNameFromPython(object pyName):
+    """Return a ``_JSName`` for the property name ``pyName``.
+
+    Textual names are served from the name cache. Other objects are
+    converted to strings as ``createJSStringFromPython`` does, but are
+    never cached."""
+    global _jsNameCacheHits, _jsNameCacheMisses
+    cdef _JSName jsName
+
+    if not isinstance(pyName, basestring):
+        return makeJSName(createJSStringFromPython(pyName))
+
+    jsName = _jsNameCache.pop(pyName, None)
+    if jsName is not None:
+        _jsNameCacheHits += 1
+    else:
+        _jsNameCacheMisses += 1
+        jsName = makeJSName(createJSStringFromPython(pyName))
+        if _jsNameCacheSize <= 0:
+            return jsName
+        if len(_jsNameCache) >= _jsNameCacheSize:
+            _jsNameCache.popitem(False)
+
+    # (Re)insert the name as the most recently used one.
+    _jsNameCache[pyName] = jsName
+    return jsName
+
+def setNameCacheSize(size):
+    """Set the maximum number of property names kept in the name
+    cache. A size of 0 disables the cache."""
+    global _jsNameCacheSize
+
+    if size < 0:
+        raise ValueError, "cache size must be non-negative"
+
+    _jsNameCacheSize = size
+    while len(_jsNameCache) > _jsNameCacheSize:
+        _jsNameCache.popitem(False)
+
+
+# Conversion of Python values is dispatched on their type. The way
+# instances of a type are converted is computed the first time the
+# type is seen, and kept in a memo afterwards.
+
+# Kinds of conversion for Python types.
+DEF PY_KIND_WRAP = 0
+DEF PY_KIND_NULL = 1
+DEF PY_KIND_BOOL = 2
+DEF PY_KIND_NUMBER = 3
+DEF PY_KIND_STRING = 4
+DEF PY_KIND_JSOBJECT = 5
+DEF PY_KIND_BUFFER = 6
+DEF PY_KIND_CUSTOM = 7
+
+# Maximum number of types in the memo. The memo is emptied when it
+# gets full, so that types created on the fly don't accumulate.
+DEF MAX_TYPE_MEMO_SIZE = 1024
+
+# Protocols implemented by wrapped Python types, which select their
+# generic JavaScript class.
+DEF PY_CONTAINER_NONE = 0
+DEF PY_CONTAINER_SEQUENCE = 1
+DEF PY_CONTAINER_MAPPING = 2
+
+cdef class _ExposedClass
+
+cdef class _PyTypeInfo:
+    """How instances of a Python type are converted into JavaScript
+    values."""
+
+    # One of the PY_KIND_* constants.
+    cdef int kind
+
+    # The JavaScript class wrapping instances of the type (for
+    # PY_KIND_WRAP and PY_KIND_BUFFER).
+    cdef JSClassRef jsClass
+
+    # One of the PY_CONTAINER_* constants. Exposed classes keep the
+    # container protocol of their type.
+    cdef int container
+
+    # The converter for PY_KIND_CUSTOM types.
+    cdef object converter
+
+    # The class generated by exposeClass for the type, if any.
+    cdef _ExposedClass exposed
+
+# Custom converters registered with registerConverter, by type.
+cdef dict _pyConverters = {}
+
+# Conversion information memo, by type.
+cdef dict _pyTypeInfos = {}
+
+cdef _PyTypeInfo pyTypeInfo(object pyValue):
+    """Return the conversion information for the type of
+    ``pyValue``."""
+    cdef object pyType = type(pyValue)
+    cdef _PyTypeInfo info = _pyTypeInfos.get(pyType)
+
+    if info is not None:
+        return info
+
+    info = _PyTypeInfo.__new__(_PyTypeInfo)
+    info.kind = PY_KIND_WRAP
+    for base in pyType.__mro__:
+        if base in _pyConverters:
+            info.kind = PY_KIND_CUSTOM
+            info.converter = _pyConverters[base]
+            break
+    else:
+        if isinstance(pyValue, NullType):
+            info.kind = PY_KIND_NULL
+        elif isinstance(pyValue, py_bool):
+            info.kind = PY_KIND_BOOL
+        elif isinstance(pyValue, (int, float)):
+            info.kind = PY_KIND_NUMBER
+        elif isinstance(pyValue, basestring):
+            info.kind = PY_KIND_STRING
+        elif isinstance(pyValue, _JSBaseObject):
+            info.kind = PY_KIND_JSOBJECT
+        elif PyObject_CheckBuffer(pyValue):
+            info.kind = PY_KIND_BUFFER
+
+    info.container = pyContainerKind(pyType)
+    for base in pyType.__mro__:
+        if base in _exposedClasses:
+            info.exposed = _exposedClasses[base]
+            info.jsClass = info.exposed.jsClass
+            break
+    else:
+        info.jsClass = genericPyClass(pyType)
+
+    if len(_pyTypeInfos) >= MAX_TYPE_MEMO_SIZE:
+        _pyTypeInfos.clear()
+    _pyTypeInfos[pyType] = info
+    return info
+
+def registerConverter(pyType, converter):
+    """Register a custom converter for instances of ``pyType`` (and
+    its subclasses) passed to JavaScript.
+
+    Instead of being wrapped, such instances are passed to
+    ``converter``, as ``converter(context, value)``, and the value it
+    returns is converted in their place. It may return JavaScript
+    objects, e.g., built with functions of the context. The converter
+    for a type is removed by registering ``None``. Converters cannot be
+    registered for ``bool``, ``int``, ``float`` and ``str``."""
+    if not isinstance(pyType, type):
+        raise TypeError, "converters must be registered for types"
+    if pyType is py_bool or pyType is int or pyType is float or \
+            pyType is unicode:
+        raise TypeError, "cannot register a converter for '%s'" % \
+            pyType.__name__
+
+    if converter is None:
+        _pyConverters.pop(pyType, None)
+    else:
+        _pyConverters[pyType] = converter
+    _pyTypeInfos.clear()
+
+# Custom converters for JavaScript objects registered with
+# registerJSConverter, as (constructor name, converter) pairs in
+# registration order. Contexts resolve the names into constructors
+# (see JSContext.resolveJSConverters) and redo it whenever the version
+# number changes.
+cdef list _jsConverters = []
+cdef long _jsConvertersVersion = 0
+
+def registerJSConverter(constructorName, converter):
+    """Register a custom converter for JavaScript objects created by
+    the constructor ``constructorName`` (or a subclass of it).
+
+    The name is looked up in the global object of each context, and
+    may be dotted (e.g., ``'Date'`` or ``'Intl.Locale'``). Contexts
+    where it doesn't refer to a constructor ignore the converter.
+
+    Instead of being wrapped, such objects are passed (wrapped) to
+    ``converter``, and the value it returns is used in their place.
+    Converters are tried in registration order. The converter for a
+    constructor is removed by registering ``None``. As long as no
+    converters are registered, conversion is not slowed down at
+    all."""
+    global _jsConverters, _jsConvertersVersion
+
+    if not isinstance(constructorName, basestring):
+        raise TypeError, "constructor names must be strings"
+
+    _jsConverters = [(name, conv) for name, conv in _jsConverters
+                     if name != constructorName]
+    if converter is not None:
+        _jsConverters.append((constructorName, converter))
+    _jsConvertersVersion += 1
+
+cdef object convertJSObject(JSContextRef jsCtx, JSValueRef jsValue):
+    """Convert the JavaScript object ``jsValue`` with the first
+    matching converter registered with ``registerJSConverter``.
+
+    ``_missing`` is returned if no converter applies."""
+    cdef JSContext ctx = contextFromJS(jsCtx)
+    cdef JSObjectRef jsConstructor
+
+    if ctx.jsConvertersVersion != _jsConvertersVersion:
+        ctx.resolveJSConverters()
+
+    for pyConstructor, converter in ctx.jsConverters:
+        jsConstructor = <JSObjectRef>PyCapsule_GetPointer(pyConstructor,
+                                                          NULL)
+        if JSValueIsInstanceOfConstructor(jsCtx, jsValue, jsConstructor,
+                                          NULL):
+            return converter(wrapJSObject(jsCtx, jsValue))
+    return _missing
+
+cdef JSObjectRef wrapPyObject(JSContextRef jsCtx,
+                              object pyValue) except NULL:
+    cdef JSContext ctx = contextFromJS(jsCtx)
+    cdef _PyWrapperData *data
+    cdef JSObjectRef jsObject
+
+    data = <_PyWrapperData *>ptrTableGet(ctx.pyWrappers, <void *>pyValue)
+    if data != NULL:
+        return data.jsObject
+
+    jsObject = makePyObject(jsCtx, pyValue)
+    data = <_PyWrapperData *>JSObjectGetPrivate(jsObject)
+    ptrTableSet(ctx.pyWrappers, <void *>pyValue, data)
+    data.cache = ctx.pyWrappers
+    if ctx.adopted:
+        Py_INCREF(ctx)
+        data.ctx = <void *>ctx
+    return jsObject
+
+cdef JSValueRef pythonToJS(JSContextRef jsCtx,
+                           object pyValue) except NULL:
     """Convert a Python value into a JavaScript value.
 
     The returned value belongs to the specified context, and must be
     protected if it is going to be permanently stored (e.g., inside an
     object)."""
+    cdef object pyType = type(pyValue)
+    cdef _PyTypeInfo info
+    cdef JSStringRef jsStr
+    cdef JSObjectRef jsObject
 
+    # Fast paths for the most common types.
     if pyValue is None:
         return JSValueMakeUndefined(jsCtx)
-    elif isinstance(pyValue, NullType):
+    elif pyType is unicode:
+        jsStr = createJSStringFromUnicode(pyValue)
+        try:
+            return JSValueMakeString(jsCtx, jsStr)
+        finally:
+            JSStringRelease(jsStr)
+    elif pyType is int or pyType is float:
+        return JSValueMakeNumber(jsCtx, pyValue)
+    elif pyType is py_bool:
+        return JSValueMakeBoolean(jsCtx, pyValue)
+
+    info = pyTypeInfo(pyValue)
+    if info.kind == PY_KIND_NULL:
         return JSValueMakeNull(jsCtx)
-    elif isinstance(pyValue,py_bool):
+    elif info.kind == PY_KIND_BOOL:
         return JSValueMakeBoolean(jsCtx, pyValue)
-    elif isinstance(pyValue, (int, float)):
+    elif info.kind == PY_KIND_NUMBER:
         return JSValueMakeNumber(jsCtx, pyValue)
-    elif isinstance(pyValue, basestring):
-        return JSValueMakeString(jsCtx, createJSStringFromPython(pyValue))
-    elif isinstance(pyValue, _JSBaseObject):
+    elif info.kind == PY_KIND_STRING:
+        jsStr = createJSStringFromPython(pyValue)
+        try:
+            return JSValueMakeString(jsCtx, jsStr)
+        finally:
+            JSStringRelease(jsStr)
+    elif info.kind == PY_KIND_JSOBJECT:
         # This is a wrapped JavaScript object, just unwrap it.
-        return (<_JSObject>pyValue).jsObject
+        return (<JSObject>pyValue).jsObject
+    elif info.kind == PY_KIND_CUSTOM:
+        return pythonToJS(jsCtx,
+                          info.converter(contextFromJS(jsCtx), pyValue))
+    elif info.kind == PY_KIND_BUFFER:
+        # Binary data goes into a typed array if possible.
+        jsObject = typedArrayFromPython(jsCtx, pyValue)
+        if jsObject != NULL:
+            return jsObject
+
+    # Wrap all other Python objects into a generic wrapper.
+    return wrapPyObject(jsCtx, pyValue)
+
+
+# Binary data. Python objects supporting the buffer protocol are
+# converted into typed arrays. Writable buffers are shared with
+# JavaScript without copying, read-only ones are copied. A shared
+# buffer stays exported until JavaScript's garbage collector frees the
+# array buffer, and the exporter cannot be resized until then (e.g.
+# bytearray.append raises BufferError). Pass bytes(data) to give
+# JavaScript a copy instead.
+
+# Byte order character selecting the native byte order in buffer
+# format strings.
+cdef char _nativeByteOrderChar = c'<' if sys.byteorder == 'little' \
+    else c'>'
+
+cdef JSTypedArrayType typedArrayTypeFromFormat(char *format,
+                                               Py_ssize_t itemsize):
+    """Return the type of typed array matching the items of a Python
+    buffer. Items without a matching type are exposed as raw bytes
+    (``Uint8Array``)."""
+    cdef char code
+
+    if format == NULL:
+        return kJSTypedArrayTypeUint8Array
+    if format[0] == c'@' or format[0] == c'=' or \
+            format[0] == _nativeByteOrderChar:
+        format += 1
+    code = format[0]
+    if code == 0 or format[1] != 0:
+        return kJSTypedArrayTypeUint8Array
+
+    if code == c'f' and itemsize == 4:
+        return kJSTypedArrayTypeFloat32Array
+    elif code == c'd' and itemsize == 8:
+        return kJSTypedArrayTypeFloat64Array
+    elif code in b'bhilq':
+        if itemsize == 1:
+            return kJSTypedArrayTypeInt8Array
+        elif itemsize == 2:
+            return kJSTypedArrayTypeInt16Array
+        elif itemsize == 4:
+            return kJSTypedArrayTypeInt32Array
+    elif code in b'BHILQ':
+        if itemsize == 2:
+            return kJSTypedArrayTypeUint16Array
+        elif itemsize == 4:
+            return kJSTypedArrayTypeUint32Array
+
+    return kJSTypedArrayTypeUint8Array
+
+cdef char *typedArrayFormat(JSTypedArrayType arrayType,
+                            Py_ssize_t *itemsize):
+    """Return the buffer format string and item size for the items of
+    a typed array (array buffers are exposed as bytes)."""
+    if arrayType == kJSTypedArrayTypeInt8Array:
+        itemsize[0] = 1
+        return 'b'
+    elif arrayType == kJSTypedArrayTypeInt16Array:
+        itemsize[0] = 2
+        return 'h'
+    elif arrayType == kJSTypedArrayTypeInt32Array:
+        itemsize[0] = 4
+        return 'i'
+    elif arrayType == kJSTypedArrayTypeUint16Array:
+        itemsize[0] = 2
+        return 'H'
+    elif arrayType == kJSTypedArrayTypeUint32Array:
+        itemsize[0] = 4
+        return 'I'
+    elif arrayType == kJSTypedArrayTypeFloat32Array:
+        itemsize[0] = 4
+        return 'f'
+    elif arrayType == kJSTypedArrayTypeFloat64Array:
+        itemsize[0] = 8
+        return 'd'
     else:
-        # Wrap all other Python objects into a generic wrapper.
-        return wrapPyObject(jsCtx, pyValue)
+        itemsize[0] = 1
+        return 'B'
+
+cdef void releasePyBuffer(void *bytes, void *deallocatorContext) with gil:
+    """Release a Python buffer shared with a JavaScript array buffer
+    that has been garbage collected."""
+    cdef Py_buffer *view = <Py_buffer *>deallocatorContext
+
+    PyBuffer_Release(view)
+    free(view)
+
+cdef JSObjectRef typedArrayFromPython(JSContextRef jsCtx,
+                                      object pyValue) except? NULL:
+    """Create a typed array for the contents of a Python object
+    supporting the buffer protocol.
+
+    Writable buffers are shared, and stay exported for as long as the
+    array buffer is alive (see above). NULL is returned (without an
+    exception being set) if the contents of the object are not
+    contiguous."""
+    cdef Py_buffer *view
+    cdef JSValueRef jsException = NULL
+    cdef JSObjectRef jsBuffer
+    cdef JSObjectRef jsArray = NULL
+    cdef JSTypedArrayType arrayType
+    cdef bint writable = True
+    cdef void *data
+
+    view = <Py_buffer *>malloc(sizeof(Py_buffer))
+    if view == NULL:
+        raise MemoryError
+
+    try:
+        PyObject_GetBuffer(pyValue, view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT |
+                           PyBUF_WRITABLE)
+    except (BufferError, ValueError):
+        writable = False
+        try:
+            PyObject_GetBuffer(pyValue, view,
+                               PyBUF_C_CONTIGUOUS | PyBUF_FORMAT)
+        except (BufferError, ValueError):
+            free(view)
+            return NULL
+
+    arrayType = typedArrayTypeFromFormat(view.format, view.itemsize)
+
+    if writable:
+        # The buffer is released by releasePyBuffer when the array
+        # buffer is garbage collected.
+        jsBuffer = JSObjectMakeArrayBufferWithBytesNoCopy(
+            jsCtx, view.buf, view.len, releasePyBuffer, view, &jsException)
+        if jsException != NULL:
+            PyBuffer_Release(view)
+            free(view)
+            raise jsExceptionToPython(jsCtx, jsException)
+        jsArray = JSObjectMakeTypedArrayWithArrayBuffer(jsCtx, arrayType,
+                                                        jsBuffer,
+                                                        &jsException)
+    else:
+        try:
+            if arrayType == kJSTypedArrayTypeUint8Array:
+                jsArray = JSObjectMakeTypedArray(jsCtx, arrayType, view.len,
+                                                 &jsException)
+            else:
+                jsArray = JSObjectMakeTypedArray(jsCtx, arrayType,
+                                                 view.len / view.itemsize,
+                                                 &jsException)
+            if jsException == NULL:
+                data = JSObjectGetTypedArrayBytesPtr(jsCtx, jsArray,
+                                                     &jsException)
+            if jsException == NULL:
+                memcpy(data, view.buf, view.len)
+        finally:
+            PyBuffer_Release(view)
+            free(view)
+
+    if jsException != NULL:
+        raise jsExceptionToPython(jsCtx, jsException)
+    return jsArray
+
+
+# Deep conversion. Whole object graphs are converted into plain Python
+# data in a single pass, without creating wrappers for the
+# intermediate objects.
+
+# Default maximum nesting depth for deep conversions.
+DEF MAX_CONVERSION_DEPTH = 100
+
+cdef object jsToPythonDeep(JSContextRef jsCtx, JSValueRef jsValue,
+                           int depth, bint deep, set active):
+    """Convert a JavaScript value into Python data. Arrays become
+    lists and other objects become dicts, while functions and
+    wrapped Python objects are converted as in ``jsToPython``.
+
+    Up to ``depth`` levels of nested objects are converted. Deeper
+    objects raise a ``ValueError`` if ``deep`` is true, and are
+    returned as wrappers otherwise. ``active`` holds the addresses of
+    the objects being converted, in order to detect cycles."""
+    cdef JSObjectRef jsObject
+    cdef long key
+
+    if not JSValueIsObject(jsCtx, jsValue) or \
+            JSObjectIsFunction(jsCtx, jsValue) or \
+            JSValueIsObjectOfClass(jsCtx, jsValue, pyObjectClass):
+        return jsToPython(jsCtx, jsValue)
+
+    if _jsConverters:
+        pyValue = convertJSObject(jsCtx, jsValue)
+        if pyValue is not _missing:
+            return pyValue
+
+    if depth <= 0:
+        if deep:
+            raise ValueError, "maximum conversion depth exceeded"
+        return jsToPython(jsCtx, jsValue)
+
+    jsObject = <JSObjectRef>jsValue
+    key = <long>jsObject
+    if key in active:
+        raise ValueError, "cannot convert cyclic JavaScript objects"
+
+    active.add(key)
+    try:
+        if JSValueIsArray(jsCtx, jsValue):
+            return jsArrayToList(jsCtx, jsObject, depth, deep, active)
+        else:
+            return jsObjectToDict(jsCtx, jsObject, depth, deep, active)
+    finally:
+        active.discard(key)
+
+cdef list jsArrayToList(JSContextRef jsCtx, JSObjectRef jsObject,
+                        int depth, bint deep, set active):
+    """Convert an array or array-like object into a list (see
+    ``jsToPythonDeep``)."""
+    cdef JSValueRef jsException = NULL
+    cdef JSValueRef jsValue
+    cdef unsigned length
+    cdef unsigned i
+    cdef list result
+
+    jsValue = JSObjectGetProperty(jsCtx, jsObject, jsLengthName,
+                                  &jsException)
+    if jsException != NULL or JSValueIsUndefined(jsCtx, jsValue):
+        raise TypeError, "not an array or array-like JavaScript object"
+    length = <unsigned>JSValueToNumber(jsCtx, jsValue, &jsException)
+    if jsException != NULL:
+        raise TypeError, "not an array or array-like JavaScript object"
+
+    result = [None] * length
+    for i in range(length):
+        jsValue = JSObjectGetPropertyAtIndex(jsCtx, jsObject, i,
+                                             &jsException)
+        if jsException != NULL:
+            raise jsExceptionToPython(jsCtx, jsException)
+        result[i] = jsToPythonDeep(jsCtx, jsValue, depth - 1, deep, active)
+    return result
+
+cdef dict jsObjectToDict(JSContextRef jsCtx, JSObjectRef jsObject,
+                         int depth, bint deep, set active):
+    """Convert the enumerable properties of an object into a dict (see
+    ``jsToPythonDeep``)."""
+    cdef JSValueRef jsException = NULL
+    cdef JSValueRef jsValue
+    cdef JSStringRef jsName
+    cdef JSPropertyNameArrayRef nameArray
+    cdef size_t count
+    cdef size_t i
+    cdef dict result = {}
+
+    nameArray = JSObjectCopyPropertyNames(jsCtx, jsObject)
+    try:
+        count = JSPropertyNameArrayGetCount(nameArray)
+        for i in range(count):
+            jsName = JSPropertyNameArrayGetNameAtIndex(nameArray, i)
+            jsValue = JSObjectGetProperty(jsCtx, jsObject, jsName,
+                                          &jsException)
+            if jsException != NULL:
+                raise jsExceptionToPython(jsCtx, jsException)
+            result[pyStringFromJS(jsName)] = \
+                jsToPythonDeep(jsCtx, jsValue, depth - 1, deep, active)
+    finally:
+        JSPropertyNameArrayRelease(nameArray)
+    return result
+
+cdef JSValueRef pythonToJSDeep(JSContextRef jsCtx, object pyValue,
+                               int depth, dict memo) except NULL:
+    """Convert Python data into native JavaScript values. Sequences
+    become arrays and mappings become plain objects, while other
+    values are converted as in ``pythonToJS``.
+
+    Up to ``depth`` levels of nested containers are converted, and a
+    ``ValueError`` is raised for deeper ones. ``memo`` maps the ids of
+    the containers already converted to ``(container, object)`` pairs,
+    so that shared and cyclic structures are preserved. Keeping the
+    containers in the memo makes sure that their ids are not reused
+    by other objects during the conversion."""
+    cdef _PyTypeInfo info = pyTypeInfo(pyValue)
+    cdef JSValueRef jsException = NULL
+    cdef JSObjectRef jsObject
+    cdef JSStringRef jsName
+    cdef unsigned i
+
+    if info.kind != PY_KIND_WRAP or info.container == PY_CONTAINER_NONE:
+        return pythonToJS(jsCtx, pyValue)
+
+    try:
+        return <JSValueRef>PyCapsule_GetPointer(memo[id(pyValue)][1],
+                                                NULL)
+    except KeyError:
+        pass
+
+    if depth <= 0:
+        raise ValueError, "maximum conversion depth exceeded"
+
+    # Items are stored right away, so that they are reachable from the
+    # new object (and safe from the garbage collector) while the rest
+    # of the data is converted.
+    if info.container == PY_CONTAINER_MAPPING:
+        jsObject = JSObjectMake(jsCtx, NULL, NULL)
+        memo[id(pyValue)] = (pyValue, PyCapsule_New(jsObject, NULL, NULL))
+        for pyKey, pyItem in pyValue.items():
+            jsName = createJSStringFromPython(pyKey)
+            try:
+                JSObjectSetProperty(jsCtx, jsObject, jsName,
+                                    pythonToJSDeep(jsCtx, pyItem,
+                                                   depth - 1, memo),
+                                    kJSPropertyAttributeNone, &jsException)
+            finally:
+                JSStringRelease(jsName)
+            if jsException != NULL:
+                raise jsExceptionToPython(jsCtx, jsException)
+    else:
+        jsObject = JSObjectMakeArray(jsCtx, 0, NULL, &jsException)
+        if jsException != NULL:
+            raise jsExceptionToPython(jsCtx, jsException)
+        memo[id(pyValue)] = (pyValue, PyCapsule_New(jsObject, NULL, NULL))
+        for i, pyItem in enumerate(pyValue):
+            JSObjectSetPropertyAtIndex(jsCtx, jsObject, i,
+                                       pythonToJSDeep(jsCtx, pyItem,
+                                                      depth - 1, memo),
+                                       &jsException)
+            if jsException != NULL:
+                raise jsExceptionToPython(jsCtx, jsException)
+
+    return jsObject
 
 
 #
@@ -233,7 +1172,92 @@ cdef JSValueRef pythonToJS(JSContextRef jsCtx, object pyValue):
 # The name of the length array property.
 cdef JSStringRef jsLengthName = JSStringCreateWithUTF8CString("length")
 
+# The names of the array methods used by sequence wrappers.
+cdef JSStringRef jsSpliceName = JSStringCreateWithUTF8CString("splice")
+cdef JSStringRef jsIndexOfName = JSStringCreateWithUTF8CString("indexOf")
+cdef JSStringRef jsReverseName = JSStringCreateWithUTF8CString("reverse")
+
+# Largest integer represented exactly by JavaScript numbers.
+DEF MAX_SAFE_INTEGER = 9007199254740991
+
+# Maximum number of items inserted by a single call to splice.
+DEF MAX_SPLICE_ITEMS = 4096
+
+# The names of the properties describing JavaScript errors.
+cdef JSStringRef jsErrorNameName = JSStringCreateWithUTF8CString("name")
+cdef JSStringRef jsErrorMessageName = \
+    JSStringCreateWithUTF8CString("message")
+
+# Marker for missing optional arguments.
+cdef object _missing = object()
+
+
+cdef class JSContext
+cdef class JSScope
+
+
+cdef class _JSLock:
+    """Reentrant lock serializing the access to a JavaScript context.
+
+    Contexts that release the GIL while running JavaScript code must
+    make sure that no other thread enters them in the meantime, since
+    the thread running the script may need the GIL back to call into
+    Python. When the lock is not enabled, the GIL already serializes
+    all access to the context and ``acquire`` and ``release`` do
+    nothing."""
 
+    cdef bint enabled
+    cdef object lock
+
+    # Nesting depth of the current owner, and functions to call once it
+    # releases the lock (see whenReleased). Both are only changed by
+    # the owner, or with the GIL held right after a failed tryAcquire.
+    cdef int depth
+    cdef list releaseCallbacks
+
+    def __cinit__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.RLock()
+        self.releaseCallbacks = []
+
+    cdef inline int acquire(self) except -1:
+        if self.enabled:
+            # This releases the GIL while waiting.
+            self.lock.acquire()
+            self.depth += 1
+        return 0
+
+    cdef inline int release(self) except -1:
+        if self.enabled:
+            self.depth -= 1
+            if self.depth == 0 and self.releaseCallbacks:
+                callbacks = self.releaseCallbacks
+                self.releaseCallbacks = []
+                self.lock.release()
+                for callback in callbacks:
+                    callback()
+            else:
+                self.lock.release()
+        return 0
+
+    cdef bint tryAcquire(self) except -1:
+        """Acquire the lock if that is possible without waiting, and
+        tell whether it was acquired."""
+        if self.enabled:
+            if not self.lock.acquire(False):
+                return False
+            self.depth += 1
+        return True
+
+    cdef int whenReleased(self, callback) except -1:
+        """Call ``callback`` (in the owner's thread) as soon as the
+        current owner releases the lock. Only valid right after a
+        failed ``tryAcquire``."""
+        self.releaseCallbacks.append(callback)
+        return 0
+
+
+@cython.no_gc_clear
 cdef class _JSBaseObject:
     """Base class for all Python wrappers for JavaScript objects.
 
@@ -243,10 +1267,18 @@ cdef class _JSBaseObject:
     # Make it possible to have weak references to this object.
     cdef object __weakref__
 
+    # The context this object belongs to. It must still be around
+    # when __dealloc__ runs, hence the no_gc_clear above.
+    cdef JSContext ctx
     cdef JSContextRef jsCtx
     cdef JSObjectRef jsObject
 
+    # The scope keeping the object alive if it was created inside a
+    # scope (see JSScope), None otherwise.
+    cdef JSScope scope
+
     def __init__(self):
+        self.ctx = None
         self.jsCtx = NULL
         self.jsObject = NULL
 
@@ -254,27 +1286,83 @@ cdef class _JSBaseObject:
         # We claim ownership of objects here and release them in
         # __dealloc__. Notice that we also need to own a reference to
         # the context, because it may otherwise disappear while this
-        # object still exists.
-        self.jsCtx = jsCtx
-        JSGlobalContextRetain(self.jsCtx)
+        # object still exists. Wrappers always use the global
+        # context, since the context passed to callbacks may be a
+        # temporary execution context.
+        self.ctx = contextFromJS(jsCtx)
+        self.jsCtx = self.ctx.jsCtx
         self.jsObject = jsObject
+        if self.ctx.currentScope is not None:
+            # The scope keeps the object alive instead.
+            self.ctx.currentScope.add(self)
+        else:
+            self.protect()
+
+    cdef int protect(self) except -1:
+        JSGlobalContextRetain(self.jsCtx)
         JSValueProtect(self.jsCtx, self.jsObject)
+        return 0
 
     def __dealloc__(self):
-        JSValueUnprotect(self.jsCtx, self.jsObject)
-        JSGlobalContextRelease(self.jsCtx)
+        if self.ctx is None:
+            return
+
+        # Remove this object from the wrapper cache (views and bound
+        # methods are not cached).
+        if ptrTableGet(self.ctx.jsWrappers,
+                       self.jsObject) == <void *>self:
+            ptrTableRemove(self.ctx.jsWrappers, self.jsObject)
+
+        if self.scope is not None:
+            # The object was never protected.
+            ptrTableRemove(self.scope.wrappers, <void *>self)
+            return
+
+        self.ctx.jsLock.acquire()
+        try:
+            JSValueUnprotect(self.jsCtx, self.jsObject)
+            JSGlobalContextRelease(self.jsCtx)
+        finally:
+            self.ctx.jsLock.release()
+
+    def toJSON(self, indent=0):
+        """Serialize the object as ``JSON.stringify`` does and return
+        the resulting string, or ``None`` if the object cannot be
+        serialized. ``indent`` is the number of spaces used to indent
+        nested values (0 produces compact output).
+
+        Notice that this method hides any JavaScript property called
+        'toJSON' from attribute access. Use item access to reach it.
+        """
+        cdef JSValueRef jsException = NULL
+        cdef JSStringRef jsStr
 
+        self.ctx.jsLock.acquire()
+        try:
+            jsStr = JSValueCreateJSONString(self.jsCtx, self.jsObject,
+                                            indent, &jsException)
+            if jsException != NULL:
+                raise jsExceptionToPython(self.jsCtx, jsException)
+            if jsStr == NULL:
+                return None
+
+            try:
+                return pyStringFromJS(jsStr)
+            finally:
+                JSStringRelease(jsStr)
+        finally:
+            self.ctx.jsLock.release()
 
-cdef class _JSSequence(_JSBaseObject):
+
+cdef class JSSequence(_JSBaseObject):
     """A Python sequence view on a JavaScript object.
 
     See the ``asSeq`` function in this module and the
-    ``_JSObject.__asSeq__`` method for more details.
+    ``JSObject.__asSeq__`` method for more details.
 
-    Since Cython extension classes cannot inherit from Python classes,
-    we first define class ``_JSSequence`` and then define
-    ``JSSequence`` as a standard Python class that mixes in
-    ``MutableMapping`` from the ``collections`` module."""
+    The whole mutable sequence protocol is implemented natively, and
+    the class is registered as a ``collections.abc.MutableSequence``
+    instead of inheriting from it."""
 
     cdef int getLength(self) except -1:
         cdef JSValueRef jsException = NULL
@@ -342,212 +1430,570 @@ cdef class _JSSequence(_JSBaseObject):
 
         return 0
 
+    cdef JSObjectRef getArrayMethod(self, JSStringRef jsName):
+        """Return the method called ``jsName`` if this object is a real
+        array, and NULL otherwise."""
+        cdef JSValueRef jsException = NULL
+        cdef JSValueRef jsMethod
+
+        if not JSValueIsArray(self.jsCtx, self.jsObject):
+            return NULL
+
+        jsMethod = JSObjectGetProperty(self.jsCtx, self.jsObject, jsName,
+                                       &jsException)
+        if jsException != NULL or \
+                not JSValueIsObject(self.jsCtx, jsMethod) or \
+                not JSObjectIsFunction(self.jsCtx, jsMethod):
+            return NULL
+        return <JSObjectRef>jsMethod
+
+    cdef int nativeIndexOf(self, object pyItem, int start) except -3:
+        """Search a string or number with the native ``indexOf`` method
+        of real arrays.
+
+        Return the position of the value, or -1 if it is not found.
+        -2 is returned if the object is not a real array, or if the
+        strict equality used by ``indexOf`` could give a different
+        result than the element loops: for other types of values
+        (``indexOf`` skips holes, which read as ``undefined``), for
+        numbers equal to booleans in Python (0 and 1), and for integers
+        that JavaScript cannot represent exactly."""
+        cdef JSObjectRef jsIndexOf
+        cdef JSValueRef jsResult
+
+        if type(pyItem) is int or type(pyItem) is float:
+            if pyItem == 0 or pyItem == 1 or \
+                    not -MAX_SAFE_INTEGER <= pyItem <= MAX_SAFE_INTEGER:
+                return -2
+        elif type(pyItem) is not unicode:
+            return -2
+
+        jsIndexOf = self.getArrayMethod(jsIndexOfName)
+        if jsIndexOf == NULL:
+            return -2
+
+        jsResult = invokeJSFunction(self.jsCtx, jsIndexOf, self.jsObject,
+                                    (pyItem, start), False)
+        return <int>JSValueToNumber(self.jsCtx, jsResult, NULL)
+
+    cdef bint spliceArray(self, int start, int deleteCount,
+                          list pyItems) except -1:
+        """Replace ``deleteCount`` elements at ``start`` by the items in
+        ``pyItems``, with a single call to the native ``splice``
+        method of real arrays. False is returned, and nothing is done,
+        for other objects."""
+        cdef JSObjectRef jsSplice = self.getArrayMethod(jsSpliceName)
+        cdef Py_ssize_t i
+
+        if jsSplice == NULL:
+            return False
+
+        # Insert large numbers of items in several calls, so that they
+        # don't exceed the limits of the JavaScript stack.
+        for i in range(0, max(len(pyItems), 1), MAX_SPLICE_ITEMS):
+            invokeJSFunction(self.jsCtx, jsSplice, self.jsObject,
+                             (start + i, deleteCount if i == 0 else 0) +
+                             tuple(pyItems[i:i + MAX_SPLICE_ITEMS]),
+                             self.ctx.jsLock.enabled)
+        return True
+
+    cdef list getChunk(self, int start, int count):
+        """Return a list with the converted elements from ``start`` to
+        ``start + count`` (excluded), as far as they exist."""
+        cdef int end
+        cdef int i
+        cdef list result
+
+        self.ctx.jsLock.acquire()
+        try:
+            end = min(start + count, self.getLength())
+            if end <= start:
+                return []
+
+            result = [None] * (end - start)
+            for i in range(start, end):
+                result[i - start] = jsToPython(self.jsCtx, self.getItem(i))
+            return result
+        finally:
+            self.ctx.jsLock.release()
+
+    def iterChunks(self, int n):
+        """Iterate over the sequence in chunks, yielding lists of (at
+        most) ``n`` converted elements.
+
+        The length of the sequence is checked once per chunk, so that
+        elements added or removed while iterating are noticed."""
+        cdef int index = 0
+
+        if n < 1:
+            raise ValueError, "chunk size must be positive"
+
+        while True:
+            chunk = self.getChunk(index, n)
+            if not chunk:
+                return
+            index += len(chunk)
+            yield chunk
+
     def __contains__(self, pyItem):
-        cdef JSValueRef jsItem = pythonToJS(self.jsCtx, pyItem)
+        cdef JSValueRef jsItem
         cdef JSValueRef jsElem
+        cdef int pos
 
-        for i in range(self.getLength()):
-            jsElem = self.getItem(i)
-            if JSValueIsObjectOfClass(self.jsCtx, jsElem, pyObjectClass):
-                # This is a wrapped Python object, compare according
-                # to Python rules.
-                if <object>JSObjectGetPrivate(jsElem) == pyItem:
-                    return True
-            else:
-                # Compare according to JavaScript rules.
-                if JSValueIsStrictEqual(self.jsCtx, jsItem, jsElem):
-                    return True
-        return False
+        self.ctx.jsLock.acquire()
+        try:
+            pos = self.nativeIndexOf(pyItem, 0)
+            if pos != -2:
+                return pos >= 0
+
+            jsItem = pythonToJS(self.jsCtx, pyItem)
+            for i in range(self.getLength()):
+                jsElem = self.getItem(i)
+                if JSValueIsObjectOfClass(self.jsCtx, jsElem, pyObjectClass):
+                    # This is a wrapped Python object, compare according
+                    # to Python rules.
+                    if pyObjectFromJS(<JSObjectRef>jsElem) == pyItem:
+                        return True
+                else:
+                    # Compare according to JavaScript rules.
+                    if JSValueIsStrictEqual(self.jsCtx, jsItem, jsElem):
+                        return True
+            return False
+        finally:
+            self.ctx.jsLock.release()
 
     def __len__(self):
-        return self.getLength()
+        self.ctx.jsLock.acquire()
+        try:
+            return self.getLength()
+        finally:
+            self.ctx.jsLock.release()
 
     def __iter__(self):
         return _JSSeqIterator(self)
 
     def __getitem__(self, pyIndex):
         cdef int index
-        cdef int length = self.getLength()
+        cdef int length
         cdef int i
 
-        if isinstance(pyIndex, int) or isinstance(pyIndex, long):
-            index = pyIndex
+        self.ctx.jsLock.acquire()
+        try:
+            length = self.getLength()
 
-            # Handle negative indexes.
-            if index < 0:
-                index += length
+            if isinstance(pyIndex, int) or isinstance(pyIndex, long):
+                index = pyIndex
 
-            # Exclude out-of-range indexes.
-            if index < 0 or index >= length:
-                raise IndexError, "list index out of range"
+                # Handle negative indexes.
+                if index < 0:
+                    index += length
 
-            return jsToPython(self.jsCtx, self.getItem(index))
-        elif isinstance(pyIndex, slice):
-            # Don't know how efficient this is, but it looks cool
-            # anyway.
-            return [jsToPython(self.jsCtx, self.getItem(i))
-                    for i in xrange(*pyIndex.indices(length))]
-        else:
-            raise TypeError, "list indices must be integers, not %s" % \
-                pyIndex.__class__.__name__
+                # Exclude out-of-range indexes.
+                if index < 0 or index >= length:
+                    raise IndexError, "list index out of range"
+
+                return jsToPython(self.jsCtx, self.getItem(index))
+            elif isinstance(pyIndex, slice):
+                # Don't know how efficient this is, but it looks cool
+                # anyway.
+                return [jsToPython(self.jsCtx, self.getItem(i))
+                        for i in xrange(*pyIndex.indices(length))]
+            else:
+                raise TypeError, "list indices must be integers, not %s" % \
+                    pyIndex.__class__.__name__
+        finally:
+            self.ctx.jsLock.release()
 
     def __setitem__(self, pyIndex, pyValue):
         cdef int index
-        cdef int length = self.getLength()
+        cdef int length
         cdef int start, end, step
         cdef int valueLength
         cdef int sliceSize
         cdef int i
 
-        if isinstance(pyIndex, int) or isinstance(pyIndex, long):
-            index = pyIndex
+        self.ctx.jsLock.acquire()
+        try:
+            length = self.getLength()
 
-            # Handle negative indexes.
-            if index < 0:
-                index += length
+            if isinstance(pyIndex, int) or isinstance(pyIndex, long):
+                index = pyIndex
 
-            # Exclude out-of-range indexes.
-            if index < 0 or index >= length:
-                raise IndexError, "list index out of range"
+                # Handle negative indexes.
+                if index < 0:
+                    index += length
 
-            self.setItem(index, pythonToJS(self.jsCtx, pyValue))
-        elif isinstance(pyIndex, slice):
-            start, end, step = pyIndex.indices(length)
-            pyValueList = list(pyValue)
-            valueLength = len(pyValueList)
+                # Exclude out-of-range indexes.
+                if index < 0 or index >= length:
+                    raise IndexError, "list index out of range"
 
-            if step == 1:
-                # Move the elements after the slice to their final
-                # position.
-                self.copyBlock(end, length, start + valueLength)
+                self.setItem(index, pythonToJS(self.jsCtx, pyValue))
+            elif isinstance(pyIndex, slice):
+                start, end, step = pyIndex.indices(length)
+                pyValueList = list(pyValue)
+                valueLength = len(pyValueList)
 
-                if end - start > valueLength:
-                    # Truncate the list to its new length.
-                    self.setLength(length - (end - start) + valueLength)
+                if step == 1:
+                    if self.spliceArray(start, max(end - start, 0),
+                                        pyValueList):
+                        return
+
+                    # Move the elements after the slice to their final
+                    # position.
+                    self.copyBlock(end, length, start + valueLength)
+
+                    if end - start > valueLength:
+                        # Truncate the list to its new length.
+                        self.setLength(length - (end - start) + valueLength)
+                else:
+                    # Calculate the size of the extended slice.
+                    sliceSize = (end - start) / step
+                    if (end - start) % step > 0:
+                        sliceSize += 1
+
+                    if sliceSize != valueLength:
+                        raise ValueError, "attempt to assign sequence of " \
+                            "size %d to extended slice of size %d" % \
+                            (valueLength, sliceSize)
+
+                # Copy the elements to their destination.
+                i = start
+                for pyElem in pyValueList:
+                    self.setItem(i, pythonToJS(self.jsCtx, pyElem))
+                    i += step
             else:
-                # Calculate the size of the extended slice.
-                sliceSize = (end - start) / step
-                if (end - start) % step > 0:
-                    sliceSize += 1
-
-                if sliceSize != valueLength:
-                    raise ValueError, "attempt to assign sequence of size" \
-                        " %d to extended slice of size %d" % \
-                        (valueLength, sliceSize)
-
-            # Copy the elements to their destination.
-            i = start
-            for pyElem in pyValueList:
-                self.setItem(i, pythonToJS(self.jsCtx, pyElem))
-                i += step
-        else:
-            raise TypeError, "list indices must be integers, not %s" % \
-                pyIndex.__class__.__name__
+                raise TypeError, "list indices must be integers, not %s" % \
+                    pyIndex.__class__.__name__
+        finally:
+            self.ctx.jsLock.release()
 
     def __delitem__(self, pyIndex):
         cdef int index
-        cdef int length = self.getLength()
+        cdef int length
         cdef int start, end, step
         cdef int frm, dest, nextDel
 
-        if isinstance(pyIndex, int) or isinstance(pyIndex, long):
+        self.ctx.jsLock.acquire()
+        try:
+            length = self.getLength()
+
+            if isinstance(pyIndex, int) or isinstance(pyIndex, long):
+                index = pyIndex
+
+                # Handle negative indexes.
+                if index < 0:
+                    index += length
+
+                # Exclude out-of-range indexes.
+                if index < 0 or index >= length:
+                    raise IndexError, "list index out of range"
+
+                if not self.spliceArray(index, 1, []):
+                    self.copyBlock(index + 1, length, index)
+                    self.setLength(length - 1)
+            elif isinstance(pyIndex, slice):
+                start, end, step = pyIndex.indices(length)
+
+                if step == 1:
+                    if self.spliceArray(start, max(end - start, 0), []):
+                        return
+
+                    # Move the elements after the slice to their final
+                    # position.
+                    self.copyBlock(end, length, start)
+                    self.setLength(length - (end - start))
+                else:
+                    # Copy the elements to their final positions. Elements
+                    # are copied from frm to dest. nextDel marks the
+                    # position of the next element that must be deleted
+                    # (-1 if no more elements have to be deleted).
+
+                    nextDel = start
+                    if nextDel >= end:
+                        nextDel = -1
+
+                    dest = start
+                    for frm in range(start, length):
+                        if frm == nextDel:
+                            nextDel += step
+                            if nextDel >= end:
+                                nextDel = -1
+                        else:
+                            self.setItem(dest, self.getItem(frm))
+                            dest += 1
+
+                    # Truncate the list.
+                    self.setLength(dest)
+            else:
+                raise TypeError, "list indices must be integers, not %s" % \
+                    pyIndex.__class__.__name__
+        finally:
+            self.ctx.jsLock.release()
+
+    def insert(self, pyIndex, pyValue):
+        cdef int index
+        cdef int length
+
+        self.ctx.jsLock.acquire()
+        try:
+            length = self.getLength()
+
+            if not isinstance(pyIndex, int) and not isinstance(pyIndex, long):
+                raise TypeError, "list indices must be integers, not %s" % \
+                    pyIndex.__class__.__name__
+
             index = pyIndex
 
+            # The insert method is special in how indexes are handled:
+
             # Handle negative indexes.
             if index < 0:
                 index += length
 
-            # Exclude out-of-range indexes.
-            if index < 0 or index >= length:
-                raise IndexError, "list index out of range"
+            # Handle out-of-range indexes.
+            if index < 0:
+                index = 0
+            elif index > length:
+                index = length
 
-            self.copyBlock(index + 1, length, index)
-            self.setLength(length - 1)
-        elif isinstance(pyIndex, slice):
-            start, end, step = pyIndex.indices(length)
+            if not self.spliceArray(index, 0, [pyValue]):
+                self.copyBlock(index, length, index + 1)
+                self.setItem(index, pythonToJS(self.jsCtx, pyValue))
+        finally:
+            self.ctx.jsLock.release()
+
+    def index(self, pyItem, start=0, stop=None):
+        """Return the first position of ``pyItem`` between ``start``
+        and ``stop``. Raise ``ValueError`` if it is not present."""
+        cdef int length
+        cdef int begin, end
+        cdef int pos
+        cdef int i
 
-            if step == 1:
-                # Move the elements after the slice to their final
-                # position.
-                self.copyBlock(end, length, start)
-                self.setLength(length - (end - start))
-            else:
-                # Copy the elements to their final positions. Elements
-                # are copied from frm to dest. nextDel marks the
-                # position of the next element that must be deleted
-                # (-1 if no more elements have to be deleted).
-
-                nextDel = start
-                if nextDel >= end:
-                    nextDel = -1
-
-                dest = start
-                for frm in range(start, length):
-                    if frm == nextDel:
-                        nextDel += step
-                        if nextDel >= end:
-                            nextDel = -1
-                    else:
-                        self.setItem(dest, self.getItem(frm))
-                        dest += 1
-
-                # Truncate the list.
-                self.setLength(dest)
-        else:
-            raise TypeError, "list indices must be integers, not %s" % \
-                pyIndex.__class__.__name__
+        self.ctx.jsLock.acquire()
+        try:
+            length = self.getLength()
+            begin, end, _ = slice(start, stop).indices(length)
+
+            pos = self.nativeIndexOf(pyItem, begin)
+            if pos == -2:
+                pos = -1
+                for i in range(begin, end):
+                    value = jsToPython(self.jsCtx, self.getItem(i))
+                    if value is pyItem or value == pyItem:
+                        pos = i
+                        break
+
+            if pos < 0 or pos >= end:
+                raise ValueError, "%r is not in list" % (pyItem,)
+            return pos
+        finally:
+            self.ctx.jsLock.release()
 
-    def insert(self, pyIndex, pyValue):
-        cdef int index
-        cdef int length = self.getLength()
+    def count(self, pyItem):
+        """Return the number of occurrences of ``pyItem``."""
+        cdef int result = 0
+        cdef int i
+
+        self.ctx.jsLock.acquire()
+        try:
+            for i in range(self.getLength()):
+                value = jsToPython(self.jsCtx, self.getItem(i))
+                if value is pyItem or value == pyItem:
+                    result += 1
+            return result
+        finally:
+            self.ctx.jsLock.release()
+
+    def append(self, pyValue):
+        """Append ``pyValue`` to the end of the sequence."""
+        self.extend((pyValue,))
+
+    def extend(self, pyValues):
+        """Append the items of ``pyValues`` to the end of the
+        sequence."""
+        cdef list pyValueList = list(pyValues)
+        cdef int length
+        cdef int i
+
+        self.ctx.jsLock.acquire()
+        try:
+            length = self.getLength()
+            if self.spliceArray(length, 0, pyValueList):
+                return
+
+            for i in range(len(pyValueList)):
+                self.setItem(length + i,
+                             pythonToJS(self.jsCtx, pyValueList[i]))
+            self.setLength(length + len(pyValueList))
+        finally:
+            self.ctx.jsLock.release()
+
+    def __iadd__(self, pyValues):
+        self.extend(pyValues)
+        return self
+
+    def pop(self, pyIndex=-1):
+        """Remove and return the item at ``pyIndex`` (the last one by
+        default)."""
+        self.ctx.jsLock.acquire()
+        try:
+            pyValue = self[pyIndex]
+            del self[pyIndex]
+            return pyValue
+        finally:
+            self.ctx.jsLock.release()
+
+    def remove(self, pyItem):
+        """Remove the first occurrence of ``pyItem``. Raise
+        ``ValueError`` if it is not present."""
+        self.ctx.jsLock.acquire()
+        try:
+            del self[self.index(pyItem)]
+        finally:
+            self.ctx.jsLock.release()
+
+    def clear(self):
+        """Remove all items from the sequence."""
+        del self[:]
+
+    def reverse(self):
+        """Reverse the sequence in place."""
+        cdef JSObjectRef jsReverse
+        cdef JSValueRef jsTmp
+        cdef int length
+        cdef int i
+
+        self.ctx.jsLock.acquire()
+        try:
+            jsReverse = self.getArrayMethod(jsReverseName)
+            if jsReverse != NULL:
+                invokeJSFunction(self.jsCtx, jsReverse, self.jsObject, (),
+                                 False)
+                return
+
+            length = self.getLength()
+            for i in range(length // 2):
+                jsTmp = self.getItem(i)
+                self.setItem(i, self.getItem(length - 1 - i))
+                self.setItem(length - 1 - i, jsTmp)
+        finally:
+            self.ctx.jsLock.release()
+
+    def __reversed__(self):
+        cdef int i = len(self) - 1
+
+        while i >= 0:
+            yield self[i]
+            i -= 1
 
-        if not isinstance(pyIndex, int) and not isinstance(pyIndex, long):
-            raise TypeError, "list indices must be integers, not %s" % \
-                pyIndex.__class__.__name__
+    def buildIndex(self):
+        """Return a ``JSSequenceIndex`` for fast membership queries on
+        the current contents of the sequence."""
+        return JSSequenceIndex(self.toList(deep=False))
 
-        index = pyIndex
+    def toList(self, deep=True, maxDepth=MAX_CONVERSION_DEPTH):
+        """Convert the sequence into a list in a single pass.
 
-        # The insert method is special in how indexes are handled:
+        If ``deep`` is true, nested arrays and objects are converted
+        into lists and dicts as well, up to ``maxDepth`` levels
+        (``ValueError`` is raised for deeper or cyclic structures).
+        Otherwise, the items are converted as usual."""
+        self.ctx.jsLock.acquire()
+        try:
+            return jsArrayToList(self.jsCtx, self.jsObject,
+                                 maxDepth if deep else 1, deep,
+                                 {<long>self.jsObject})
+        finally:
+            self.ctx.jsLock.release()
 
-        # Handle negative indexes.
-        if index < 0:
-            index += length
 
-        # Handle out-of-range indexes.
-        if index < 0:
-            index = 0
-        elif index > length:
-            index = length
+collections.abc.MutableSequence.register(JSSequence)
 
-        self.copyBlock(index, length, index + 1)
-        self.setItem(index, pythonToJS(self.jsCtx, pyValue))
 
+class JSSequenceIndex(object):
+    """Snapshot index of the values in a JavaScript sequence, as
+    returned by ``JSSequence.buildIndex``.
 
-class JSSequence(_JSSequence, collections.MutableSequence):
-    """Mix ``_JSSequence`` and ``collections.MutableSequence``."""
-    __slots__ = ()
+    Values are mapped to their positions with a hash table, so that
+    repeated membership queries on large arrays are cheap. Unhashable
+    values (e.g. JavaScript objects) are not indexed. The index does
+    not follow later changes to the sequence."""
 
+    def __init__(self, values):
+        self._positions = {}
+        self._length = len(values)
+        for i, value in enumerate(values):
+            try:
+                self._positions.setdefault(value, []).append(i)
+            except TypeError:
+                pass
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, value):
+        return value in self._positions
+
+    def index(self, value):
+        """Return the first position of ``value``. Raise ``ValueError``
+        if it is not present."""
+        try:
+            return self._positions[value][0]
+        except KeyError:
+            raise ValueError, "%r is not in list" % (value,)
+
+    def count(self, value):
+        """Return the number of occurrences of ``value``."""
+        return len(self._positions.get(value, ()))
+
+    def positions(self, value):
+        """Return the list of positions of ``value``."""
+        return list(self._positions.get(value, ()))
+
+
+# Sizes of the chunks fetched by sequence iterators. Chunks start small,
+# so that breaking out of a loop early is cheap, and grow up to the
+# maximum size for long sequences.
+DEF MIN_ITER_CHUNK_SIZE = 16
+DEF MAX_ITER_CHUNK_SIZE = 1024
 
 cdef class _JSSeqIterator:
-    """Iterator class for JavaScript array-like objects."""
+    """Iterator class for JavaScript array-like objects.
+
+    Elements are fetched and converted in chunks. Changes made to the
+    sequence while iterating over it are noticed at the next chunk."""
 
-    cdef _JSSequence pySeq
+    cdef JSSequence pySeq
     cdef int index
+    cdef list chunk
+    cdef Py_ssize_t chunkPos
+    cdef int chunkSize
 
     def __init__(self, pySeq):
         self.pySeq = pySeq
         self.index = 0
+        self.chunk = []
+        self.chunkPos = 0
+        self.chunkSize = MIN_ITER_CHUNK_SIZE
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        if self.index < self.pySeq.getLength():
-            value = self.pySeq[self.index]
-            self.index += 1
-            return value
-        else:
-            raise StopIteration
+        if self.chunkPos >= len(self.chunk):
+            self.chunk = self.pySeq.getChunk(self.index, self.chunkSize)
+            self.chunkPos = 0
+            if not self.chunk:
+                raise StopIteration
+
+            self.index += len(self.chunk)
+            if self.chunkSize < MAX_ITER_CHUNK_SIZE:
+                self.chunkSize *= 2
+
+        value = self.chunk[self.chunkPos]
+        self.chunkPos += 1
+        return value
 
     def next(self):
         """Wrap the ``__next__`` method for backwards compatibility.
@@ -555,7 +2001,7 @@ cdef class _JSSeqIterator:
         return self.__next__()
 
 
-cdef class _JSObject(_JSBaseObject):
+cdef class JSObject(_JSBaseObject):
     """Wrapper class to make JavaScript objects accessible from
     Python.
 
@@ -566,88 +2012,110 @@ cdef class _JSObject(_JSBaseObject):
     ``__asSeq__`` method ) can be invoked to obtain a view of the
     object that behaves as a Python sequence.
 
-    Also, since Cython extension classes cannot inherit from Python
-    classes, we first define class ``_JSObject`` and then define
-    ``JSObject`` as a standard Python class that mixes in
-    ``MutableSequence`` from the ``collections`` module."""
+    The whole mutable mapping protocol is implemented natively, and
+    the class is registered as a ``collections.abc.MutableMapping``
+    instead of inheriting from it."""
 
     # Sequence view of this object.
-    cdef _JSSequence seqView
+    cdef JSSequence seqView
+
+    # Bound methods created for this object, by property name. Created
+    # lazily.
+    cdef dict boundMethods
 
     def __init__(self):
         _JSBaseObject.__init__(self)
         self.seqView = None
+        self.boundMethods = None
+
+    cdef object getBoundMethod(self, pyName, JSObjectRef jsFunction):
+        """Return a bound method calling ``jsFunction`` (the value of
+        property ``pyName``) on this object.
+
+        Bound methods are cached, and a cached method is reused as long
+        as the property still refers to the same function."""
+        cdef JSBoundMethod method
+
+        if self.boundMethods is None:
+            self.boundMethods = {}
+        else:
+            method = self.boundMethods.get(pyName)
+            if method is not None and method.jsObject == jsFunction:
+                return method
+
+        method = makeJSBoundMethod(self.jsCtx, jsFunction, self.jsObject)
+        self.boundMethods[pyName] = method
+        return method
 
     def __getattr__(self, pyName):
-        cdef JSStringRef jsName
+        cdef _JSName jsName = jsNameFromPython(pyName)
         cdef JSValueRef jsException = NULL
         cdef JSValueRef jsResult
 
-        jsName = createJSStringFromPython(pyName)
+        self.ctx.jsLock.acquire()
         try:
             jsResult = JSObjectGetProperty(self.jsCtx, self.jsObject,
-                                           jsName, &jsException)
+                                           jsName.jsStr, &jsException)
             if jsException != NULL:
                 raise jsExceptionToPython(self.jsCtx, jsException)
 
             if JSValueIsUndefined(self.jsCtx, jsResult):
-                # This may be a property with an undefined value, or
-                # no property at all.
-                if JSObjectHasProperty(self.jsCtx, self.jsObject, jsName):
+                # This may be a property with an undefined value, or no
+                # property at all.
+                if JSObjectHasProperty(self.jsCtx, self.jsObject,
+                                       jsName.jsStr):
                     return jsToPython(self.jsCtx, jsResult)
                 else:
-                    # For inexisting properties, we use Python
-                    # behavior.
+                    # For inexisting properties, we use Python behavior.
                     raise AttributeError, \
                         "JavaScript object has no property '%s'" % pyName
             elif not JSValueIsObjectOfClass(self.jsCtx, jsResult,
                                           pyObjectClass) and \
                   JSValueIsObject(self.jsCtx, jsResult) and \
                   JSObjectIsFunction(self.jsCtx, jsResult):
-                # This is a native JavaScript function, we mimic
-                # Python's behavior and return it bound to this
-                # object.
-                return makeJSBoundMethod(self.jsCtx, jsResult,
-                                         self.jsObject)
+                # This is a native JavaScript function, we mimic Python's
+                # behavior and return it bound to this object.
+                return self.getBoundMethod(pyName, <JSObjectRef>jsResult)
             else:
                 return jsToPython(self.jsCtx, jsResult)
         finally:
-            JSStringRelease(jsName)
+            self.ctx.jsLock.release()
 
     def __setattr__(self, pyName, pyValue):
-        cdef JSStringRef jsName
+        cdef _JSName jsName = jsNameFromPython(pyName)
         cdef JSValueRef jsException = NULL
 
-        jsName = createJSStringFromPython(pyName)
+        self.ctx.jsLock.acquire()
         try:
-            JSObjectSetProperty(self.jsCtx, self.jsObject, jsName,
+            JSObjectSetProperty(self.jsCtx, self.jsObject, jsName.jsStr,
                                 pythonToJS(self.jsCtx, pyValue),
                                 kJSPropertyAttributeNone, &jsException)
             if jsException != NULL:
                 raise jsExceptionToPython(self.jsCtx, jsException)
         finally:
-            JSStringRelease(jsName)
+            self.ctx.jsLock.release()
 
     def __delattr__(self, pyName):
-        cdef JSStringRef jsName
+        cdef _JSName jsName = jsNameFromPython(pyName)
         cdef JSValueRef jsException = NULL
 
-        jsName = createJSStringFromPython(pyName)
+        self.ctx.jsLock.acquire()
         try:
-            if not JSObjectHasProperty(self.jsCtx, self.jsObject, jsName):
+            if not JSObjectHasProperty(self.jsCtx, self.jsObject,
+                                       jsName.jsStr):
                 # Use Python behavior for inexisting properties.
                 raise AttributeError, \
                     "JavaScript object has no property '%s'" % pyName
 
             if not JSObjectDeleteProperty(self.jsCtx, self.jsObject,
-                                          jsName, &jsException):
+                                          jsName.jsStr, &jsException):
                 raise AttributeError, \
                     "property '%s' of JavaScript object cannot " \
                     "be deleted" % pyName
             if jsException != NULL:
                 raise jsExceptionToPython(self.jsCtx, jsException)
         finally:
-            JSStringRelease(jsName)
+            self.ctx.jsLock.release()
 
     def __asSeq__(self):
         """Return the sequence view of this object.
@@ -667,10 +2135,48 @@ cdef class _JSObject(_JSBaseObject):
         function in this module.
         """
         if self.seqView is None:
-            self.seqView = JSSequence()
-            self.seqView.setup(self.jsCtx, self.jsObject)
+            self.ctx.jsLock.acquire()
+            try:
+                self.seqView = JSSequence.__new__(JSSequence)
+                self.seqView.setup(self.jsCtx, self.jsObject)
+            finally:
+                self.ctx.jsLock.release()
         return self.seqView
 
+    def __bind__(self, pyName):
+        """Return the method called ``pyName`` of this object, bound to
+        the object.
+
+        The result is a reusable callable. It is the same object that
+        attribute access returns, and stays cached for as long as the
+        property refers to the same function. A ``TypeError`` is
+        raised if the property is not a JavaScript function.
+
+        This method should normally be called through the ``bind``
+        function in this module (a ``bind`` method would hide the
+        JavaScript ``bind`` method of functions).
+        """
+        cdef _JSName jsName = jsNameFromPython(pyName)
+        cdef JSValueRef jsException = NULL
+        cdef JSValueRef jsResult
+
+        self.ctx.jsLock.acquire()
+        try:
+            jsResult = JSObjectGetProperty(self.jsCtx, self.jsObject,
+                                           jsName.jsStr, &jsException)
+            if jsException != NULL:
+                raise jsExceptionToPython(self.jsCtx, jsException)
+
+            if JSValueIsObjectOfClass(self.jsCtx, jsResult,
+                                      pyObjectClass) or \
+                    not JSValueIsObject(self.jsCtx, jsResult) or \
+                    not JSObjectIsFunction(self.jsCtx, jsResult):
+                raise TypeError, \
+                    "JavaScript property '%s' is not a function" % pyName
+            return self.getBoundMethod(pyName, <JSObjectRef>jsResult)
+        finally:
+            self.ctx.jsLock.release()
+
 
     #
     # Methods implementing the mutable mapping protocol
@@ -679,125 +2185,533 @@ cdef class _JSObject(_JSBaseObject):
     def __len__(self):
         cdef JSPropertyNameArrayRef nameArray
 
-        nameArray = JSObjectCopyPropertyNames(self.jsCtx, self.jsObject)
+        self.ctx.jsLock.acquire()
         try:
-            return JSPropertyNameArrayGetCount(nameArray)
+            nameArray = JSObjectCopyPropertyNames(self.jsCtx, self.jsObject)
+            try:
+                return JSPropertyNameArrayGetCount(nameArray)
+            finally:
+                JSPropertyNameArrayRelease(nameArray)
         finally:
-            JSPropertyNameArrayRelease(nameArray)
+            self.ctx.jsLock.release()
 
     def __iter__(self):
         return _JSObjectIterator(self)
 
+    def keys(self):
+        """Return a view on the property names of this object (see
+        ``JSObjectKeysView``)."""
+        return makeJSObjectView(JSObjectKeysView, self)
+
+    def values(self):
+        """Return a view on the property values of this object (see
+        ``JSObjectValuesView``)."""
+        return makeJSObjectView(JSObjectValuesView, self)
+
+    def items(self):
+        """Return a view on the (name, value) pairs of this object (see
+        ``JSObjectItemsView``)."""
+        return makeJSObjectView(JSObjectItemsView, self)
+
+    cdef object getValue(self, JSStringRef jsName):
+        """Return the converted value of the property ``jsName``."""
+        cdef JSValueRef jsException = NULL
+        cdef JSValueRef jsResult
+
+        self.ctx.jsLock.acquire()
+        try:
+            jsResult = JSObjectGetProperty(self.jsCtx, self.jsObject, jsName,
+                                           &jsException)
+            if jsException != NULL:
+                raise jsExceptionToPython(self.jsCtx, jsException)
+            return jsToPython(self.jsCtx, jsResult)
+        finally:
+            self.ctx.jsLock.release()
+
     def __contains__(self, pyKey):
-        cdef JSStringRef jsKey
+        cdef _JSName jsKey = jsNameFromPython(pyKey)
 
-        jsKey = createJSStringFromPython(pyKey)
+        self.ctx.jsLock.acquire()
         try:
             return JSObjectHasProperty(self.jsCtx, self.jsObject,
-                                       jsKey) != 0
+                                       jsKey.jsStr) != 0
         finally:
-            JSStringRelease(jsKey)
+            self.ctx.jsLock.release()
 
     def __getitem__(self, pyKey):
-        cdef JSStringRef jsKey
+        cdef _JSName jsKey = jsNameFromPython(pyKey)
         cdef JSValueRef jsException = NULL
         cdef JSValueRef jsResult
 
-        jsKey = createJSStringFromPython(pyKey)
+        self.ctx.jsLock.acquire()
         try:
             jsResult = JSObjectGetProperty(self.jsCtx, self.jsObject,
-                                           jsKey, &jsException)
+                                           jsKey.jsStr, &jsException)
             if jsException != NULL:
                 raise jsExceptionToPython(self.jsCtx, jsException)
 
             if JSValueIsUndefined(self.jsCtx, jsResult):
-                # This may be a property with an undefined value, or
-                # no property at all.
-                if JSObjectHasProperty(self.jsCtx, self.jsObject, jsKey):
+                # This may be a property with an undefined value, or no
+                # property at all.
+                if JSObjectHasProperty(self.jsCtx, self.jsObject,
+                                       jsKey.jsStr):
                     return jsToPython(self.jsCtx, jsResult)
                 else:
-                    # For inexisting properties, we use Python
-                    # behavior.
+                    # For inexisting properties, we use Python behavior.
                     raise KeyError, \
                         "JavaScript object has no property '%s'" % pyKey
             else:
                 return jsToPython(self.jsCtx, jsResult)
         finally:
-            JSStringRelease(jsKey)
+            self.ctx.jsLock.release()
 
     def __setitem__(self, pyKey, pyValue):
-        cdef JSStringRef jsKey
+        cdef _JSName jsKey = jsNameFromPython(pyKey)
         cdef JSValueRef jsException = NULL
 
-        jsKey = createJSStringFromPython(pyKey)
+        self.ctx.jsLock.acquire()
         try:
-            JSObjectSetProperty(self.jsCtx, self.jsObject, jsKey,
+            JSObjectSetProperty(self.jsCtx, self.jsObject, jsKey.jsStr,
                                 pythonToJS(self.jsCtx, pyValue),
                                 kJSPropertyAttributeNone, &jsException)
             if jsException != NULL:
                 raise jsExceptionToPython(self.jsCtx, jsException)
         finally:
-            JSStringRelease(jsKey)
+            self.ctx.jsLock.release()
 
     def __delitem__(self, pyKey):
-        cdef JSStringRef jsKey
+        cdef _JSName jsKey = jsNameFromPython(pyKey)
         cdef JSValueRef jsException = NULL
 
-        jsKey = createJSStringFromPython(pyKey)
+        self.ctx.jsLock.acquire()
         try:
-            if not JSObjectHasProperty(self.jsCtx, self.jsObject, jsKey):
+            if not JSObjectHasProperty(self.jsCtx, self.jsObject,
+                                       jsKey.jsStr):
                 # Use Python behavior for inexisting properties.
                 raise KeyError, \
                     "JavaScript object has no property '%s'" % pyKey
 
             if not JSObjectDeleteProperty(self.jsCtx, self.jsObject,
-                                          jsKey, &jsException):
+                                          jsKey.jsStr, &jsException):
                 raise KeyError, \
                     "property '%s' of JavaScript object cannot " \
                     "be deleted" % pyKey
             if jsException != NULL:
                 raise jsExceptionToPython(self.jsCtx, jsException)
         finally:
-            JSStringRelease(jsKey)
+            self.ctx.jsLock.release()
 
+    def toDict(self, deep=True, maxDepth=MAX_CONVERSION_DEPTH):
+        """Convert the enumerable properties of this object into a
+        dict in a single pass.
 
-class JSObject(_JSObject, collections.MutableMapping):
-    """Mix ``_JSObject`` and ``collections.MutableMapping``."""
-    __slots__ = ()
+        If ``deep`` is true, nested arrays and objects are converted
+        into lists and dicts as well, up to ``maxDepth`` levels
+        (``ValueError`` is raised for deeper or cyclic structures).
+        Otherwise, the values are converted as usual."""
+        self.ctx.jsLock.acquire()
+        try:
+            return jsObjectToDict(self.jsCtx, self.jsObject,
+                                  maxDepth if deep else 1, deep,
+                                  {<long>self.jsObject})
+        finally:
+            self.ctx.jsLock.release()
 
+    def get(self, pyKey, default=None):
+        """Return the value of property ``pyKey``, or ``default`` if
+        the object has no such property."""
+        cdef _JSName jsKey = jsNameFromPython(pyKey)
 
-cdef class _JSObjectIterator:
-    """Iterator class for JavaScript objects.
+        self.ctx.jsLock.acquire()
+        try:
+            if not JSObjectHasProperty(self.jsCtx, self.jsObject,
+                                       jsKey.jsStr):
+                return default
+            return self.getValue(jsKey.jsStr)
+        finally:
+            self.ctx.jsLock.release()
+
+    def setdefault(self, pyKey, default=None):
+        """Return the value of property ``pyKey``, setting it to
+        ``default`` first if the object has no such property."""
+        cdef _JSName jsKey = jsNameFromPython(pyKey)
+
+        self.ctx.jsLock.acquire()
+        try:
+            if JSObjectHasProperty(self.jsCtx, self.jsObject, jsKey.jsStr):
+                return self.getValue(jsKey.jsStr)
+            self[pyKey] = default
+            return default
+        finally:
+            self.ctx.jsLock.release()
+
+    def pop(self, pyKey, default=_missing):
+        """Remove property ``pyKey`` and return its value. If the
+        object has no such property, return ``default`` if given, and
+        raise ``KeyError`` otherwise."""
+        cdef _JSName jsKey = jsNameFromPython(pyKey)
+
+        self.ctx.jsLock.acquire()
+        try:
+            if not JSObjectHasProperty(self.jsCtx, self.jsObject,
+                                       jsKey.jsStr) and \
+                    default is not _missing:
+                return default
+            pyValue = self.getValue(jsKey.jsStr)
+            del self[pyKey]
+            return pyValue
+        finally:
+            self.ctx.jsLock.release()
+
+    def popitem(self):
+        """Remove an enumerable property and return it as a (name,
+        value) pair. Raise ``KeyError`` if there is none."""
+        cdef _JSPropertyNames names
+
+        self.ctx.jsLock.acquire()
+        try:
+            names = makePropertyNames(self)
+            if names.count == 0:
+                raise KeyError, "popitem(): JavaScript object has no " \
+                    "enumerable properties"
+            pyKey = pyStringFromJS(names.getName(0))
+            pyValue = self.getValue(names.getName(0))
+            del self[pyKey]
+            return (pyKey, pyValue)
+        finally:
+            self.ctx.jsLock.release()
+
+    def clear(self):
+        """Delete all enumerable properties of this object."""
+        cdef _JSPropertyNames names
+        cdef JSValueRef jsException = NULL
+        cdef Py_ssize_t i
+
+        self.ctx.jsLock.acquire()
+        try:
+            names = makePropertyNames(self)
+            for i in range(names.count):
+                if not JSObjectDeleteProperty(self.jsCtx, self.jsObject,
+                                              names.getName(i),
+                                              &jsException):
+                    raise KeyError, \
+                        "property '%s' of JavaScript object cannot " \
+                        "be deleted" % pyStringFromJS(names.getName(i))
+                if jsException != NULL:
+                    raise jsExceptionToPython(self.jsCtx, jsException)
+        finally:
+            self.ctx.jsLock.release()
+
+    def update(self, other=(), **kwargs):
+        """Set properties from the mapping or iterable of (name,
+        value) pairs ``other``, and from the keyword arguments."""
+        self.ctx.jsLock.acquire()
+        try:
+            if isinstance(other, collections.abc.Mapping):
+                for pyKey in other:
+                    self[pyKey] = other[pyKey]
+            elif hasattr(other, 'keys'):
+                for pyKey in other.keys():
+                    self[pyKey] = other[pyKey]
+            else:
+                for pyKey, pyValue in other:
+                    self[pyKey] = pyValue
+            for pyKey, pyValue in kwargs.items():
+                self[pyKey] = pyValue
+        finally:
+            self.ctx.jsLock.release()
+
+    def __await__(self):
+        """Wait until this object, a promise or any other thenable
+        (object with a ``then`` method), is settled and return its
+        value. A rejection is raised as an exception: wrapped Python
+        exceptions are raised as they are, other reasons as a
+        ``JSException``.
+
+        Awaiting requires a running ``asyncio`` event loop. JavaScript
+        runs pending promise reactions whenever a call into it
+        returns, so that promises settled by JavaScript code or by
+        coroutines (see ``awaitableToJS``) wake up the awaiting task
+        without further help."""
+        try:
+            then = self.then
+        except AttributeError:
+            then = None
+        if not callable(then):
+            raise TypeError, "JavaScript object is not awaitable"
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def setResult(value):
+            if not future.done():
+                future.set_result(value)
+
+        def setException(reason):
+            if not future.done():
+                if not isinstance(reason, BaseException):
+                    reason = JSException(reason)
+                future.set_exception(reason)
+
+        # The reactions may run in another thread, e.g., if the
+        # promise is settled from a worker thread.
+        def onFulfilled(value):
+            loop.call_soon_threadsafe(setResult, value)
+
+        def onRejected(reason):
+            loop.call_soon_threadsafe(setException, reason)
 
-    This provides mapping-style iteration on JavaScript objects."""
+        then(onFulfilled, onRejected)
+        return (yield from future)
 
+    def __eq__(self, other):
+        if not isinstance(other, collections.abc.Mapping):
+            return NotImplemented
+        return self.toDict(deep=False) == dict(other.items())
+
+    def __ne__(self, other):
+        if not isinstance(other, collections.abc.Mapping):
+            return NotImplemented
+        return self.toDict(deep=False) != dict(other.items())
+
+
+collections.abc.MutableMapping.register(JSObject)
+
+
+@cython.no_gc_clear
+cdef class _JSPropertyNames:
+    """Snapshot of the enumerable property names of a JavaScript
+    object, shared by iterators and views."""
+
+    cdef JSContext ctx
     cdef JSPropertyNameArrayRef nameArray
-    cdef int index
+    cdef Py_ssize_t count
+
+    cdef inline JSStringRef getName(self, Py_ssize_t index):
+        return JSPropertyNameArrayGetNameAtIndex(self.nameArray, index)
+
+    def __dealloc__(self):
+        if self.nameArray == NULL:
+            return
+
+        self.ctx.jsLock.acquire()
+        try:
+            JSPropertyNameArrayRelease(self.nameArray)
+        finally:
+            self.ctx.jsLock.release()
 
-    def __init__(self, _JSObject pyObject):
-        self.nameArray = JSObjectCopyPropertyNames(pyObject.jsCtx,
-                                                   pyObject.jsObject)
+cdef _JSPropertyNames makePropertyNames(JSObject pyObject):
+    """Factory function for '_JSPropertyNames' instances."""
+    cdef _JSPropertyNames names = _JSPropertyNames.__new__(_JSPropertyNames)
+
+    names.ctx = pyObject.ctx
+    names.ctx.jsLock.acquire()
+    try:
+        names.nameArray = JSObjectCopyPropertyNames(pyObject.jsCtx,
+                                                    pyObject.jsObject)
+        names.count = JSPropertyNameArrayGetCount(names.nameArray)
+    finally:
+        names.ctx.jsLock.release()
+    return names
+
+
+# Kinds of iteration over JavaScript objects.
+DEF ITER_KEYS = 0
+DEF ITER_VALUES = 1
+DEF ITER_ITEMS = 2
+
+cdef class _JSObjectIterator:
+    """Iterator class for JavaScript objects.
+
+    This provides mapping-style iteration on JavaScript objects, over
+    a snapshot of their property names. Depending on its kind, the
+    iterator produces keys, values or (key, value) items. Values are
+    read with the names stored in the snapshot."""
+
+    cdef JSObject pyObject
+    cdef _JSPropertyNames names
+    cdef int kind
+    cdef Py_ssize_t index
+
+    def __init__(self, JSObject pyObject, _JSPropertyNames names=None,
+                 int kind=ITER_KEYS):
+        self.pyObject = pyObject
+        if names is None:
+            names = makePropertyNames(pyObject)
+        self.names = names
+        self.kind = kind
         self.index = 0
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        if self.index < JSPropertyNameArrayGetCount(self.nameArray):
-            pyPropName = pyStringFromJS(JSPropertyNameArrayGetNameAtIndex(
-                    self.nameArray, self.index))
-            self.index += 1
-            return pyPropName
-        else:
+        cdef JSStringRef jsName
+
+        if self.index >= self.names.count:
             raise StopIteration
 
+        jsName = self.names.getName(self.index)
+        self.index += 1
+        if self.kind == ITER_KEYS:
+            return pyStringFromJS(jsName)
+        elif self.kind == ITER_VALUES:
+            return self.pyObject.getValue(jsName)
+        else:
+            return (pyStringFromJS(jsName), self.pyObject.getValue(jsName))
+
     def next(self):
         """Wrap the ``__next__`` method for backwards compatibility.
         """
         return self.__next__()
 
-    def __dealloc__(self):
-        JSPropertyNameArrayRelease(self.nameArray)
+
+cdef class _JSObjectView:
+    """Base class for the views returned by the ``keys``, ``values``
+    and ``items`` methods of JavaScript objects.
+
+    Views work on a snapshot of the property names, taken when the
+    view is created. Their length is that of the snapshot, and
+    iterating over them reads the values directly with the names in
+    the snapshot. Create a new view to see properties added or
+    removed since then."""
+
+    cdef JSObject pyObject
+    cdef _JSPropertyNames names
+
+    def __len__(self):
+        return self.names.count
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, list(self))
+
+
+cdef bint isSubset(object pyItems, object other) except -1:
+    """Tell whether all the items of the set ``pyItems`` are in the
+    set ``other``."""
+    if len(pyItems) > len(other):
+        return False
+    for item in pyItems:
+        if item not in other:
+            return False
+    return True
+
+cdef class _JSObjectSetView(_JSObjectView):
+    """Base class for the views that are sets (keys and items).
+
+    They support comparisons and set operations like those of
+    ``collections.abc.Set``. Operations return Python sets."""
+
+    def __richcmp__(self, other, int op):
+        if not isinstance(other, collections.abc.Set):
+            return NotImplemented
+        if op == Py_LT:
+            return len(self) < len(other) and isSubset(self, other)
+        elif op == Py_LE:
+            return isSubset(self, other)
+        elif op == Py_EQ:
+            return len(self) == len(other) and isSubset(self, other)
+        elif op == Py_NE:
+            return not (len(self) == len(other) and isSubset(self, other))
+        elif op == Py_GT:
+            return len(self) > len(other) and isSubset(other, self)
+        else:
+            return isSubset(other, self)
+
+    # Either operand of the binary operators can be the view.
+
+    def __and__(x, y):
+        if not isinstance(x, _JSObjectSetView):
+            x, y = y, x
+        if not isinstance(y, collections.abc.Iterable):
+            return NotImplemented
+        return set([value for value in y if value in x])
+
+    def __or__(x, y):
+        if not isinstance(x, collections.abc.Iterable) or \
+                not isinstance(y, collections.abc.Iterable):
+            return NotImplemented
+        result = set(x)
+        result.update(y)
+        return result
+
+    def __sub__(x, y):
+        if not isinstance(x, collections.abc.Iterable) or \
+                not isinstance(y, collections.abc.Iterable):
+            return NotImplemented
+        if not isinstance(y, collections.abc.Set):
+            y = set(y)
+        return set([value for value in x if value not in y])
+
+    def __xor__(x, y):
+        if not isinstance(x, collections.abc.Iterable) or \
+                not isinstance(y, collections.abc.Iterable):
+            return NotImplemented
+        if not isinstance(x, collections.abc.Set):
+            x = set(x)
+        if not isinstance(y, collections.abc.Set):
+            y = set(y)
+        result = set([value for value in x if value not in y])
+        result.update([value for value in y if value not in x])
+        return result
+
+    def isdisjoint(self, other):
+        """Tell whether the view and ``other`` have no items in
+        common."""
+        for value in other:
+            if value in self:
+                return False
+        return True
+
+
+cdef class JSObjectKeysView(_JSObjectSetView):
+    """View on the property names of a JavaScript object."""
+
+    def __iter__(self):
+        return _JSObjectIterator(self.pyObject, self.names, ITER_KEYS)
+
+    def __contains__(self, pyKey):
+        return pyKey in self.pyObject
+
+
+cdef class JSObjectValuesView(_JSObjectView):
+    """View on the property values of a JavaScript object."""
+
+    def __iter__(self):
+        return _JSObjectIterator(self.pyObject, self.names, ITER_VALUES)
+
+    def __contains__(self, pyValue):
+        for value in self:
+            if value is pyValue or value == pyValue:
+                return True
+        return False
+
+
+cdef class JSObjectItemsView(_JSObjectSetView):
+    """View on the (name, value) pairs of a JavaScript object."""
+
+    def __iter__(self):
+        return _JSObjectIterator(self.pyObject, self.names, ITER_ITEMS)
+
+    def __contains__(self, item):
+        pyKey, pyValue = item
+        try:
+            value = self.pyObject[pyKey]
+        except KeyError:
+            return False
+        return value is pyValue or value == pyValue
+
+
+collections.abc.KeysView.register(JSObjectKeysView)
+collections.abc.ValuesView.register(JSObjectValuesView)
+collections.abc.ItemsView.register(JSObjectItemsView)
+
+cdef _JSObjectView makeJSObjectView(type cls, JSObject pyObject):
+    """Factory function for the views of JavaScript objects."""
+    cdef _JSObjectView view = cls.__new__(cls)
+    view.pyObject = pyObject
+    view.names = makePropertyNames(pyObject)
+    return view
 
 
 def asSeq(pyObject):
@@ -805,110 +2719,353 @@ def asSeq(pyObject):
     return pyObject.__asSeq__()
 
 
+def bind(pyObject, name):
+    """Return the method ``name`` of ``pyObject`` bound to it."""
+    return pyObject.__bind__(name)
+
+
 cdef makeJSObject(JSContextRef jsCtx, JSObjectRef jsObject):
     """Factory function for 'JSObject' instances."""
-    cdef _JSObject obj = JSObject()
+    cdef JSObject obj = JSObject.__new__(JSObject)
     obj.setup(jsCtx, jsObject)
     return obj
 
 
-cdef class _JSFunction(_JSObject):
-    """Specialized wrapper class to make JavaScript functions callable
-    from Python.
+# Calls with up to this number of arguments use an argument buffer on
+# the stack.
+DEF STACK_ARGS_SIZE = 8
 
-    This class gets mixed with ``collections.MutableMapping in the
-    ``JSFunction`` class."""
+cdef JSValueRef invokeJSFunction(JSContextRef jsCtx, JSObjectRef jsFunction,
+                                 JSObjectRef jsThisObj, tuple args,
+                                 bint releaseGIL) except NULL:
+    """Call a JavaScript function with ``jsThisObj`` as its 'this'
+    object (which may be NULL) and return the (unconverted) result.
 
-    def __call__(self, *args):
-        cdef JSValueRef *jsArgs
-        cdef JSValueRef result
-        cdef JSObjectRef jsThisObject
-        cdef JSValueRef jsError = NULL
+    The caller must hold the context lock. If ``releaseGIL`` is true,
+    the GIL is released while the function runs."""
+    cdef JSValueRef stackArgs[STACK_ARGS_SIZE]
+    cdef JSValueRef *jsArgs = stackArgs
+    cdef Py_ssize_t argCount = len(args)
+    cdef JSValueRef jsResult
+    cdef JSValueRef jsError = NULL
+    cdef Py_ssize_t i
 
-        if len(args):
-            jsArgs = <JSValueRef *>malloc(len(args) * sizeof(JSValueRef))
+    if argCount > STACK_ARGS_SIZE:
+        jsArgs = <JSValueRef *>malloc(argCount * sizeof(JSValueRef))
+        if jsArgs == NULL:
+            raise MemoryError
+
+    try:
+        for i in range(argCount):
+            jsArgs[i] = pythonToJS(jsCtx, args[i])
+
+        if releaseGIL:
+            with nogil:
+                jsResult = JSObjectCallAsFunction(jsCtx, jsFunction,
+                                                  jsThisObj, argCount,
+                                                  jsArgs, &jsError)
         else:
-            jsArgs = NULL
-        for i, arg in enumerate(args):
-            jsArgs[i] = pythonToJS(self.jsCtx, arg)
-        result = JSObjectCallAsFunction(self.jsCtx, self.jsObject,
-                                        NULL, len(args), jsArgs,
-                                        &jsError)
-        free(jsArgs)
-        if jsError != NULL:
-            raise jsExceptionToPython(self.jsCtx, jsError)
-        return jsToPython(self.jsCtx, result)
+            jsResult = JSObjectCallAsFunction(jsCtx, jsFunction, jsThisObj,
+                                              argCount, jsArgs, &jsError)
+    finally:
+        if jsArgs != stackArgs:
+            free(jsArgs)
+
+    if jsError != NULL:
+        raise jsExceptionToPython(jsCtx, jsError)
+    return jsResult
+
+cdef object callJSFunction(JSObject function, JSObjectRef jsThisObj,
+                           tuple args):
+    """Call a wrapped JavaScript function with ``jsThisObj`` as its
+    'this' object (which may be NULL).
+
+    If the function's context allows it, the GIL is released while
+    the function runs."""
+    cdef _JSLock jsLock = function.ctx.jsLock
+    cdef JSValueRef jsResult
+
+    jsLock.acquire()
+    try:
+        jsResult = invokeJSFunction(function.jsCtx, function.jsObject,
+                                    jsThisObj, args, jsLock.enabled)
+        return jsToPython(function.jsCtx, jsResult)
+    finally:
+        jsLock.release()
+
+cdef list callJSFunctionMany(JSObject function, JSObjectRef jsThisObj,
+                             object argTuples):
+    """Call a wrapped JavaScript function once for every argument
+    tuple in ``argTuples`` and return the list of results."""
+    cdef _JSLock jsLock = function.ctx.jsLock
+    cdef JSValueRef jsResult
+    cdef list results = []
+
+    jsLock.acquire()
+    try:
+        for args in argTuples:
+            if type(args) is not tuple:
+                args = tuple(args)
+            jsResult = invokeJSFunction(function.jsCtx, function.jsObject,
+                                        jsThisObj, args, jsLock.enabled)
+            results.append(jsToPython(function.jsCtx, jsResult))
+    finally:
+        jsLock.release()
+    return results
+
+
+cdef class JSFunction(JSObject):
+    """Specialized wrapper class to make JavaScript functions callable
+    from Python."""
+
+    def __call__(self, *args):
+        return callJSFunction(self, NULL, args)
+
+    def callMany(self, argTuples):
+        """Call the function once for every tuple of arguments in
+        ``argTuples`` and return a list with the results.
 
+        This is faster than calling the function repeatedly from
+        Python, since the context is only locked once."""
+        return callJSFunctionMany(self, NULL, argTuples)
+
+    def callAsync(self, *args):
+        """Call the function in the worker thread of its context and
+        return a ``concurrent.futures.Future`` for the result (see
+        ``JSContext.evaluateScriptAsync``). A ``ValueError`` is raised
+        unless the context releases the GIL."""
+        return self.ctx.submit(self, args)
 
-class JSFunction(_JSFunction, collections.MutableMapping):
-    """Mix ``_JSFunction`` and ``collections.MutableMapping``."""
-    __slots__ = ()
 
 
 cdef makeJSFunction(JSContextRef jsCtx, JSObjectRef jsObject):
     """Factory function for 'JSFunction' instances."""
-    cdef _JSFunction obj = JSFunction()
+    cdef JSFunction obj = JSFunction.__new__(JSFunction)
+    obj.setup(jsCtx, jsObject)
+    return obj
+
+
+cdef class JSTypedArray(JSObject):
+    """Specialized wrapper class for JavaScript typed arrays and array
+    buffers.
+
+    Their contents are exported through the buffer protocol, so that
+    ``memoryview(array)`` accesses them directly, without copying.
+    Array buffers are exported as bytes."""
+
+    cdef JSTypedArrayType arrayType
+    cdef char *format
+    cdef Py_ssize_t itemsize
+
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        cdef JSValueRef jsException = NULL
+        cdef char *data
+        cdef size_t byteLength
+        cdef Py_ssize_t *shapeAndStrides
+
+        self.ctx.jsLock.acquire()
+        try:
+            if self.arrayType == kJSTypedArrayTypeArrayBuffer:
+                data = <char *>JSObjectGetArrayBufferBytesPtr(
+                    self.jsCtx, self.jsObject, &jsException)
+                byteLength = JSObjectGetArrayBufferByteLength(
+                    self.jsCtx, self.jsObject, &jsException)
+            else:
+                # The pointer refers to the start of the underlying
+                # array buffer.
+                data = <char *>JSObjectGetTypedArrayBytesPtr(
+                    self.jsCtx, self.jsObject, &jsException)
+                data += JSObjectGetTypedArrayByteOffset(
+                    self.jsCtx, self.jsObject, &jsException)
+                byteLength = JSObjectGetTypedArrayByteLength(
+                    self.jsCtx, self.jsObject, &jsException)
+            if jsException != NULL:
+                raise jsExceptionToPython(self.jsCtx, jsException)
+        finally:
+            self.ctx.jsLock.release()
+
+        # Every view gets its own shape and strides, since the array may
+        # be resized between exports. They are freed by
+        # __releasebuffer__.
+        shapeAndStrides = <Py_ssize_t *>malloc(2 * sizeof(Py_ssize_t))
+        if shapeAndStrides == NULL:
+            raise MemoryError
+        shapeAndStrides[0] = byteLength / self.itemsize
+        shapeAndStrides[1] = self.itemsize
+
+        buffer.buf = data
+        buffer.obj = self
+        buffer.len = byteLength
+        buffer.readonly = 0
+        buffer.itemsize = self.itemsize
+        buffer.format = self.format if flags & PyBUF_FORMAT else NULL
+        buffer.ndim = 1
+        buffer.shape = shapeAndStrides if flags & PyBUF_ND else NULL
+        buffer.strides = shapeAndStrides + 1 \
+            if flags & PyBUF_STRIDES else NULL
+        buffer.suboffsets = NULL
+        buffer.internal = shapeAndStrides
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        free(buffer.internal)
+
+
+
+cdef makeJSTypedArray(JSContextRef jsCtx, JSObjectRef jsObject,
+                      JSTypedArrayType arrayType):
+    """Factory function for 'JSTypedArray' instances."""
+    cdef JSTypedArray obj = JSTypedArray.__new__(JSTypedArray)
     obj.setup(jsCtx, jsObject)
+    obj.arrayType = arrayType
+    obj.format = typedArrayFormat(arrayType, &obj.itemsize)
     return obj
 
 
-cdef class _JSBoundMethod(_JSObject):
+cdef class JSBoundMethod(JSObject):
     """A JavaScript bound method.
 
     Instances of this class operate in a similar way to Python bound
     methods, but they encapsulate a JavaScript object and
     function. When they are called, the function is called with the
-    object as 'this' object.
-
-    This class gets mixed with ``collections.MutableMapping in the
-    ``JSBoundMethod`` class."""
+    object as 'this' object."""
 
     cdef JSObjectRef jsThisObj
 
     cdef setup2(self, JSContextRef jsCtx, JSObjectRef jsObject,
                 JSObjectRef jsThisObj):
-        _JSObject.setup(self, jsCtx, jsObject)
+        JSObject.setup(self, jsCtx, jsObject)
         # __dealloc__ unprotects jsThisObj, so that it's guaranteed to
         # exist as long as this object exists.
-        JSValueProtect(jsCtx, jsThisObj)
+        JSValueProtect(self.jsCtx, jsThisObj)
         self.jsThisObj = jsThisObj
 
     def __call__(self, *args):
-        cdef JSValueRef *jsArgs
-        cdef JSValueRef result
-        cdef JSValueRef jsError = NULL
+        return callJSFunction(self, self.jsThisObj, args)
 
-        if len(args):
-            jsArgs = <JSValueRef *>malloc(len(args) * sizeof(JSValueRef))
-        else:
-            jsArgs = NULL
-        for i, arg in enumerate(args):
-            jsArgs[i] = pythonToJS(self.jsCtx, arg)
-        result = JSObjectCallAsFunction(self.jsCtx, self.jsObject,
-                                        self.jsThisObj, len(args), jsArgs,
-                                        &jsError)
-        free(jsArgs)
-        if jsError != NULL:
-            raise jsExceptionToPython(self.jsCtx, jsError)
-        return jsToPython(self.jsCtx, result)
+    def callMany(self, argTuples):
+        """Call the method once for every tuple of arguments in
+        ``argTuples`` and return a list with the results (see
+        ``JSFunction.callMany``)."""
+        return callJSFunctionMany(self, self.jsThisObj, argTuples)
+
+    def callAsync(self, *args):
+        """Call the method in the worker thread of its context and
+        return a ``concurrent.futures.Future`` for the result (see
+        ``JSContext.evaluateScriptAsync``). A ``ValueError`` is raised
+        unless the context releases the GIL."""
+        return self.ctx.submit(self, args)
 
     def __dealloc__(self):
-        JSValueUnprotect(self.jsCtx, self.jsThisObj)
+        if self.jsThisObj == NULL:
+            return
 
+        self.ctx.jsLock.acquire()
+        try:
+            JSValueUnprotect(self.jsCtx, self.jsThisObj)
+        finally:
+            self.ctx.jsLock.release()
 
-class JSBoundMethod(_JSBoundMethod, collections.MutableMapping):
-    """Mix ``_JSBoundMethod`` and ``collections.MutableMapping``."""
-    __slots__ = ()
 
 
 cdef makeJSBoundMethod(JSContextRef jsCtx, JSObjectRef jsObject,
                        JSObjectRef thisObj):
     """Factory function for 'JSBoundMethod' instances."""
-    cdef _JSBoundMethod obj = JSBoundMethod()
+    cdef JSBoundMethod obj = JSBoundMethod.__new__(JSBoundMethod)
     obj.setup2(jsCtx, jsObject, thisObj)
     return obj
 
 
+# A pointer table associating global contexts to their JSContext
+# wrappers. Values are borrowed references, contexts remove
+# themselves from the table when they are deallocated.
+cdef _PtrTable *_jsContexts = ptrTableNew()
+
+cdef JSContext contextFromJS(JSContextRef jsCtx):
+    """Return the ``JSContext`` for the global context of ``jsCtx``,
+    creating (and adopting) a new one if necessary.
+
+    Global contexts without a wrapper come from an embedding
+    application. The wrappers created for them are kept alive by the
+    JavaScript wrappers of Python objects made in them, so that later
+    callbacks find the same wrapper caches, until
+    ``releaseAdoptedContext`` is called."""
+    cdef JSGlobalContextRef jsGlobalCtx = JSContextGetGlobalContext(jsCtx)
+    cdef void *ctx = ptrTableGet(_jsContexts, <void *>jsGlobalCtx)
+    cdef JSContext pyCtx
+
+    if ctx != NULL:
+        return <JSContext>ctx
+
+    # The new wrapper registers itself in _jsContexts.
+    pyCtx = JSContext(PyCapsule_New(jsGlobalCtx, "JSContextRef", NULL))
+    pyCtx.adopted = True
+    return pyCtx
+
+cdef int releaseAdoptedContext(JSContext ctx) except -1:
+    """Stop keeping ``ctx`` alive from the JavaScript wrappers of
+    Python objects made in it, if it was adopted by contextFromJS.
+
+    An adopted wrapper retains its global context, so it must be
+    released this way before the embedding application lets the
+    context go. Otherwise, neither ever goes away."""
+    cdef _PyWrapperData *data
+    cdef Py_ssize_t count = 0
+    cdef size_t i
+
+    ctx.adopted = False
+    for i in range(ctx.pyWrappers.mask + 1):
+        data = <_PyWrapperData *>ctx.pyWrappers.values[i]
+        if data != NULL and data.ctx != NULL:
+            data.ctx = NULL
+            count += 1
+
+    # The caller holds a reference, so the context cannot be
+    # deallocated here.
+    for i in range(count):
+        Py_DECREF(ctx)
+    return 0
+
+
+@cython.no_gc_clear
+cdef class JSContextGroup:
+    """Wrapper class for JavaScriptCore context groups.
+
+    Contexts created in the same group (see the ``group`` argument of
+    ``JSContext``) share a single JavaScript virtual machine, so that
+    objects can be passed freely between them and the fixed cost of
+    each new context is lower. For the same reason, only one thread
+    at a time can run JavaScript code in a group: contexts in a group
+    share a single lock and their execution is serialized. Use
+    separate groups (the default for new contexts) to run JavaScript
+    code in parallel.
+
+    If ``releaseGIL`` is true, every context in the group releases the
+    GIL while running JavaScript code.
+    """
+
+    cdef JSContextGroupRef jsGroup
+    cdef _JSLock jsLock
+
+    def __cinit__(self, releaseGIL=False):
+        self.jsGroup = JSContextGroupCreate()
+        self.jsLock = _JSLock(releaseGIL)
+
+    def __init__(self, releaseGIL=False):
+        pass
+
+    property releaseGIL:
+        """True if the contexts in this group release the GIL while
+        running JavaScript code."""
+
+        def __get__(self):
+            return self.jsLock.enabled
+
+    def __dealloc__(self):
+        if self.jsGroup != NULL:
+            JSContextGroupRelease(self.jsGroup)
+
+
+@cython.no_gc_clear
 cdef class JSContext:
     """Wrapper class for JavaScriptCore context objects.
 
@@ -919,64 +3076,894 @@ cdef class JSContext:
     A context obtained from another object (e.g. a WebKit browser
     component can also be passed to the constructor in order to gain
     full access to it from Python.
+
+    If ``releaseGIL`` is true, the GIL is released while JavaScript
+    code runs in this context (see ``evaluateScript`` and calls to
+    JavaScript functions), so that other Python threads can run in
+    the meantime. A per-context lock then guarantees that the context
+    is never entered by two threads at once.
+
+    New contexts can be created in an existing ``JSContextGroup``
+    (see its documentation). They then use the group's lock and its
+    ``releaseGIL`` setting.
     """
 
+    cdef object __weakref__
+
     cdef JSContextRef jsCtx
     cdef object pyCtxExtern
+    cdef _JSLock jsLock
+    cdef JSContextGroup pyGroup
+
+    # Whether this wrapper was created by contextFromJS (see there).
+    cdef bint adopted
+
+    # Compiled scripts, in least to most recently used order. Keys are
+    # the keys passed to compile(), values are (source, URL, line
+    # number) tuples with the strings as _JSString instances.
+    cdef object scriptCache
+    cdef Py_ssize_t scriptCacheSize
+
+    # Constructors for the converters registered with
+    # registerJSConverter, as (constructor, converter) pairs. The
+    # constructors are protected and enclosed in PyCapsule instances.
+    cdef list jsConverters
+    cdef long jsConvertersVersion
+
+    # Wrapper caches (see wrapJSObject and wrapPyObject).
+    cdef _PtrTable *jsWrappers
+    cdef _PtrTable *pyWrappers
+
+    # The innermost open scope, or None.
+    cdef JSScope currentScope
+
+    # Prototype of the PythonSequence objects in this context (see
+    # seqPrototype), protected.
+    cdef JSObjectRef jsSeqPrototype
+
+    # Function creating deferred promises (see makeDeferred),
+    # protected.
+    cdef JSObjectRef jsDeferredFactory
+
+    # Prototypes of the exposed classes in this context (see
+    # exposedPrototype), by _ExposedClass, as lists with the prototype
+    # followed by its functions. The objects are protected and
+    # enclosed in PyCapsule instances.
+    cdef dict exposedPrototypes
+
+    # Single-thread executor running the asynchronous operations on
+    # this context (see submit), or None if the context does not
+    # release the GIL. It is created with the context, so that
+    # concurrent first calls cannot create two of them.
+    cdef object executor
+
+    def __cinit__(self, pyCtxExtern=None, releaseGIL=False,
+                  JSContextGroup group=None):
+        self.jsWrappers = ptrTableNew()
+        self.pyWrappers = ptrTableNew()
+        self.scriptCache = collections.OrderedDict()
+        self.scriptCacheSize = 128
+        self.jsConverters = []
+        self.jsConvertersVersion = 0
+        self.exposedPrototypes = {}
+
+        if group is not None:
+            if pyCtxExtern is not None:
+                raise ValueError, \
+                    "Cannot set the group of an existing context"
+            if releaseGIL and not group.releaseGIL:
+                raise ValueError, \
+                    "The context group does not release the GIL"
+
+            # Create a new context in the group.
+            self.jsCtx = JSGlobalContextCreateInGroup(group.jsGroup, NULL)
+            self.pyCtxExtern = None
+            self.jsLock = group.jsLock
+            self.pyGroup = group
+            ptrTableSet(_jsContexts,
+                        <void *>JSContextGetGlobalContext(self.jsCtx),
+                        <void *>self)
+            self.createExecutor()
+            return
 
-    def __cinit__(self, pyCtxExtern=None):
         if pyCtxExtern is None:
             # Create a new context.
             self.jsCtx = JSGlobalContextCreate(NULL)
             self.pyCtxExtern = None
         else:
             # Extract the actual context object.
-            self.jsCtx = <JSContextRef>PyCapsule_GetPointer(pyCtxExtern, "JSContextRef")
+            self.jsCtx = <JSContextRef>PyCapsule_GetPointer(pyCtxExtern,
+                                                            "JSContextRef")
             JSGlobalContextRetain(self.jsCtx)
             self.pyCtxExtern = pyCtxExtern
 
-    def __init__(self, pyCtxExtern=None):
+        self.jsLock = _JSLock(releaseGIL)
+        ptrTableSet(_jsContexts,
+                    <void *>JSContextGetGlobalContext(self.jsCtx),
+                    <void *>self)
+        self.createExecutor()
+
+    cdef int createExecutor(self) except -1:
+        """Create the executor of the context if it releases the GIL.
+        Threads are only started when work is first submitted."""
+        if self.jsLock.enabled:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='JSContext')
+        return 0
+
+    def __init__(self, pyCtxExtern=None, releaseGIL=False,
+                 JSContextGroup group=None):
         pass
 
     property globalObject:
         """Global object for this context."""
 
         def __get__(self):
-            return jsToPython(self.jsCtx,
-                              JSContextGetGlobalObject(self.jsCtx))
+            self.jsLock.acquire()
+            try:
+                return jsToPython(self.jsCtx,
+                                  JSContextGetGlobalObject(self.jsCtx))
+            finally:
+                self.jsLock.release()
 
-    def evaluateScript(self, script, thisObject=None, sourceURL=None,
-                       startingLineNumber=1):
+    property releaseGIL:
+        """True if the GIL is released while JavaScript code runs in
+        this context."""
+
+        def __get__(self):
+            return self.jsLock.enabled
+
+    property group:
+        """The ``JSContextGroup`` this context was created in, or
+        ``None``."""
+
+        def __get__(self):
+            return self.pyGroup
+
+    property scriptCacheSize:
+        """Maximum number of scripts kept in the cache used by
+        ``compile``. A size of 0 disables the cache."""
+
+        def __get__(self):
+            return self.scriptCacheSize
+
+        def __set__(self, size):
+            if size < 0:
+                raise ValueError, "cache size must be non-negative"
+
+            self.scriptCacheSize = size
+            while len(self.scriptCache) > self.scriptCacheSize:
+                self.scriptCache.popitem(False)
+
+    cdef object evaluate(self, JSStringRef jsScript, object thisObject,
+                         JSStringRef jsSourceURL, int startingLineNumber):
+        """Evaluate a script and convert its result to Python."""
         cdef JSValueRef jsException = NULL
         cdef JSValueRef jsValue
+        cdef JSObjectRef jsThisObj = NULL
 
-        cdef JSStringRef jsScript = createJSStringFromPython(script)
+        self.jsLock.acquire()
         try:
-            jsValue = JSEvaluateScript(self.jsCtx, jsScript,
-                                       <JSObjectRef>NULL,
-                                       <JSStringRef>NULL,
-                                       startingLineNumber,
-                                       &jsException)
+            if thisObject is not None:
+                jsValue = pythonToJS(self.jsCtx, thisObject)
+                if not JSValueIsObject(self.jsCtx, jsValue):
+                    raise TypeError, "'this' object must be an object"
+                jsThisObj = <JSObjectRef>jsValue
+
+            if self.jsLock.enabled:
+                with nogil:
+                    jsValue = JSEvaluateScript(self.jsCtx, jsScript,
+                                               jsThisObj, jsSourceURL,
+                                               startingLineNumber,
+                                               &jsException)
+            else:
+                jsValue = JSEvaluateScript(self.jsCtx, jsScript, jsThisObj,
+                                           jsSourceURL, startingLineNumber,
+                                           &jsException)
             if jsException != NULL:
                 raise jsExceptionToPython(self.jsCtx, jsException)
+
+            return jsToPython(self.jsCtx, jsValue)
+        finally:
+            self.jsLock.release()
+
+    def evaluateScript(self, script, thisObject=None, sourceURL=None,
+                       startingLineNumber=1):
+        """Evaluate ``script`` and return its result.
+
+        ``thisObject`` is the object used as 'this' in the script (the
+        global object by default). ``sourceURL`` and
+        ``startingLineNumber`` are used in exceptions and stack
+        traces."""
+        cdef _JSString jsScript = makeJSString(script)
+        cdef _JSString jsSourceURL = None
+
+        if sourceURL is not None:
+            jsSourceURL = makeJSString(sourceURL)
+            return self.evaluate(jsScript.jsStr, thisObject,
+                                 jsSourceURL.jsStr, startingLineNumber)
+        return self.evaluate(jsScript.jsStr, thisObject, NULL,
+                             startingLineNumber)
+
+    def evaluateScriptAsync(self, script, thisObject=None, sourceURL=None,
+                            startingLineNumber=1):
+        """Evaluate ``script`` in the worker thread of this context and
+        return a ``concurrent.futures.Future`` for its result (see
+        ``evaluateScript``).
+
+        Every context has a single worker thread, so that asynchronous
+        operations on it run one at a time and in order. Use
+        ``asyncio.wrap_future`` to await the result from an event
+        loop, which keeps running in the meantime.
+
+        The worker thread must not hold the GIL while running
+        JavaScript code, so a ``ValueError`` is raised unless the
+        context releases it (see ``releaseGIL``)."""
+        return self.submit(self.evaluateScript,
+                           (script, thisObject, sourceURL,
+                            startingLineNumber))
+
+    cdef object submit(self, function, tuple args):
+        """Run ``function(*args)`` in the worker thread of this context
+        and return a future for its result."""
+        if self.executor is None:
+            raise ValueError, \
+                "asynchronous operations require a context created " \
+                "with releaseGIL=True"
+        return self.executor.submit(function, *args)
+
+    def compile(self, source, key=None, sourceURL=None,
+                startingLineNumber=1):
+        """Compile ``source`` into a reusable ``JSScript``.
+
+        The syntax of the script is checked once, and a ``JSException``
+        is raised if it is invalid. Compiled scripts are kept in a
+        per-context cache (see ``scriptCacheSize``), so compiling the
+        same script again is cheap. Scripts are looked up by ``key``
+        if it is given (it must then identify the source uniquely),
+        and by their source, URL and starting line number otherwise.
+        """
+        cdef JSValueRef jsException = NULL
+        cdef _JSString jsScript
+        cdef _JSString jsSourceURL = None
+        cdef JSStringRef jsSourceURLStr = NULL
+        cdef int lineNumber = startingLineNumber
+
+        if key is None:
+            key = (source, sourceURL, lineNumber)
+
+        cached = self.scriptCache.pop(key, None)
+        if cached is None:
+            jsScript = makeJSString(source)
+            if sourceURL is not None:
+                jsSourceURL = makeJSString(sourceURL)
+                jsSourceURLStr = jsSourceURL.jsStr
+
+            self.jsLock.acquire()
+            try:
+                if not JSCheckScriptSyntax(self.jsCtx, jsScript.jsStr,
+                                           jsSourceURLStr, lineNumber,
+                                           &jsException):
+                    raise jsExceptionToPython(self.jsCtx, jsException)
+            finally:
+                self.jsLock.release()
+
+            cached = (jsScript, jsSourceURL, lineNumber)
+            if self.scriptCacheSize <= 0:
+                return makeJSScript(self, cached)
+            if len(self.scriptCache) >= self.scriptCacheSize:
+                self.scriptCache.popitem(False)
+
+        # (Re)insert the script as the most recently used one.
+        self.scriptCache[key] = cached
+        return makeJSScript(self, cached)
+
+    def toPython(self, value, deep=True, maxDepth=MAX_CONVERSION_DEPTH):
+        """Convert a wrapped JavaScript value into plain Python data.
+
+        Arrays become lists and other objects become dicts, while
+        functions remain wrapped and other values are returned
+        unchanged. If ``deep`` is true, nested objects are converted
+        as well, up to ``maxDepth`` levels (``ValueError`` is raised
+        for deeper or cyclic structures). Otherwise only the top level
+        object is converted."""
+        cdef _JSBaseObject wrapper
+
+        if not isinstance(value, _JSBaseObject):
+            return value
+
+        wrapper = value
+        if isinstance(wrapper, JSSequence):
+            return wrapper.toList(deep, maxDepth)
+
+        self.jsLock.acquire()
+        try:
+            return jsToPythonDeep(wrapper.jsCtx, wrapper.jsObject,
+                                  maxDepth if deep else 1, deep, set())
+        finally:
+            self.jsLock.release()
+
+    def fromPython(self, value, copy=True, maxDepth=MAX_CONVERSION_DEPTH):
+        """Convert Python data into a JavaScript value in this context
+        and return it (wrapped if it is an object).
+
+        If ``copy`` is true, sequences and mappings are copied into
+        native JavaScript arrays and objects, recursively up to
+        ``maxDepth`` levels (``ValueError`` is raised for deeper
+        structures). Shared and cyclic references are preserved.
+        Otherwise, ``value`` is wrapped as when it is passed to
+        JavaScript in any other way.
+
+        Objects supporting the buffer protocol become typed arrays.
+        Writable ones (``bytearray``, NumPy arrays...) share their
+        memory with JavaScript, and cannot be resized until the
+        JavaScript garbage collector frees the array."""
+        cdef JSValueRef jsValue
+
+        self.jsLock.acquire()
+        try:
+            if copy:
+                jsValue = pythonToJSDeep(self.jsCtx, value, maxDepth, {})
+            else:
+                jsValue = pythonToJS(self.jsCtx, value)
+            return jsToPython(self.jsCtx, jsValue)
         finally:
-            JSStringRelease(jsScript)
+            self.jsLock.release()
+
+    def parseJSON(self, data, convert=False,
+                  maxDepth=MAX_CONVERSION_DEPTH):
+        """Parse a JSON text with JavaScriptCore's native parser.
+
+        ``data`` can be a string or UTF-8 encoded bytes, which are
+        passed to JavaScriptCore without being decoded in Python. The
+        result is returned as a JavaScript value (wrapped if it is an
+        object), or converted into plain Python data as in
+        ``toPython`` if ``convert`` is true. ``ValueError`` is raised
+        if the text is not valid JSON."""
+        cdef JSStringRef jsStr
+        cdef JSValueRef jsValue
+
+        if isinstance(data, bytearray):
+            data = bytes(data)
+        if isinstance(data, bytes):
+            jsStr = createJSStringFromUTF8(data)
+        else:
+            jsStr = createJSStringFromPython(data)
 
-        return jsToPython(self.jsCtx, jsValue)
+        self.jsLock.acquire()
+        try:
+            jsValue = JSValueMakeFromJSONString(self.jsCtx, jsStr)
+            if jsValue == NULL:
+                raise ValueError, "invalid JSON text"
+
+            if convert:
+                return jsToPythonDeep(self.jsCtx, jsValue, maxDepth, True,
+                                      set())
+            return jsToPython(self.jsCtx, jsValue)
+        finally:
+            JSStringRelease(jsStr)
+            self.jsLock.release()
+
+    def parseJSONFile(self, file, convert=False,
+                      maxDepth=MAX_CONVERSION_DEPTH):
+        """Parse the JSON text read from a file object, as
+        ``parseJSON`` does. Files opened in binary mode are parsed
+        without decoding their contents in Python."""
+        return self.parseJSON(file.read(), convert, maxDepth)
+
+    def scope(self):
+        """Return a new scope for temporary wrappers, to be used in a
+        ``with`` statement (see ``JSScope``)."""
+        cdef JSScope scope = JSScope.__new__(JSScope)
+
+        scope.ctx = self
+        return scope
+
+    def cachedStats(self):
+        """Return the number of wrappers in the wrapper caches of this
+        context, as a dictionary with the same keys as the module's
+        ``_cachedStats``."""
+        return {'wrappedJSObjsCount': self.jsWrappers.used,
+                'wrappedPyObjsCount': self.pyWrappers.used,
+                }
 
     def getCtx(self):
         return self.pyCtxExtern
 
+    cdef int releaseJSConverters(self) except -1:
+        """Unprotect the constructors in ``jsConverters`` and empty
+        it."""
+        for pyConstructor, converter in self.jsConverters:
+            JSValueUnprotect(self.jsCtx,
+                             <JSObjectRef>PyCapsule_GetPointer(pyConstructor,
+                                                               NULL))
+        self.jsConverters = []
+        return 0
+
+    cdef int resolveJSConverters(self) except -1:
+        """Look up the constructors of the converters registered with
+        ``registerJSConverter`` in this context."""
+        cdef JSValueRef jsException
+        cdef JSValueRef jsValue
+        cdef _JSName jsName
+
+        self.jsLock.acquire()
+        try:
+            self.releaseJSConverters()
+            for constructorName, converter in _jsConverters:
+                jsValue = JSContextGetGlobalObject(self.jsCtx)
+                for pyName in constructorName.split('.'):
+                    jsName = jsNameFromPython(pyName)
+                    jsException = NULL
+                    jsValue = JSObjectGetProperty(self.jsCtx,
+                                                  <JSObjectRef>jsValue,
+                                                  jsName.jsStr, &jsException)
+                    if jsException != NULL or \
+                            not JSValueIsObject(self.jsCtx, jsValue):
+                        jsValue = NULL
+                        break
+
+                if jsValue == NULL or \
+                        not JSObjectIsConstructor(self.jsCtx, jsValue):
+                    continue
+                JSValueProtect(self.jsCtx, jsValue)
+                self.jsConverters.append(
+                    (PyCapsule_New(<void *>jsValue, NULL, NULL), converter))
+            self.jsConvertersVersion = _jsConvertersVersion
+        finally:
+            self.jsLock.release()
+        return 0
+
+    cdef JSObjectRef seqPrototype(self) except NULL:
+        """Return the prototype of ``PythonSequence`` objects in this
+        context, creating it on first use."""
+        if self.jsSeqPrototype == NULL:
+            self.jsSeqPrototype = makePySeqPrototype(self.jsCtx)
+        return self.jsSeqPrototype
+
+    cdef JSObjectRef exposedPrototype(self,
+                                      _ExposedClass exposed) except NULL:
+        """Return the prototype of the exposed class ``exposed`` in this
+        context, creating it on first use."""
+        cdef list jsObjects = self.exposedPrototypes.get(exposed)
+        cdef JSObjectRef jsProto
+
+        if jsObjects is not None:
+            return <JSObjectRef>PyCapsule_GetPointer(jsObjects[0], NULL)
+
+        jsObjects = []
+        try:
+            jsProto = exposed.makePrototype(self.jsCtx, jsObjects)
+
+            # Sequences keep the array methods of generic sequence
+            # wrappers.
+            if exposed.container == PY_CONTAINER_SEQUENCE:
+                JSObjectSetPrototype(self.jsCtx, jsProto,
+                                     self.seqPrototype())
+        except:
+            releasePrototypeObjects(self.jsCtx, exposed, jsObjects)
+            raise
+        self.exposedPrototypes[exposed] = jsObjects
+        return jsProto
+
+    cdef int releaseExposedPrototypes(self) except -1:
+        """Release the prototypes in ``exposedPrototypes`` and empty
+        it."""
+        for exposed, jsObjects in self.exposedPrototypes.items():
+            releasePrototypeObjects(self.jsCtx, exposed, jsObjects)
+        self.exposedPrototypes = {}
+        return 0
+
+    cdef JSObject makeDeferred(self):
+        """Return a new deferred promise: a JavaScript object with a
+        ``promise`` and the ``resolve`` and ``reject`` functions
+        settling it."""
+        cdef JSValueRef jsException = NULL
+        cdef JSValueRef jsValue
+
+        self.jsLock.acquire()
+        try:
+            if self.jsDeferredFactory == NULL:
+                jsValue = JSEvaluateScript(self.jsCtx, jsDeferredScript,
+                                           NULL, NULL, 1, &jsException)
+                if jsException != NULL:
+                    raise jsExceptionToPython(self.jsCtx, jsException)
+                JSValueProtect(self.jsCtx, jsValue)
+                self.jsDeferredFactory = <JSObjectRef>jsValue
+
+            jsValue = invokeJSFunction(self.jsCtx, self.jsDeferredFactory,
+                                       NULL, (), False)
+            return wrapJSObject(self.jsCtx, jsValue)
+        finally:
+            self.jsLock.release()
+
+    def __dealloc__(self):
+        cdef void *jsGlobalCtx
+        cdef _PyWrapperData *data
+        cdef size_t i
+
+        if self.executor is not None:
+            # Pending operations keep the context alive, so there are
+            # none left at this point.
+            self.executor.shutdown(wait=False)
+
+        if self.jsCtx != NULL:
+            jsGlobalCtx = <void *>JSContextGetGlobalContext(self.jsCtx)
+            if ptrTableGet(_jsContexts, jsGlobalCtx) == <void *>self:
+                ptrTableRemove(_jsContexts, jsGlobalCtx)
+
+            # The lock is only missing if __cinit__ failed, and then
+            # nobody else can be using the context.
+            if self.jsLock is not None:
+                self.jsLock.acquire()
+            try:
+                self.releaseJSConverters()
+                self.releaseExposedPrototypes()
+                if self.jsSeqPrototype != NULL:
+                    JSValueUnprotect(self.jsCtx, self.jsSeqPrototype)
+                if self.jsDeferredFactory != NULL:
+                    JSValueUnprotect(self.jsCtx, self.jsDeferredFactory)
+                JSGlobalContextRelease(self.jsCtx)
+            finally:
+                if self.jsLock is not None:
+                    self.jsLock.release()
+
+        # JavaScript wrappers for Python objects may outlive the
+        # context. Detach them from the cache before freeing it.
+        if self.pyWrappers != NULL:
+            for i in range(self.pyWrappers.mask + 1):
+                data = <_PyWrapperData *>self.pyWrappers.values[i]
+                if data != NULL:
+                    data.cache = NULL
+            ptrTableFree(self.pyWrappers)
+        if self.jsWrappers != NULL:
+            ptrTableFree(self.jsWrappers)
+
+cdef class JSScript:
+    """A script compiled with ``JSContext.compile``.
+
+    Running it again and again avoids converting and checking its
+    source every time."""
+
+    cdef JSContext ctx
+    cdef _JSString jsScript
+    cdef _JSString jsSourceURL
+    cdef int startingLineNumber
+
+    def run(self, thisObject=None):
+        """Run the script and return its result. ``thisObject`` is the
+        object used as 'this' in the script (the global object by
+        default)."""
+        if self.jsSourceURL is None:
+            return self.ctx.evaluate(self.jsScript.jsStr, thisObject,
+                                     NULL, self.startingLineNumber)
+        return self.ctx.evaluate(self.jsScript.jsStr, thisObject,
+                                 self.jsSourceURL.jsStr,
+                                 self.startingLineNumber)
+
+cdef JSScript makeJSScript(JSContext ctx, tuple compiled):
+    """Factory function for 'JSScript' instances."""
+    cdef JSScript script = JSScript.__new__(JSScript)
+    script.ctx = ctx
+    script.jsScript, script.jsSourceURL, script.startingLineNumber = \
+        compiled
+    return script
+
+
+cdef class JSScope:
+    """A scope for temporary wrappers, as returned by
+    ``JSContext.scope``.
+
+    Wrappers are normally protected from the JavaScript garbage
+    collector one by one, and unprotected one by one when they are
+    deallocated. Wrappers created while a scope is open (in any
+    thread) are kept alive by the scope instead, which stores their
+    objects in a single protected array. Loops going through many
+    temporary objects are considerably cheaper this way.
+
+    When the scope is closed, the wrappers that are still alive are
+    protected individually (or handed over to the enclosing scope),
+    so that they stay valid. Scopes can be nested.
+    """
+
+    cdef JSContext ctx
+
+    # The enclosing scope, or None.
+    cdef JSScope parent
+
+    # Array holding the objects of the wrappers created in the scope.
+    cdef JSObjectRef jsValues
+    cdef unsigned valueCount
+
+    # The wrappers in the scope that are still alive. Wrappers remove
+    # themselves from the table when they are deallocated.
+    cdef _PtrTable *wrappers
+
+    cdef int add(self, _JSBaseObject obj) except -1:
+        """Keep ``obj``, an unprotected wrapper, alive."""
+        cdef JSValueRef jsException = NULL
+
+        JSObjectSetPropertyAtIndex(self.ctx.jsCtx, self.jsValues,
+                                   self.valueCount, obj.jsObject,
+                                   &jsException)
+        if jsException != NULL:
+            raise jsExceptionToPython(self.ctx.jsCtx, jsException)
+        self.valueCount += 1
+
+        ptrTableSet(self.wrappers, <void *>obj, <void *>obj)
+        obj.scope = self
+        return 0
+
+    def __enter__(self):
+        cdef JSValueRef jsException = NULL
+
+        if self.wrappers != NULL:
+            raise RuntimeError, "scope is already open"
+
+        self.ctx.jsLock.acquire()
+        try:
+            self.jsValues = JSObjectMakeArray(self.ctx.jsCtx, 0, NULL,
+                                              &jsException)
+            if jsException != NULL:
+                raise jsExceptionToPython(self.ctx.jsCtx, jsException)
+            JSValueProtect(self.ctx.jsCtx, self.jsValues)
+            self.valueCount = 0
+            self.wrappers = ptrTableNew()
+
+            self.parent = self.ctx.currentScope
+            self.ctx.currentScope = self
+        finally:
+            self.ctx.jsLock.release()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        cdef JSScope scope
+        cdef _JSBaseObject obj
+        cdef size_t i
+
+        self.ctx.jsLock.acquire()
+        try:
+            # Unlink the scope. Scopes opened by other threads may be
+            # closed in a different order.
+            if self.ctx.currentScope is self:
+                self.ctx.currentScope = self.parent
+            else:
+                scope = self.ctx.currentScope
+                while scope is not None and scope.parent is not self:
+                    scope = scope.parent
+                if scope is not None:
+                    scope.parent = self.parent
+
+            # Take care of the wrappers that outlive the scope.
+            for i in range(self.wrappers.mask + 1):
+                if self.wrappers.keys[i] == NULL:
+                    continue
+                obj = <_JSBaseObject>self.wrappers.keys[i]
+                if self.parent is not None:
+                    self.parent.add(obj)
+                else:
+                    obj.protect()
+                    obj.scope = None
+
+            ptrTableFree(self.wrappers)
+            self.wrappers = NULL
+            self.parent = None
+            JSValueUnprotect(self.ctx.jsCtx, self.jsValues)
+            self.jsValues = NULL
+        finally:
+            self.ctx.jsLock.release()
+        return False
+
     def __dealloc__(self):
-        JSGlobalContextRelease(self.jsCtx)
+        if self.wrappers != NULL:
+            ptrTableFree(self.wrappers)
+
+
+class JSContextPool(object):
+    """A pool of ready-to-use JavaScript contexts.
+
+    ``size`` contexts are created up front and handed out to worker
+    threads with ``checkout`` and given back with ``checkin`` (or
+    borrowed with the ``context`` context manager). The contexts
+    release the GIL while running JavaScript code if ``releaseGIL`` is
+    true.
+
+    If ``shareGroup`` is true, all contexts are created in a single
+    ``JSContextGroup``. This makes them cheaper, but serializes their
+    execution. Otherwise, every context has its own group and
+    JavaScript code can run in parallel in different contexts.
+
+    ``bootstrap``, if given, is a script evaluated in every new
+    context. If ``resetOnCheckin`` is true, it is evaluated again
+    every time a context is returned to the pool. A context in which
+    the bootstrap script fails at that point is replaced by a new one.
+    """
+
+    def __init__(self, size, bootstrap=None, resetOnCheckin=False,
+                 shareGroup=False, releaseGIL=True):
+        if size < 1:
+            raise ValueError, "Pool size must be positive"
+
+        self.size = size
+        self.bootstrap = bootstrap
+        self.resetOnCheckin = resetOnCheckin
+        if shareGroup:
+            self.group = JSContextGroup(releaseGIL)
+        else:
+            self.group = None
+        self.releaseGIL = releaseGIL
+
+        self._contexts = queue.Queue()
+        for i in range(size):
+            self._contexts.put(self._newContext())
+
+    def _newContext(self):
+        ctx = JSContext(releaseGIL=self.releaseGIL, group=self.group)
+        if self.bootstrap is not None:
+            ctx.evaluateScript(self.bootstrap)
+        return ctx
+
+    def checkout(self, block=True, timeout=None):
+        """Take a context out of the pool.
+
+        ``block`` and ``timeout`` work as in ``queue.Queue.get``:
+        ``queue.Empty`` is raised if no context becomes available."""
+        return self._contexts.get(block, timeout)
+
+    def checkin(self, ctx):
+        """Return a context obtained from ``checkout`` to the pool."""
+        if self.resetOnCheckin and self.bootstrap is not None:
+            try:
+                ctx.evaluateScript(self.bootstrap)
+            except JSException:
+                ctx = self._newContext()
+            except BaseException:
+                # Other errors are propagated, but a context still goes
+                # back into the queue, so that the pool never shrinks.
+                try:
+                    ctx = self._newContext()
+                finally:
+                    self._contexts.put(ctx)
+                raise
+        self._contexts.put(ctx)
+
+    @contextlib.contextmanager
+    def context(self, block=True, timeout=None):
+        """Context manager borrowing a context from the pool for the
+        duration of a ``with`` block."""
+        ctx = self.checkout(block, timeout)
+        try:
+            yield ctx
+        finally:
+            self.checkin(ctx)
+
+    def available(self):
+        """Return the approximate number of contexts currently in the
+        pool."""
+        return self._contexts.qsize()
+
+
+#
+# Promises and coroutines
+#
+
+# Script returning a function that creates deferred promises.
+cdef JSStringRef jsDeferredScript = JSStringCreateWithUTF8CString(
+    "(function () {\n"
+    "    var deferred = {};\n"
+    "    deferred.promise = new Promise(function (resolve, reject) {\n"
+    "        deferred.resolve = resolve;\n"
+    "        deferred.reject = reject;\n"
+    "    });\n"
+    "    return deferred;\n"
+    "})")
+
+# The names of the properties of deferred promises.
+cdef JSStringRef jsResolveName = JSStringCreateWithUTF8CString("resolve")
+cdef JSStringRef jsRejectName = JSStringCreateWithUTF8CString("reject")
+
+cdef int settlePromise(JSObject deferred, object future) except -1:
+    """Resolve or reject the promise of ``deferred`` with the outcome
+    of the (done) asyncio future ``future``.
+
+    The caller must hold the context lock."""
+    cdef JSValueRef jsException = NULL
+    cdef JSValueRef jsFunction
+    cdef JSValueRef jsReason
+
+    if future.cancelled():
+        exc = asyncio.CancelledError()
+    else:
+        exc = future.exception()
+
+    if exc is None:
+        jsFunction = JSObjectGetProperty(deferred.jsCtx, deferred.jsObject,
+                                         jsResolveName, NULL)
+        invokeJSFunction(deferred.jsCtx, <JSObjectRef>jsFunction, NULL,
+                         (future.result(),), False)
+    else:
+        jsFunction = JSObjectGetProperty(deferred.jsCtx, deferred.jsObject,
+                                         jsRejectName, NULL)
+        jsReason = pyExceptionToJS(deferred.jsCtx, exc)
+        JSObjectCallAsFunction(deferred.jsCtx, <JSObjectRef>jsFunction,
+                               NULL, 1, &jsReason, &jsException)
+        if jsException != NULL:
+            raise jsExceptionToPython(deferred.jsCtx, jsException)
+    return 0
+
+def awaitableToJS(JSContext context, awaitable):
+    """Converter mapping coroutines and ``asyncio`` futures to
+    JavaScript promises. It is registered by default for coroutines
+    and ``asyncio.Future`` (see ``registerConverter``).
+
+    Coroutines are scheduled as tasks in the running event loop, and
+    a ``RuntimeError`` is raised if there is none. The promise is
+    settled from the event loop when the awaitable is done: it is
+    resolved with its result, or rejected with an ``Error`` carrying
+    the message of its exception. The event loop never waits for the
+    context: if another thread is running JavaScript code in it, the
+    promise is settled once that thread leaves the context."""
+    cdef JSObject deferred
+    cdef _JSLock jsLock = context.jsLock
+
+    if isinstance(awaitable, asyncio.Future):
+        future = awaitable
+    else:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            if hasattr(awaitable, 'close'):
+                awaitable.close()
+            raise RuntimeError, \
+                "coroutines can only be passed to JavaScript from a " \
+                "running event loop"
+        future = asyncio.ensure_future(awaitable, loop=loop)
+
+    deferred = context.makeDeferred()
+    loop = future.get_loop()
+
+    def retry():
+        try:
+            loop.call_soon_threadsafe(settle, future)
+        except RuntimeError:
+            # The event loop is closed.
+            pass
+
+    def settle(future):
+        if not jsLock.tryAcquire():
+            jsLock.whenReleased(retry)
+            return
+        try:
+            settlePromise(deferred, future)
+        finally:
+            jsLock.release()
+
+    future.add_done_callback(settle)
+    return deferred.promise
+
+_pyConverters[types.CoroutineType] = awaitableToJS
+_pyConverters[asyncio.Future] = awaitableToJS
+
 
 cdef api object PyJSContext4_New(JSContextRef context):
-    #Can't pass C object to __init__. ALternative would be creating a PyCapsule
-    return JSContext(PyCapsule_New(context, "JSContextRef", NULL))
+    # Reuse the existing wrapper if there is one.
+    return contextFromJS(context)
 
 cdef api JSContextRef PyJSContext4_GetContext(object ctx):
     return <JSGlobalContextRef>ctx.jsCtx
 
+cdef api int PyJSContext4_Release(JSContextRef context) except -1:
+    # Let go of the wrapper adopted for a context of the embedding
+    # application, before the application releases the context.
+    cdef void *ctx = ptrTableGet(_jsContexts,
+                                 <void *>JSContextGetGlobalContext(context))
+    cdef JSContext pyCtx
+
+    if ctx != NULL:
+        pyCtx = <JSContext>ctx
+        releaseAdoptedContext(pyCtx)
+    return 0
+
 
 #
 # JavaScript Wrappers for Python Objects
@@ -1004,7 +3991,7 @@ cdef JSValueRef pyExceptionToJS(JSContextRef jsCtx, object exc):
 
 cdef void pyObjInitialize(JSContextRef ctx,
                           JSObjectRef jsObj) with gil:
-    cdef object pyObj = <object>JSObjectGetPrivate(jsObj)
+    cdef object pyObj = pyObjectFromJS(jsObj)
 
     # Keep a reference to the wrapped Python object during the
     # lifetime of the JavaScript wrapper. This reference is released
@@ -1015,9 +4002,15 @@ cdef JSValueRef pyObjGetProperty(JSContextRef jsCtx,
                                  JSObjectRef jsObj,
                                  JSStringRef jsPropertyName,
                                  JSValueRef* jsExc) with gil:
-    cdef object pyObj = <object>JSObjectGetPrivate(jsObj)
+    cdef _PyWrapperData *data = <_PyWrapperData *>JSObjectGetPrivate(jsObj)
+    cdef object pyObj = <object>data.pyObj
     cdef object pyPropertyName = pyStringFromJS(jsPropertyName)
 
+    # Leave the methods of exposed classes to their prototype.
+    if data.exposed != NULL and \
+            pyPropertyName in (<_ExposedClass>data.exposed).methodNameSet:
+        return NULL
+
     try:
         return pythonToJS(jsCtx, getattr(pyObj, pyPropertyName))
     except AttributeError:
@@ -1032,7 +4025,7 @@ cdef bool pyObjSetProperty(JSContextRef jsCtx,
                            JSStringRef jsPropertyName,
                            JSValueRef jsValue,
                            JSValueRef* jsExc) with gil:
-    cdef object pyObj = <object>JSObjectGetPrivate(jsObj)
+    cdef object pyObj = pyObjectFromJS(jsObj)
     cdef object pyPropertyName = pyStringFromJS(jsPropertyName)
     cdef object pyValue = jsToPython(jsCtx, jsValue)
 
@@ -1046,7 +4039,7 @@ cdef bool pyObjDeleteProperty(JSContextRef jsCtx,
                               JSObjectRef jsObj,
                               JSStringRef jsPropertyName,
                               JSValueRef* jsExc) with gil:
-    cdef object pyObj = <object>JSObjectGetPrivate(jsObj)
+    cdef object pyObj = pyObjectFromJS(jsObj)
     cdef object pyPropertyName = pyStringFromJS(jsPropertyName)
 
     try:
@@ -1066,7 +4059,7 @@ cdef JSValueRef pyObjCallAsFunction(JSContextRef jsCtx,
                                     JSValueRef jsArgs[],
                                     JSValueRef* jsExc) with gil:
     """Invoked when a wrapped object is called as a function."""
-    cdef object pyObj = <object>JSObjectGetPrivate(jsObj)
+    cdef object pyObj = pyObjectFromJS(jsObj)
     cdef int i
 
     args = [jsToPython(jsCtx, jsArgs[i])
@@ -1077,12 +4070,18 @@ cdef JSValueRef pyObjCallAsFunction(JSContextRef jsCtx,
         jsExc[0] = pyExceptionToJS(jsCtx, e)
 
 cdef void pyObjFinalize(JSObjectRef jsObj) with gil:
-    cdef object pyObj = <object>JSObjectGetPrivate(jsObj)
+    cdef _PyWrapperData *data = <_PyWrapperData *>JSObjectGetPrivate(jsObj)
 
-    # Remove this wrapper from the wrapper cache.
-    del _pyWrappedPyObjs[id(pyObj)]
+    # Remove this wrapper from the wrapper cache, unless its context
+    # is already gone.
+    if data.cache != NULL and \
+            ptrTableGet(data.cache, data.pyObj) == <void *>data:
+        ptrTableRemove(data.cache, data.pyObj)
 
-    Py_DECREF(pyObj)
+    Py_DECREF(<object>data.pyObj)
+    if data.ctx != NULL:
+        Py_DECREF(<object>data.ctx)
+    free(data)
 
 # Class definition structure for PythonObject.
 cdef JSClassDefinition pyObjectClassDef = kJSClassDefinitionEmpty
@@ -1101,25 +4100,52 @@ cdef JSClassRef pyObjectClass = JSClassCreate(&pyObjectClassDef)
 # PythonSequence: Specialized JavaScript wrapper for Python objects
 # implementing the sequence protocol.
 
-cdef object makePyIndex(pyPropertyName):
-    """Convert a JavaScript property name into a positive Python
-    integer index."""
-    cdef object pyIndex
+# Largest array index in JavaScript.
+DEF MAX_ARRAY_INDEX = 4294967294
+
+cdef Py_ssize_t indexFromJS(JSStringRef jsPropertyName):
+    """Parse a JavaScript property name as an array index, directly
+    on the characters of the name.
+
+    Return -1 if the name is not the canonical representation of an
+    index (no signs, spaces or leading zeros, as in JavaScript)."""
+    cdef size_t length = JSStringGetLength(jsPropertyName)
+    cdef JSChar *chars
+    cdef unsigned long long index = 0
+    cdef size_t i
+
+    if length == 0 or length > 10:
+        return -1
 
-    pyIndex = int(pyPropertyName)
-    if pyIndex < 0:
-        raise ValueError
+    chars = JSStringGetCharactersPtr(jsPropertyName)
+    if chars[0] == c'0' and length > 1:
+        return -1
+    for i in range(length):
+        if chars[i] < c'0' or chars[i] > c'9':
+            return -1
+        index = 10 * index + (chars[i] - c'0')
 
-    return pyIndex
+    if index > MAX_ARRAY_INDEX or <Py_ssize_t>index < 0:
+        return -1
+    return <Py_ssize_t>index
 
 cdef bool pySeqHasProperty(JSContextRef jsCtx,
                            JSObjectRef jsSeq,
                            JSStringRef jsPropertyName) with gil:
-    cdef object pySeq = <object>JSObjectGetPrivate(jsSeq)
-    cdef object pyPropertyName = pyStringFromJS(jsPropertyName)
+    cdef Py_ssize_t index = indexFromJS(jsPropertyName)
+    cdef object pySeq
+
+    if index < 0:
+        return False
+
+    pySeq = pyObjectFromJS(jsSeq)
+    if type(pySeq) is list:
+        return index < PyList_GET_SIZE(pySeq)
+    elif type(pySeq) is tuple:
+        return index < PyTuple_GET_SIZE(pySeq)
 
     try:
-        return 0 <= makePyIndex(pyPropertyName) < len(pySeq)
+        return index < len(pySeq)
     except:
         return False
 
@@ -1127,11 +4153,24 @@ cdef JSValueRef pySeqGetProperty(JSContextRef jsCtx,
                                  JSObjectRef jsSeq,
                                  JSStringRef jsPropertyName,
                                  JSValueRef* jsExc) with gil:
-    cdef object pySeq = <object>JSObjectGetPrivate(jsSeq)
-    cdef object pyPropertyName = pyStringFromJS(jsPropertyName)
+    cdef Py_ssize_t index = indexFromJS(jsPropertyName)
+    cdef object pySeq
+
+    if index < 0:
+        return NULL
 
+    pySeq = pyObjectFromJS(jsSeq)
     try:
-        return pythonToJS(jsCtx, pySeq[makePyIndex(pyPropertyName)])
+        if type(pySeq) is list:
+            if index >= PyList_GET_SIZE(pySeq):
+                return NULL
+            return pythonToJS(jsCtx, <object>PyList_GET_ITEM(pySeq, index))
+        elif type(pySeq) is tuple:
+            if index >= PyTuple_GET_SIZE(pySeq):
+                return NULL
+            return pythonToJS(jsCtx, <object>PyTuple_GET_ITEM(pySeq, index))
+        else:
+            return pythonToJS(jsCtx, pySeq[index])
     except:
         return NULL
 
@@ -1140,20 +4179,26 @@ cdef bool pySeqSetProperty(JSContextRef jsCtx,
                            JSStringRef jsPropertyName,
                            JSValueRef jsValue,
                            JSValueRef* jsExc) with gil:
-    cdef object pySeq = <object>JSObjectGetPrivate(jsSeq)
-    cdef object pyPropertyName = pyStringFromJS(jsPropertyName)
-    cdef object pyValue = jsToPython(jsCtx, jsValue)
-    cdef object pyIndex
+    cdef Py_ssize_t index = indexFromJS(jsPropertyName)
+    cdef object pySeq
+    cdef object pyValue
+
+    if index < 0:
+        return False
 
+    pySeq = pyObjectFromJS(jsSeq)
+    pyValue = jsToPython(jsCtx, jsValue)
     try:
-        pyIndex = makePyIndex(pyPropertyName)
+        if type(pySeq) is list and index < PyList_GET_SIZE(pySeq):
+            (<list>pySeq)[index] = pyValue
+            return True
 
         # Simulate JavaScript behavior when the positions beyond the
         # length are assigned to.
-        if pyIndex >= len(pySeq):
-            pySeq.extend([None] * (1 + pyIndex - len(pySeq)))
+        if index >= len(pySeq):
+            pySeq.extend([None] * (1 + index - len(pySeq)))
 
-        pySeq[pyIndex] = pyValue
+        pySeq[index] = pyValue
         return True
     except:
         return False
@@ -1162,14 +4207,17 @@ cdef bool pySeqDeleteProperty(JSContextRef jsCtx,
                               JSObjectRef jsSeq,
                               JSStringRef jsPropertyName,
                               JSValueRef* jsExc) with gil:
-    cdef object pySeq = <object>JSObjectGetPrivate(jsSeq)
-    cdef object pyPropertyName = pyStringFromJS(jsPropertyName)
-    cdef object pyIndex = makePyIndex(pyPropertyName)
+    cdef Py_ssize_t index = indexFromJS(jsPropertyName)
+    cdef object pySeq
+
+    if index < 0:
+        return False
 
+    pySeq = pyObjectFromJS(jsSeq)
     try:
         # Delete behaves differently in JavaScript.
-        if pyIndex < len(pySeq):
-            pySeq[makePyIndex(pyPropertyName)] = None
+        if index < len(pySeq):
+            pySeq[index] = None
         return True
     except:
         return False
@@ -1182,7 +4230,7 @@ cdef JSValueRef pySeqGetLength(JSContextRef jsCtx,
                                JSObjectRef jsSeq,
                                JSStringRef jsPropertyName,
                                JSValueRef* jsExc) with gil:
-    cdef object pySeq = <object>JSObjectGetPrivate(jsSeq)
+    cdef object pySeq = pyObjectFromJS(jsSeq)
 
     try:
         return pythonToJS(jsCtx, len(pySeq))
@@ -1194,7 +4242,7 @@ cdef bool pySeqSetLength(JSContextRef jsCtx,
                          JSStringRef jsPropertyName,
                          JSValueRef jsValue,
                          JSValueRef* jsExc) with gil:
-    cdef object pySeq = <object>JSObjectGetPrivate(jsSeq)
+    cdef object pySeq = pyObjectFromJS(jsSeq)
     cdef object pyLength
 
     try:
@@ -1225,6 +4273,125 @@ pySeqStaticProps[1].getProperty = NULL
 pySeqStaticProps[1].setProperty = NULL
 pySeqStaticProps[1].attributes = 0
 
+# Prototype.
+
+# The names of the bulk-copy methods of PythonSequence objects.
+cdef JSStringRef jsToArrayName = JSStringCreateWithUTF8CString("toArray")
+cdef JSStringRef jsSliceName = JSStringCreateWithUTF8CString("slice")
+
+# Script returning a function that installs the iterator of
+# PythonSequence objects into their prototype.
+cdef JSStringRef jsSeqIteratorScript = JSStringCreateWithUTF8CString(
+    "(function (proto) {\n"
+    "    Object.defineProperty(proto, Symbol.iterator, {\n"
+    "        value: function () {\n"
+    "            return this.toArray()[Symbol.iterator]();\n"
+    "        },\n"
+    "        writable: true,\n"
+    "        configurable: true\n"
+    "    });\n"
+    "})")
+
+cdef JSValueRef pySeqToArray(JSContextRef jsCtx,
+                             JSObjectRef jsFunction,
+                             JSObjectRef jsThisObj,
+                             size_t argumentCount,
+                             JSValueRef jsArgs[],
+                             JSValueRef* jsExc) with gil:
+    """Implementation of ``toArray`` and ``slice``: copy the items
+    between the optional ``start`` and ``end`` arguments into a new
+    JavaScript array, with a single callback."""
+    cdef JSObjectRef jsArray
+    cdef double number
+    cdef Py_ssize_t i
+
+    try:
+        if jsThisObj == NULL or \
+                not JSValueIsObjectOfClass(jsCtx, jsThisObj, pySeqClass):
+            raise TypeError, "toArray called on an incompatible object"
+        pySeq = pyObjectFromJS(jsThisObj)
+
+        # Bounds follow the slice semantics shared by JavaScript and
+        # Python.
+        bounds = [None, None]
+        for i in range(min(argumentCount, 2)):
+            if JSValueIsUndefined(jsCtx, jsArgs[i]):
+                continue
+            number = JSValueToNumber(jsCtx, jsArgs[i], jsExc)
+            if jsExc[0] != NULL:
+                return NULL
+            if number != number:
+                number = 0
+            bounds[i] = int(max(min(number, MAX_ARRAY_INDEX),
+                                -MAX_ARRAY_INDEX))
+
+        # Work on a copy, as conversions may run arbitrary code.
+        if bounds[0] is None and bounds[1] is None:
+            pyItems = list(pySeq)
+        else:
+            pyItems = list(pySeq[bounds[0]:bounds[1]])
+
+        jsArray = JSObjectMakeArray(jsCtx, 0, NULL, jsExc)
+        if jsExc[0] != NULL:
+            return NULL
+        for i in range(PyList_GET_SIZE(pyItems)):
+            JSObjectSetPropertyAtIndex(
+                jsCtx, jsArray, i,
+                pythonToJS(jsCtx, <object>PyList_GET_ITEM(pyItems, i)),
+                jsExc)
+            if jsExc[0] != NULL:
+                return NULL
+        return jsArray
+    except BaseException, e:
+        jsExc[0] = pyExceptionToJS(jsCtx, e)
+        return NULL
+
+cdef JSObjectRef makePySeqPrototype(JSContextRef jsCtx) except NULL:
+    """Create the prototype of ``PythonSequence`` objects in a context.
+
+    It inherits from ``Array.prototype``, so that the generic array
+    methods (``map``, ``forEach``, ``join``...) work on Python
+    sequences. ``toArray`` and ``slice`` copy the items in bulk, and
+    iteration (``for...of``, spread syntax) goes through ``toArray``.
+    The prototype is returned protected."""
+    cdef JSValueRef jsException = NULL
+    cdef JSObjectRef jsProto
+    cdef JSObjectRef jsObject
+    cdef JSValueRef jsInstaller
+    cdef JSValueRef jsArgs[1]
+    cdef JSStringRef jsNames[2]
+    cdef int i
+
+    jsObject = JSObjectMakeArray(jsCtx, 0, NULL, &jsException)
+    if jsException != NULL:
+        raise jsExceptionToPython(jsCtx, jsException)
+    jsProto = JSObjectMake(jsCtx, NULL, NULL)
+    JSObjectSetPrototype(jsCtx, jsProto,
+                         JSObjectGetPrototype(jsCtx, jsObject))
+
+    jsObject = JSObjectMakeFunctionWithCallback(jsCtx, jsToArrayName,
+                                                pySeqToArray)
+    jsNames[0] = jsToArrayName
+    jsNames[1] = jsSliceName
+    for i in range(2):
+        JSObjectSetProperty(jsCtx, jsProto, jsNames[i], jsObject,
+                            kJSPropertyAttributeDontEnum, &jsException)
+        if jsException != NULL:
+            raise jsExceptionToPython(jsCtx, jsException)
+
+    jsInstaller = JSEvaluateScript(jsCtx, jsSeqIteratorScript, NULL, NULL,
+                                   1, &jsException)
+    if jsException != NULL:
+        raise jsExceptionToPython(jsCtx, jsException)
+    jsArgs[0] = jsProto
+    JSObjectCallAsFunction(jsCtx, <JSObjectRef>jsInstaller, NULL, 1, jsArgs,
+                           &jsException)
+    if jsException != NULL:
+        raise jsExceptionToPython(jsCtx, jsException)
+
+    JSValueProtect(jsCtx, jsProto)
+    return jsProto
+
 # Class definition structure for PythonSequence.
 cdef JSClassDefinition pySeqClassDef = kJSClassDefinitionEmpty
 pySeqClassDef.className = 'PythonSequence'
@@ -1246,7 +4413,7 @@ cdef void pyMapGetPropertyNames(JSContextRef jsCtx,
                                 JSObjectRef jsMap,
                                 JSPropertyNameAccumulatorRef
                                   jsPropertyNames) with gil:
-    cdef object pyMap = <object>JSObjectGetPrivate(jsMap)
+    cdef object pyMap = pyObjectFromJS(jsMap)
     cdef JSStringRef jsName
 
     for pyName in pyMap:
@@ -1260,7 +4427,7 @@ cdef JSValueRef pyMapGetProperty(JSContextRef jsCtx,
                                  JSObjectRef jsMap,
                                  JSStringRef jsPropertyName,
                                  JSValueRef* jsExc) with gil:
-    cdef object pyMap = <object>JSObjectGetPrivate(jsMap)
+    cdef object pyMap = pyObjectFromJS(jsMap)
     cdef object pyPropertyName = pyStringFromJS(jsPropertyName)
 
     try:
@@ -1273,7 +4440,7 @@ cdef bool pyMapSetProperty(JSContextRef jsCtx,
                            JSStringRef jsPropertyName,
                            JSValueRef jsValue,
                            JSValueRef* jsExc) with gil:
-    cdef object pyMap = <object>JSObjectGetPrivate(jsMap)
+    cdef object pyMap = pyObjectFromJS(jsMap)
     cdef object pyPropertyName = pyStringFromJS(jsPropertyName)
     cdef object pyValue = jsToPython(jsCtx, jsValue)
 
@@ -1287,7 +4454,7 @@ cdef bool pyMapDeleteProperty(JSContextRef jsCtx,
                               JSObjectRef jsMap,
                               JSStringRef jsPropertyName,
                               JSValueRef* jsExc) with gil:
-    cdef object pyMap = <object>JSObjectGetPrivate(jsMap)
+    cdef object pyMap = pyObjectFromJS(jsMap)
     cdef object pyPropertyName = pyStringFromJS(jsPropertyName)
 
     try:
@@ -1309,15 +4476,322 @@ pyMapClassDef.getPropertyNames = pyMapGetPropertyNames
 cdef JSClassRef pyMapClass = JSClassCreate(&pyMapClassDef)
 
 
+# Exposed classes: JavaScript classes generated for specific Python
+# types (see exposeClass). Their methods are functions of a prototype
+# created once per context, which the generic property callbacks
+# leave alone.
+
+cdef int pyContainerKind(object pyType) except -1:
+    """Return the PY_CONTAINER_* constant for ``pyType``."""
+    if issubclass(pyType, collections.abc.Sequence):
+        return PY_CONTAINER_SEQUENCE
+    elif issubclass(pyType, collections.abc.Mapping):
+        return PY_CONTAINER_MAPPING
+    else:
+        return PY_CONTAINER_NONE
+
+cdef JSClassRef genericPyClass(object pyType):
+    """Return the generic class wrapping instances of ``pyType``."""
+    cdef int container = pyContainerKind(pyType)
+
+    if container == PY_CONTAINER_SEQUENCE:
+        return pySeqClass
+    elif container == PY_CONTAINER_MAPPING:
+        return pyMapClass
+    else:
+        return pyObjectClass
+
+cdef class _ExposedClass:
+    """A JavaScript class generated by ``exposeClass``."""
+
+    cdef JSClassRef jsClass
+    cdef object pyType
+
+    # The PY_CONTAINER_* constant of the type.
+    cdef int container
+
+    # Encoded names, referenced by the class definition tables.
+    cdef bytes className
+    cdef list encodedNames
+
+    cdef JSStaticValueNC *staticValues
+
+    # The methods of the class (unbound), and their names as Python
+    # and JavaScript strings.
+    cdef list methods
+    cdef list methodNames
+    cdef frozenset methodNameSet
+    cdef JSStringRef *jsMethodNames
+    cdef Py_ssize_t methodCount
+
+    # The JavaScript functions implementing the methods in every
+    # context (see makePrototype), mapped to their method index plus
+    # one. Contexts remove their functions when they are deallocated.
+    cdef _PtrTable *methodIndexes
+
+    cdef JSObjectRef makePrototype(self, JSContextRef jsCtx,
+                                   list jsObjects) except NULL:
+        """Create the prototype of the class in a context, holding one
+        function per method, and return it.
+
+        The prototype and then the functions are protected and
+        appended to ``jsObjects`` (enclosed in PyCapsule instances) as
+        they are created, and the functions are registered in
+        ``methodIndexes`` (see releasePrototypeObjects)."""
+        cdef JSValueRef jsException = NULL
+        cdef JSObjectRef jsProto
+        cdef JSObjectRef jsFunction
+        cdef Py_ssize_t i
+
+        jsProto = JSObjectMake(jsCtx, NULL, NULL)
+        JSValueProtect(jsCtx, jsProto)
+        jsObjects.append(PyCapsule_New(jsProto, NULL, NULL))
+        for i in range(self.methodCount):
+            jsFunction = JSObjectMakeFunctionWithCallback(
+                jsCtx, self.jsMethodNames[i], pyClassCallMethod)
+            JSValueProtect(jsCtx, jsFunction)
+            jsObjects.append(PyCapsule_New(jsFunction, NULL, NULL))
+            ptrTableSet(self.methodIndexes, <void *>jsFunction,
+                        <void *>(i + 1))
+
+            JSObjectSetProperty(jsCtx, jsProto, self.jsMethodNames[i],
+                                jsFunction,
+                                kJSPropertyAttributeDontEnum |
+                                kJSPropertyAttributeDontDelete,
+                                &jsException)
+            if jsException != NULL:
+                raise jsExceptionToPython(jsCtx, jsException)
+        return jsProto
+
+    cdef object findMethod(self, JSObjectRef jsFunction, object pyObj):
+        """Return the method implemented by the function ``jsFunction``
+        for ``pyObj``, or None if it is not a method of this class."""
+        cdef Py_ssize_t i = <Py_ssize_t>ptrTableGet(self.methodIndexes,
+                                                   <void *>jsFunction) - 1
+
+        if i < 0:
+            return None
+        if type(pyObj) is self.pyType:
+            return self.methods[i]
+        else:
+            # Subclasses may override the method.
+            return getattr(type(pyObj), self.methodNames[i])
+
+    def __dealloc__(self):
+        cdef Py_ssize_t i
+
+        if self.jsClass != NULL:
+            JSClassRelease(self.jsClass)
+        if self.jsMethodNames != NULL:
+            for i in range(self.methodCount):
+                JSStringRelease(self.jsMethodNames[i])
+        if self.methodIndexes != NULL:
+            ptrTableFree(self.methodIndexes)
+        free(self.jsMethodNames)
+        free(self.staticValues)
+
+# Exposed classes, by Python type.
+cdef dict _exposedClasses = {}
+
+cdef int releasePrototypeObjects(JSContextRef jsCtx, _ExposedClass exposed,
+                                 list jsObjects) except -1:
+    """Unregister and unprotect the objects created by
+    ``_ExposedClass.makePrototype``."""
+    cdef void *jsObject
+
+    for pyObject in jsObjects:
+        jsObject = PyCapsule_GetPointer(pyObject, NULL)
+        ptrTableRemove(exposed.methodIndexes, jsObject)
+        JSValueUnprotect(jsCtx, <JSObjectRef>jsObject)
+    return 0
+
+cdef JSValueRef pyClassCallMethod(JSContextRef jsCtx,
+                                  JSObjectRef jsFunction,
+                                  JSObjectRef jsThisObj,
+                                  size_t argumentCount,
+                                  JSValueRef jsArgs[],
+                                  JSValueRef* jsExc) with gil:
+    """Invoked when a method of an exposed class is called."""
+    cdef _PyWrapperData *data
+    cdef _ExposedClass exposed = None
+    cdef int i
+
+    try:
+        if jsThisObj != NULL and \
+                JSValueIsObjectOfClass(jsCtx, jsThisObj, pyObjectClass):
+            data = <_PyWrapperData *>JSObjectGetPrivate(jsThisObj)
+            pyObj = <object>data.pyObj
+            if data.exposed != NULL:
+                exposed = <_ExposedClass>data.exposed
+        if exposed is None:
+            raise TypeError, "method called on an incompatible object"
+
+        method = exposed.findMethod(jsFunction, pyObj)
+        if method is None:
+            raise TypeError, "method called on an incompatible object"
+
+        args = [jsToPython(jsCtx, jsArgs[i])
+                for i in range(argumentCount)]
+        return pythonToJS(jsCtx, method(pyObj, *args))
+    except BaseException, e:
+        jsExc[0] = pyExceptionToJS(jsCtx, e)
+        return NULL
+
+cdef JSValueRef pyClassGetValue(JSContextRef jsCtx,
+                                JSObjectRef jsObj,
+                                JSStringRef jsPropertyName,
+                                JSValueRef* jsExc) with gil:
+    cdef object pyObj = pyObjectFromJS(jsObj)
+
+    try:
+        return pythonToJS(jsCtx,
+                          getattr(pyObj, pyStringFromJS(jsPropertyName)))
+    except BaseException, e:
+        jsExc[0] = pyExceptionToJS(jsCtx, e)
+        return NULL
+
+cdef bool pyClassSetValue(JSContextRef jsCtx,
+                          JSObjectRef jsObj,
+                          JSStringRef jsPropertyName,
+                          JSValueRef jsValue,
+                          JSValueRef* jsExc) with gil:
+    cdef object pyObj = pyObjectFromJS(jsObj)
+
+    try:
+        setattr(pyObj, pyStringFromJS(jsPropertyName),
+                jsToPython(jsCtx, jsValue))
+        return True
+    except BaseException, e:
+        jsExc[0] = pyExceptionToJS(jsCtx, e)
+        return False
+
+cdef bint isPyMethod(object pyType, object pyName):
+    """Tell whether ``pyName`` is a method of ``pyType``, callable
+    with an instance as first argument."""
+    raw = inspect.getattr_static(pyType, pyName, None)
+    return inspect.isfunction(raw) or \
+        (inspect.ismethoddescriptor(raw) and
+         not isinstance(raw, (staticmethod, classmethod)))
+
+def exposeClass(pyType, methods=None, properties=None):
+    """Generate a JavaScript class for the instances of ``pyType``
+    (and its subclasses) passed to JavaScript.
+
+    ``methods`` are the names of the methods available from
+    JavaScript, all public methods by default. JavaScript calls them
+    directly, instead of retrieving bound methods with ``getattr``
+    and wrapping them every time they are accessed. ``properties``
+    are the names of the attributes read and written through the
+    class, by default all properties defined with ``property``.
+    Other attributes remain available as usual.
+
+    A type can only be exposed once, and a ``ValueError`` is raised
+    if it already is. Objects already passed to JavaScript keep their
+    class, so subclasses should be exposed before their instances
+    are used.
+    """
+    cdef _ExposedClass exposed
+    cdef JSClassDefinition classDef = kJSClassDefinitionEmpty
+    cdef Py_ssize_t i
+
+    if not isinstance(pyType, type):
+        raise TypeError, "only types can be exposed"
+
+    if methods is None:
+        methods = [name for name in dir(pyType)
+                   if not name.startswith('_') and isPyMethod(pyType, name)]
+    else:
+        methods = list(methods)
+        for name in methods:
+            if not isPyMethod(pyType, name):
+                raise TypeError, "'%s' is not a method of '%s'" % \
+                    (name, pyType.__name__)
+
+    if properties is None:
+        properties = [name for name in dir(pyType)
+                      if isinstance(inspect.getattr_static(pyType, name,
+                                                           None),
+                                    property)]
+    else:
+        properties = list(properties)
+
+    if pyType in _exposedClasses:
+        raise ValueError, "'%s' is already exposed" % pyType.__name__
+
+    exposed = _ExposedClass.__new__(_ExposedClass)
+    exposed.pyType = pyType
+    exposed.container = pyContainerKind(pyType)
+    exposed.className = pyType.__name__.encode('utf-8')
+    exposed.encodedNames = [name.encode('utf-8') for name in properties]
+    exposed.methods = [getattr(pyType, name) for name in methods]
+    exposed.methodNames = methods
+    exposed.methodNameSet = frozenset(methods)
+    exposed.methodCount = len(methods)
+
+    exposed.methodIndexes = ptrTableNew()
+    exposed.jsMethodNames = <JSStringRef *>calloc(len(methods) + 1,
+                                                  sizeof(JSStringRef))
+    exposed.staticValues = <JSStaticValueNC *>calloc(
+        len(properties) + 1, sizeof(JSStaticValueNC))
+    if exposed.jsMethodNames == NULL or exposed.staticValues == NULL:
+        raise MemoryError
+
+    for i in range(len(methods)):
+        exposed.jsMethodNames[i] = createJSStringFromPython(methods[i])
+
+    # The table is terminated by a zeroed entry.
+
+    for i in range(len(properties)):
+        raw = inspect.getattr_static(pyType, properties[i], None)
+        exposed.staticValues[i].name = exposed.encodedNames[i]
+        exposed.staticValues[i].getProperty = pyClassGetValue
+        if isinstance(raw, property) and raw.fset is None:
+            exposed.staticValues[i].attributes = \
+                kJSPropertyAttributeReadOnly | kJSPropertyAttributeDontDelete
+        else:
+            exposed.staticValues[i].setProperty = pyClassSetValue
+            exposed.staticValues[i].attributes = \
+                kJSPropertyAttributeDontDelete
+
+    # Methods are functions in a prototype created for every context
+    # (see JSContext.exposedPrototype), which tells them apart by
+    # identity.
+    classDef.className = exposed.className
+    classDef.attributes = kJSClassAttributeNoAutomaticPrototype
+    classDef.parentClass = genericPyClass(pyType)
+    classDef.staticValues = <JSStaticValue*>exposed.staticValues
+    exposed.jsClass = JSClassCreate(&classDef)
+
+    _exposedClasses[pyType] = exposed
+    _pyTypeInfos.clear()
+
+
 # Wrap a Python object into the appropriate JavaScript class instance.
-cdef JSObjectRef makePyObject(JSContextRef jsCtx, object pyObj):
+cdef JSObjectRef makePyObject(JSContextRef jsCtx,
+                              object pyObj) except NULL:
     """Wrap a Python object for use in JavaScript."""
-    if isinstance(pyObj, collections.Sequence):
-        return JSObjectMake(jsCtx, pySeqClass, <void *>pyObj)
-    elif isinstance(pyObj, collections.Mapping):
-        return JSObjectMake(jsCtx, pyMapClass, <void *>pyObj)
-    else:
-        return JSObjectMake(jsCtx, pyObjectClass, <void *>pyObj)
+    cdef _PyTypeInfo info = pyTypeInfo(pyObj)
+    cdef JSClassRef jsClass = info.jsClass
+    cdef JSObjectRef jsProto = NULL
+    cdef _PyWrapperData *data
+
+    if info.exposed is not None:
+        jsProto = contextFromJS(jsCtx).exposedPrototype(info.exposed)
+    elif jsClass == pySeqClass:
+        jsProto = contextFromJS(jsCtx).seqPrototype()
+
+    data = <_PyWrapperData *>malloc(sizeof(_PyWrapperData))
+    if data == NULL:
+        raise MemoryError
+    data.pyObj = <void *>pyObj
+    data.cache = NULL
+    data.exposed = <void *>info.exposed if info.exposed is not None \
+        else NULL
+    data.ctx = NULL
+    data.jsObject = JSObjectMake(jsCtx, jsClass, data)
+    if jsProto != NULL:
+        JSObjectSetPrototype(jsCtx, data.jsObject, jsProto)
+    return data.jsObject
 
 
 #
@@ -1326,6 +4800,40 @@ cdef JSObjectRef makePyObject(JSContextRef jsCtx, object pyObj):
 
 def _cachedStats():
     """Returns statistics about the wrappers cached in this moduel."""
-    return {'wrappedJSObjsCount': len(_pyWrappedJSObjs),
-            'wrappedPyObjsCount': len(_pyWrappedPyObjs),
+    cdef JSContext ctx
+    cdef Py_ssize_t jsCount = 0
+    cdef Py_ssize_t pyCount = 0
+    cdef size_t i
+
+    for i in range(_jsContexts.mask + 1):
+        if _jsContexts.values[i] != NULL:
+            ctx = <JSContext>_jsContexts.values[i]
+            jsCount += ctx.jsWrappers.used
+            pyCount += ctx.pyWrappers.used
+
+    return {'wrappedJSObjsCount': jsCount,
+            'wrappedPyObjsCount': pyCount,
+            'contextCount': _jsContexts.used,
+            }
+
+def _adoptContext():
+    """Create a global context the way an embedding application
+    would, and return the wrapper adopted for it."""
+    cdef JSGlobalContextRef jsGlobalCtx = JSGlobalContextCreate(NULL)
+
+    try:
+        return contextFromJS(jsGlobalCtx)
+    finally:
+        JSGlobalContextRelease(jsGlobalCtx)
+
+def _releaseAdoptedContext(JSContext ctx):
+    """Release an adopted context (see PyJSContext4_Release)."""
+    releaseAdoptedContext(ctx)
+
+def _nameCacheStats():
+    """Returns statistics about the property name cache."""
+    return {'size': len(_jsNameCache),
+            'maxSize': _jsNameCacheSize,
+            'hits': _jsNameCacheHits,
+            'misses': _jsNameCacheMisses,
             }
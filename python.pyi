@@ -20,15 +20,28 @@
 # Boston, MA 02111-1307, USA. 
 
 cdef extern from "Python.h":
-    ctypedef unsigned short Py_UNICODE
+    ctypedef unsigned char Py_UCS1
+    ctypedef unsigned short Py_UCS2
+    ctypedef unsigned int Py_UCS4
 
     void Py_INCREF(object o)
     void Py_DECREF(object o)
 
     char* PyString_AsString(object o)
 
-    object PyUnicode_DecodeUTF16(Py_UNICODE *u, Py_ssize_t size,
-                                 char *errors, int byteorder)
+    object PyUnicode_DecodeUTF16(char *s, Py_ssize_t size,
+                                 char *errors, int *byteorder)
+
+    # PEP 393 string representation.
+    enum:
+        PyUnicode_1BYTE_KIND, PyUnicode_2BYTE_KIND, PyUnicode_4BYTE_KIND
+
+    int PyUnicode_READY(object o) except -1
+    object PyUnicode_New(Py_ssize_t size, Py_UCS4 maxchar)
+    Py_ssize_t PyUnicode_GET_LENGTH(object o)
+    int PyUnicode_KIND(object o)
+    void* PyUnicode_DATA(object o)
+    bint PyUnicode_IS_ASCII(object o)
 
     ctypedef void * PyCapsule_Destructor
     object PyCapsule_New(void *pointer, const char *name, PyCapsule_Destructor destructor)
@@ -23,6 +23,10 @@ cdef extern from "stdlib.h":
     ctypedef unsigned long size_t
     void free(void *ptr)
     void *malloc(size_t size)
+    void *calloc(size_t nmemb, size_t size)
     void *realloc(void *ptr, size_t size)
     size_t strlen(char *s)
     char *strcpy(char *dest, char *src)
+
+cdef extern from "string.h":
+    void *memcpy(void *dest, void *src, size_t n)
@@ -20,9 +20,15 @@
 
 import unittest
 import sys
+import gc
+import weakref
+import threading
+import queue
+import asyncio
+import collections.abc
 
 import javascriptcore as jscore
-from javascriptcore import asSeq
+from javascriptcore import asSeq, bind
 
 from base import TestCaseWithContext
 
@@ -111,6 +117,67 @@ class EvaluateScriptTestCase(TestCaseWithContext):
         self.assertRaises(jscore.JSException, code)
 
 
+class EvaluateArgumentsTestCase(TestCaseWithContext):
+    """Pass the optional arguments of evaluateScript."""
+
+    def testThisObject(self):
+        obj = self.ctx.evaluateScript('({a: 1})')
+        self.assertEqual(self.ctx.evaluateScript('this.a', obj), 1)
+
+    def testPythonThisObject(self):
+        self.assertEqual(
+            self.ctx.evaluateScript('this.b', {'b': 2}), 2)
+
+    def testNonObjectThisObject(self):
+        self.assertRaises(TypeError, self.ctx.evaluateScript,
+                          'this', 1)
+
+    def testSourceURL(self):
+        try:
+            self.ctx.evaluateScript('throw Error("x")',
+                                    sourceURL='test.js')
+        except jscore.JSException as e:
+            self.assertEqual(e.pyWrapped.sourceURL, 'test.js')
+        else:
+            self.fail('no exception raised')
+
+
+class CompileTestCase(TestCaseWithContext):
+    """Compile scripts and run them repeatedly."""
+
+    def testRun(self):
+        script = self.ctx.compile('var n = (n || 0) + 1; n')
+        self.assertEqual(script.run(), 1)
+        self.assertEqual(script.run(), 2)
+
+    def testThisObject(self):
+        script = self.ctx.compile('this.a * 2')
+        self.assertEqual(script.run({'a': 3}), 6)
+        self.assertEqual(script.run({'a': 4}), 8)
+
+    def testSyntaxError(self):
+        self.assertRaises(jscore.JSException, self.ctx.compile,
+                          '(function(x){return x+2 return})(3)')
+
+    def testSyntaxErrorNotRun(self):
+        self.assertRaises(jscore.JSException, self.ctx.compile,
+                          'var ran = true; )')
+        self.assertEqual(self.ctx.evaluateScript('typeof ran'),
+                         'undefined')
+
+    def testKey(self):
+        self.ctx.compile('1', key='k')
+        self.assertEqual(self.ctx.compile('2', key='k').run(), 1)
+
+    def testCacheSize(self):
+        self.ctx.scriptCacheSize = 1
+        self.ctx.compile('1', key='k')
+        self.ctx.compile('2')
+        self.assertEqual(self.ctx.compile('3', key='k').run(), 3)
+        self.assertRaises(ValueError, setattr, self.ctx,
+                          'scriptCacheSize', -1)
+
+
 class ContextLifeTestCase(unittest.TestCase):
     """Check that the context remains alive when Python still
     references some of its objects.
@@ -130,6 +197,156 @@ class ContextLifeTestCase(unittest.TestCase):
         # Release the object.
         del obj
 
+    def contextCount(self):
+        gc.collect()
+        return jscore._cachedStats()['contextCount']
+
+    def testAdoptedContext(self):
+        count = self.contextCount()
+        ctx = jscore._adoptContext()
+        self.assertEqual(self.contextCount(), count + 1)
+        del ctx
+        self.assertEqual(self.contextCount(), count)
+
+    def testReleaseAdoptedContext(self):
+        count = self.contextCount()
+        ctx = jscore._adoptContext()
+        ctx.globalObject.obj = object()
+        ref = weakref.ref(ctx)
+
+        # The JavaScript wrapper keeps the adopted context alive.
+        del ctx
+        self.assertEqual(self.contextCount(), count + 1)
+
+        jscore._releaseAdoptedContext(ref())
+        self.assertEqual(self.contextCount(), count)
+
+
+class ReleaseGILTestCase(unittest.TestCase):
+    """Run JavaScript code with the GIL released."""
+
+    def setUp(self):
+        self.ctx = jscore.JSContext(releaseGIL=True)
+
+    def tearDown(self):
+        del self.ctx
+
+    def testReleaseGIL(self):
+        self.assertTrue(self.ctx.releaseGIL)
+        self.assertFalse(jscore.JSContext().releaseGIL)
+
+    def testEvaluateScript(self):
+        self.assertEqual(self.ctx.evaluateScript('1 + 2'), 3)
+
+    def testCallback(self):
+        self.ctx.globalObject.f = lambda x: x * 2
+        self.assertEqual(self.ctx.evaluateScript('f(21)'), 42)
+
+    def testException(self):
+        self.assertRaises(jscore.JSException,
+                          self.ctx.evaluateScript, 'throw 1')
+
+    def testThreads(self):
+        f = self.ctx.evaluateScript("""
+          (function (n) {
+            var s = 0;
+            for (var i = 0; i < n; i++) s += i;
+            return s;
+          })
+          """)
+        results = []
+
+        def run():
+            results.append(f(100000))
+
+        threads = [threading.Thread(target=run) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [4999950000] * 4)
+
+
+class ContextGroupTestCase(unittest.TestCase):
+    """Create contexts in a shared context group."""
+
+    def testSharedObjects(self):
+        group = jscore.JSContextGroup()
+        ctx1 = jscore.JSContext(group=group)
+        ctx2 = jscore.JSContext(group=group)
+        self.assertTrue(ctx1.group is group)
+        ctx1.globalObject.obj = {'a': 1}
+        ctx2.globalObject.obj = ctx1.evaluateScript('obj')
+        self.assertEqual(ctx2.evaluateScript('obj.a'), 1)
+
+    def testReleaseGIL(self):
+        group = jscore.JSContextGroup(releaseGIL=True)
+        self.assertTrue(jscore.JSContext(group=group).releaseGIL)
+        self.assertRaises(ValueError, jscore.JSContext,
+                          releaseGIL=True, group=jscore.JSContextGroup())
+
+
+class ContextPoolTestCase(unittest.TestCase):
+    """Check contexts in and out of a context pool."""
+
+    def testCheckout(self):
+        pool = jscore.JSContextPool(2, bootstrap='var x = 1;')
+        ctx1 = pool.checkout()
+        ctx2 = pool.checkout()
+        self.assertTrue(ctx1 is not ctx2)
+        self.assertEqual(ctx1.evaluateScript('x'), 1)
+        self.assertRaises(queue.Empty, pool.checkout, timeout=0.01)
+        pool.checkin(ctx1)
+        self.assertTrue(pool.checkout() is ctx1)
+
+    def testResetOnCheckin(self):
+        pool = jscore.JSContextPool(1, bootstrap='var x = 1;',
+                                    resetOnCheckin=True)
+        with pool.context() as ctx:
+            ctx.evaluateScript('x = 2')
+        with pool.context() as ctx:
+            self.assertEqual(ctx.evaluateScript('x'), 1)
+
+    def testFailedReset(self):
+        pool = jscore.JSContextPool(1, bootstrap='var x = 1; new Date(0)',
+                                    resetOnCheckin=True)
+        ctx = pool.checkout()
+
+        def fail(date):
+            raise ValueError
+
+        jscore.registerJSConverter('Date', fail)
+        try:
+            self.assertRaises(ValueError, pool.checkin, ctx)
+        finally:
+            jscore.registerJSConverter('Date', None)
+        self.assertEqual(pool.available(), 1)
+        with pool.context() as ctx:
+            self.assertEqual(ctx.evaluateScript('x'), 1)
+
+    def testSharedGroup(self):
+        pool = jscore.JSContextPool(2, shareGroup=True)
+        with pool.context() as ctx1:
+            with pool.context() as ctx2:
+                self.assertTrue(ctx1.group is ctx2.group)
+
+    def testThreads(self):
+        pool = jscore.JSContextPool(2)
+        results = []
+
+        def run(n):
+            with pool.context() as ctx:
+                results.append(ctx.evaluateScript('%d * 2' % n))
+
+        threads = [threading.Thread(target=run, args=(i,))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), [i * 2 for i in range(8)])
+        self.assertEqual(pool.available(), 2)
+
 
 class WrapUnwrapTestCase(TestCaseWithContext):
     """Test object wrapping and unwrapping.
@@ -165,6 +382,21 @@ class WrapUnwrapTestCase(TestCaseWithContext):
         del obj2
         self.assertTrue(jscore._cachedStats()['wrappedJSObjsCount'] == l1)
 
+    def testCachedWrappers2(self):
+        l1 = self.ctx.cachedStats()['wrappedJSObjsCount']
+        obj2 = self.ctx.evaluateScript("({c: 3})")
+        self.assertEqual(self.ctx.cachedStats()['wrappedJSObjsCount'],
+                         l1 + 1)
+        del obj2
+        self.assertEqual(self.ctx.cachedStats()['wrappedJSObjsCount'], l1)
+
+    def testCachedWrappers3(self):
+        ctx2 = jscore.JSContext()
+        obj2 = ctx2.evaluateScript("({c: 3})")
+        self.assertEqual(ctx2.cachedStats()['wrappedJSObjsCount'], 1)
+        del obj2
+        self.assertEqual(ctx2.cachedStats()['wrappedJSObjsCount'], 0)
+
 
 class NullUndefTestCase(TestCaseWithContext):
     """Access JavaScript's null and undefined values."""
@@ -275,6 +507,46 @@ class FunctionCallTestCase(TestCaseWithContext):
         f = self.ctx.evaluateScript('(function() {throw Error("Message");})')
         self.assertRaises(jscore.JSException, f)
 
+    def testManyParams(self):
+        f = self.ctx.evaluateScript("""
+          (function() {
+            return Array.prototype.slice.call(arguments).join(',')
+          })
+          """)
+        self.assertEqual(f(*range(20)), ','.join(map(str, range(20))))
+
+    def testExceptionAttributes(self):
+        f = self.ctx.evaluateScript(
+            '(function() {throw TypeError("Message");})')
+        try:
+            f()
+        except jscore.JSException as e:
+            self.assertEqual(e.name, 'TypeError')
+            self.assertEqual(e.message, 'Message')
+            self.assertEqual(e.pyWrapped.message, 'Message')
+        else:
+            self.fail('no exception raised')
+
+    def testExceptionNonObject(self):
+        f = self.ctx.evaluateScript('(function() {throw 1;})')
+        try:
+            f()
+        except jscore.JSException as e:
+            self.assertEqual(e.pyWrapped, 1)
+            self.assertEqual(e.name, '<Unknown error>')
+        else:
+            self.fail('no exception raised')
+
+    def testCallMany(self):
+        f = self.ctx.evaluateScript('(function(x, y) {return x * y})')
+        self.assertEqual(f.callMany([(1, 2), [3, 4], (5, 6)]), [2, 12, 30])
+        self.assertEqual(f.callMany(iter([])), [])
+
+    def testCallManyException(self):
+        f = self.ctx.evaluateScript(
+            '(function(x) {if (x) throw Error("x"); return x})')
+        self.assertRaises(jscore.JSException, f.callMany, [(0,), (1,)])
+
 
 class MethodCallTestCase(TestCaseWithContext):
     """Call JavaScript methods from Python."""
@@ -321,6 +593,25 @@ class MethodCallTestCase(TestCaseWithContext):
     def testException(self):
         self.assertRaises(jscore.JSException, self.obj.k)
 
+    def testCallMany(self):
+        self.assertEqual(self.obj.i.callMany([(), ()]), [1, 1])
+
+    def testBoundCached(self):
+        self.assertTrue(self.obj.i is self.obj.i)
+        self.assertTrue(bind(self.obj, 'i') is self.obj.i)
+
+    def testBoundInvalidated(self):
+        boundI = self.obj.i
+        self.ctx.evaluateScript('obj.i = function() {return 2}')
+        self.assertFalse(self.obj.i is boundI)
+        self.assertEqual(self.obj.i(), 2)
+        self.assertEqual(boundI(), 1)
+
+    def testBind(self):
+        f = bind(self.obj, 'f')
+        self.assertEqual([f(i, 1) for i in range(3)], [1, 2, 3])
+        self.assertRaises(TypeError, bind, self.obj, 'a')
+
 
 class MappingTestCase(TestCaseWithContext):
     """Test mapping behavior for wrapped JavaScript objects.
@@ -441,6 +732,37 @@ class MappingTestCase(TestCaseWithContext):
         def f(o): o.setdefault('a', 111); o.setdefault('x', 777)
         self.evalPy(f)
 
+    def testPop3(self):
+        self.assertEqualFunc(lambda o: o.pop('x', 3), 3)
+
+    def testPopItem1(self):
+        def f(o): return o.popitem() in [('a', 11), ('b', 22), ('c', None),
+                                          ('1', 44), ('2', 55)]
+        self.assertEqualFunc(f, True)
+        self.assertEqualFunc(lambda o: len(o), 4)
+        self.obj.clear()
+        self.objPython.clear()
+
+    def testPopItem2(self):
+        self.evalPy(lambda o: o.clear())
+        self.assertRaisesFunc(KeyError, lambda o: o.popitem())
+
+    def testClear1(self):
+        self.evalPy(lambda o: o.clear())
+        self.assertEqualFunc(lambda o: len(o), 0)
+
+    def testUpdate2(self):
+        def f(o): o.update([('a', 111), ('y', 888)], z=999)
+        self.evalPy(f)
+
+    def testEqual1(self):
+        self.assertEqualFunc(lambda o: o == {'a': 11}, False)
+        self.assertEqualFunc(lambda o: o == 11, False)
+
+    def testIsInstance(self):
+        import collections.abc
+        self.assertTrue(isinstance(self.obj, collections.abc.MutableMapping))
+
 
 class AsSeqTestCase(TestCaseWithContext):
     """Basic test of the asSeq operation."""
@@ -729,6 +1051,62 @@ class ArrayTestCase(TestCaseWithContext):
         self.assertEqual(list(self.obj), [1, 2, 3, 4, 5, 10])
 
 
+class ArrayLikeTestCase(ArrayTestCase):
+    """Work with JavaScript array-like objects that are not arrays."""
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+        self.obj = asSeq(self.ctx.evaluateScript("""
+          ({length: 5, 0: 1, 1: 2, 2: 3, 3: 4, 4: 5})
+          """))
+
+
+class SpliceTestCase(TestCaseWithContext):
+    """Modify real JavaScript arrays with single splice calls."""
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+        self.arr = self.ctx.evaluateScript("""
+          var calls = 0;
+          var a = [1, 2, 3, 4, 5];
+          a.splice = function () {
+            calls++;
+            return Array.prototype.splice.apply(this, arguments);
+          };
+          a;
+          """)
+        self.obj = asSeq(self.arr)
+
+    def testInsert(self):
+        self.obj.insert(0, 10)
+        self.assertEqual(list(self.obj), [10, 1, 2, 3, 4, 5])
+        self.assertEqualJS('calls', 1)
+
+    def testDelete(self):
+        del self.obj[1]
+        del self.obj[1:3]
+        self.assertEqual(list(self.obj), [1, 5])
+        self.assertEqualJS('calls', 2)
+
+    def testSliceAssign(self):
+        self.obj[1:4] = ['a', 'b']
+        self.assertEqual(list(self.obj), [1, 'a', 'b', 5])
+        self.assertEqualJS('calls', 1)
+
+    def testExtendedSlice(self):
+        del self.obj[::2]
+        self.assertEqual(list(self.obj), [2, 4])
+        self.assertEqualJS('calls', 0)
+
+    def testLargeInsert(self):
+        arr = asSeq(self.ctx.evaluateScript('[]'))
+        arr[:] = range(50000)
+        arr.insert(0, -1)
+        self.assertEqual(len(arr), 50001)
+        self.assertEqual(arr[0], -1)
+        self.assertEqual(arr[50000], 49999)
+
+
 class MutableSequenceTest(TestCaseWithContext):
     """Test mutable sequence behavior on wrapped JavaScript arrays."""
 
@@ -739,8 +1117,9 @@ class MutableSequenceTest(TestCaseWithContext):
           """))
 
     def testIsInstance(self):
-        import collections
-        self.assertTrue(isinstance(self.obj, collections.MutableSequence))
+        import collections.abc
+        self.assertTrue(isinstance(self.obj,
+                                   collections.abc.MutableSequence))
 
     def testAppend(self):
         self.obj.append(30)
@@ -757,3 +1136,726 @@ class MutableSequenceTest(TestCaseWithContext):
     def testCount(self):
         self.assertEqual(self.obj.count(3), 1)
         self.assertEqual(self.obj.count(7), 0)
+
+    def testPop(self):
+        self.assertEqual(self.obj.pop(), 5)
+        self.assertEqual(self.obj.pop(0), 1)
+        self.assertEqual(list(self.obj), [2, 3, 4])
+
+    def testRemove(self):
+        self.obj.remove(3)
+        self.assertEqual(list(self.obj), [1, 2, 4, 5])
+        self.assertRaises(ValueError, self.obj.remove, 7)
+
+    def testReversed(self):
+        self.assertEqual(list(reversed(self.obj)), [5, 4, 3, 2, 1])
+
+    def testInPlaceAdd(self):
+        seq = self.obj
+        seq += [6, 7]
+        self.assertTrue(seq is self.obj)
+        self.assertEqual(list(self.obj), [1, 2, 3, 4, 5, 6, 7])
+
+    def testClear(self):
+        self.obj.clear()
+        self.assertEqual(len(self.obj), 0)
+
+
+class ArrayLikeMutableSequenceTest(MutableSequenceTest):
+    """Test mutable sequence behavior on array-like objects that are
+    not arrays."""
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+        self.obj = asSeq(self.ctx.evaluateScript("""
+          ({length: 5, 0: 1, 1: 2, 2: 3, 3: 4, 4: 5})
+          """))
+
+
+class NameCacheTestCase(TestCaseWithContext):
+    """Test the property name cache."""
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+        self.obj = self.ctx.evaluateScript("""
+          ({cachedName: 1})
+          """)
+
+    def tearDown(self):
+        jscore.setNameCacheSize(256)
+        TestCaseWithContext.tearDown(self)
+
+    def testHits(self):
+        self.obj.cachedName
+        hits = jscore._nameCacheStats()['hits']
+        self.assertEqual(self.obj.cachedName, 1)
+        self.assertEqual(self.obj['cachedName'], 1)
+        self.assertTrue('cachedName' in self.obj)
+        self.assertEqual(jscore._nameCacheStats()['hits'], hits + 3)
+
+    def testBounded(self):
+        jscore.setNameCacheSize(2)
+        for name in ('a', 'b', 'c', 'd'):
+            self.obj[name] = 1
+        self.assertEqual(jscore._nameCacheStats()['size'], 2)
+        self.assertEqual(self.obj.c, 1)
+
+    def testDisabled(self):
+        jscore.setNameCacheSize(0)
+        self.assertEqual(self.obj.cachedName, 1)
+        self.assertEqual(jscore._nameCacheStats()['size'], 0)
+
+
+class StringConversionTestCase(TestCaseWithContext):
+    """Convert strings with characters of different widths."""
+
+    def roundTrip(self, pyStr):
+        self.ctx.globalObject.s = pyStr
+        self.assertEqual(self.ctx.evaluateScript('s.length'),
+                         len(pyStr.encode('utf-16-le', 'surrogatepass')) // 2)
+        self.assertEqual(self.ctx.globalObject.s, pyStr)
+
+    def testAscii(self):
+        self.roundTrip('abc')
+        self.roundTrip('x' * 1000)
+
+    def testLatin1(self):
+        self.roundTrip('caf\xe9')
+        self.assertEqualJS('"caf\\u00e9"', 'caf\xe9')
+
+    def testUCS2(self):
+        self.roundTrip('\u4e2d\u6587')
+        self.assertEqualJS('"\\u4e2d"', '\u4e2d')
+
+    def testAstral(self):
+        self.roundTrip('a\U0001f600b')
+        self.assertEqualJS('"\\ud83d\\ude00"', '\U0001f600')
+
+    def testLoneSurrogate(self):
+        self.assertEqualJS('"\\ud83d"', '\ud83d')
+
+    def testByteOrderMark(self):
+        self.assertEqualJS('"\\ufeffa"', '\ufeffa')
+
+    def testEmbeddedNull(self):
+        self.roundTrip('a\x00b')
+
+
+class ToPythonTestCase(TestCaseWithContext):
+    """Convert whole JavaScript object graphs into Python data."""
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+        self.obj = self.ctx.evaluateScript("""
+          ({a: 1, b: [1, 'x', {c: null}], d: {e: undefined},
+            f: function () {}})
+          """)
+
+    def testToPython(self):
+        res = self.ctx.toPython(self.obj)
+        self.assertEqual(type(res), dict)
+        self.assertEqual(res['a'], 1)
+        self.assertEqual(res['b'], [1, 'x', {'c': jscore.Null}])
+        self.assertEqual(res['d'], {'e': None})
+        self.assertTrue(isinstance(res['f'], jscore.JSFunction))
+
+    def testToDict(self):
+        self.assertEqual(self.obj.d.toDict(), {'e': None})
+
+    def testToList(self):
+        self.assertEqual(asSeq(self.obj.b).toList(),
+                         [1, 'x', {'c': jscore.Null}])
+        self.assertEqual(self.ctx.toPython(asSeq(self.obj.b))[1], 'x')
+
+    def testShallow(self):
+        res = self.obj.toDict(deep=False)
+        self.assertTrue(isinstance(res['b'], jscore.JSObject))
+        self.assertEqual(res['b'][0], 1)
+
+    def testScalar(self):
+        self.assertEqual(self.ctx.toPython(5), 5)
+
+    def testCycle(self):
+        obj = self.ctx.evaluateScript('var o = {}; o.o = o; o')
+        self.assertRaises(ValueError, obj.toDict)
+
+    def testShared(self):
+        obj = self.ctx.evaluateScript('var s = [1]; ({a: s, b: s})')
+        self.assertEqual(obj.toDict(), {'a': [1], 'b': [1]})
+
+    def testMaxDepth(self):
+        obj = self.ctx.evaluateScript('({a: {b: {c: 1}}})')
+        self.assertRaises(ValueError, obj.toDict, maxDepth=2)
+        self.assertEqual(obj.toDict(maxDepth=3), {'a': {'b': {'c': 1}}})
+
+
+class FromPythonTestCase(TestCaseWithContext):
+    """Copy Python data into native JavaScript objects."""
+
+    def testList(self):
+        self.ctx.globalObject.a = self.ctx.fromPython([1, 'x', None])
+        self.assertTrueJS('Array.isArray(a)')
+        self.assertEqualJS('a.length', 3)
+        self.assertEqualJS('a[1]', 'x')
+        self.assertTrueJS('a[2] === undefined')
+
+    def testDict(self):
+        self.ctx.globalObject.o = self.ctx.fromPython({'a': 1, 2: [3]})
+        self.assertEqualJS('Object.getPrototypeOf(o) === Object.prototype',
+                           True)
+        self.assertEqualJS('o.a', 1)
+        self.assertTrueJS('Array.isArray(o["2"])')
+
+    def testTuple(self):
+        self.ctx.globalObject.t = self.ctx.fromPython((1, 2))
+        self.assertEqualJS('t.map(function (x) { return x * 2; })[1]', 4)
+
+    def testShared(self):
+        shared = [1]
+        self.ctx.globalObject.o = self.ctx.fromPython([shared, shared])
+        self.assertTrueJS('o[0] === o[1]')
+
+    def testCycle(self):
+        l = [1]
+        l.append(l)
+        self.ctx.globalObject.o = self.ctx.fromPython(l)
+        self.assertTrueJS('o[1] === o')
+
+    def testTemporaries(self):
+        class Fresh(collections.abc.Mapping):
+            """Mapping creating a new list every time an item is read."""
+
+            def __getitem__(self, key):
+                return [key]
+
+            def __iter__(self):
+                return iter(range(100))
+
+            def __len__(self):
+                return 100
+
+        self.ctx.globalObject.o = self.ctx.fromPython(Fresh())
+        self.assertEqualJS('o[0][0]', 0)
+        self.assertEqualJS('o[99][0]', 99)
+        self.assertTrueJS('o[0] !== o[1]')
+
+    def testMaxDepth(self):
+        self.assertRaises(ValueError, self.ctx.fromPython, [[[1]]],
+                          maxDepth=2)
+        self.ctx.fromPython([[[1]]], maxDepth=3)
+
+    def testNoCopy(self):
+        l = [1, 2]
+        self.assertTrue(self.ctx.fromPython(l, copy=False) is l)
+
+    def testScalar(self):
+        self.assertEqual(self.ctx.fromPython('x'), 'x')
+
+
+class JSONTestCase(TestCaseWithContext):
+    """Move data across the boundary as JSON."""
+
+    def testParseJSON(self):
+        obj = self.ctx.parseJSON('{"a": [1, 2], "b": "x"}')
+        self.assertTrue(isinstance(obj, jscore.JSObject))
+        self.assertEqual(obj.b, 'x')
+
+    def testParseJSONConvert(self):
+        self.assertEqual(self.ctx.parseJSON('{"a": [1, null]}', True),
+                         {'a': [1, jscore.Null]})
+
+    def testParseJSONBytes(self):
+        self.assertEqual(self.ctx.parseJSON(b'"caf\xc3\xa9"'), 'caf\xe9')
+        self.assertEqual(self.ctx.parseJSON(bytearray(b'[1]'), True), [1])
+
+    def testParseJSONInvalid(self):
+        self.assertRaises(ValueError, self.ctx.parseJSON, '{a: 1}')
+        self.assertRaises(ValueError, self.ctx.parseJSON, b'[1]\x00')
+
+    def testParseJSONFile(self):
+        import io
+        self.assertEqual(self.ctx.parseJSONFile(io.BytesIO(b'[1, 2]'),
+                                                True), [1, 2])
+        self.assertEqual(self.ctx.parseJSONFile(io.StringIO('[3]'),
+                                                True), [3])
+
+    def testToJSON(self):
+        obj = self.ctx.evaluateScript('({a: [1, "x"], f: function () {}})')
+        self.assertEqual(obj.toJSON(), '{"a":[1,"x"]}')
+        self.assertEqual(obj.a.toJSON(1), '[\n 1,\n "x"\n]')
+
+    def testToJSONFunction(self):
+        self.assertTrue(self.ctx.evaluateScript('(function () {})')
+                        .toJSON() is None)
+
+    def testToJSONError(self):
+        obj = self.ctx.evaluateScript('var o = {}; o.o = o; o')
+        self.assertRaises(jscore.JSException, obj.toJSON)
+
+
+class TypedArrayTestCase(TestCaseWithContext):
+    """Access JavaScript typed arrays through the buffer protocol."""
+
+    def testMemoryView(self):
+        arr = self.ctx.evaluateScript('a = new Int32Array([1, -2, 3]); a')
+        self.assertTrue(isinstance(arr, jscore.JSTypedArray))
+        view = memoryview(arr)
+        self.assertEqual(view.format, 'i')
+        self.assertEqual(view.tolist(), [1, -2, 3])
+        view[0] = 5
+        self.assertEqualJS('a[0]', 5)
+
+    def testOffset(self):
+        arr = self.ctx.evaluateScript(
+            'new Uint8Array(new Uint8Array([1, 2, 3, 4]).buffer, 2)')
+        self.assertEqual(bytes(memoryview(arr)), b'\x03\x04')
+
+    def testArrayBuffer(self):
+        buf = self.ctx.evaluateScript('new Float64Array([1]).buffer')
+        self.assertEqual(memoryview(buf).nbytes, 8)
+        self.assertEqual(memoryview(buf).format, 'B')
+
+    def testViewsAfterResize(self):
+        if not self.ctx.evaluateScript(
+                "typeof ArrayBuffer.prototype.resize === 'function'"):
+            self.skipTest("resizable array buffers are not supported")
+
+        arr = self.ctx.evaluateScript(
+            'b = new ArrayBuffer(2, {maxByteLength: 4}); new Uint8Array(b)')
+        view1 = memoryview(arr)
+        self.ctx.evaluateScript('b.resize(4)')
+        view2 = memoryview(arr)
+        self.assertEqual(view1.shape, (2,))
+        self.assertEqual(view2.shape, (4,))
+
+    def testRoundTrip(self):
+        arr = self.ctx.evaluateScript('new Float32Array([0.5])')
+        self.ctx.globalObject.b = memoryview(arr)
+        self.assertTrueJS('b instanceof Float32Array && b[0] == 0.5')
+
+
+class SequenceIterationTestCase(TestCaseWithContext):
+    """Iterate over large JavaScript arrays."""
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+        self.seq = asSeq(self.ctx.evaluateScript("""
+          var a = [];
+          for (var i = 0; i < 5000; i++) a.push(i);
+          a;
+          """))
+
+    def testIterate(self):
+        self.assertEqual(list(self.seq), list(range(5000)))
+
+    def testIterateArrayLike(self):
+        seq = asSeq(self.ctx.evaluateScript("({length: 2, 0: 'a', 1: 'b'})"))
+        self.assertEqual(list(seq), ['a', 'b'])
+
+    def testBreak(self):
+        for i, value in enumerate(self.seq):
+            if i == 3:
+                break
+        self.assertEqual(value, 3)
+
+    def testGrowWhileIterating(self):
+        seq = asSeq(self.ctx.evaluateScript('[0]'))
+        for value in seq:
+            if value < 100:
+                seq.append(value + 1)
+        self.assertEqual(len(seq), 101)
+
+    def testIterChunks(self):
+        chunks = list(self.seq.iterChunks(1000))
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(chunks[4][-1], 4999)
+        self.assertEqual([len(c) for c in asSeq(
+            self.ctx.evaluateScript('[1, 2, 3]')).iterChunks(2)], [2, 1])
+
+    def testIterChunksInvalid(self):
+        self.assertRaises(ValueError, list, self.seq.iterChunks(0))
+
+
+class SequenceSearchTestCase(TestCaseWithContext):
+    """Search values in JavaScript sequences."""
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+        self.seq = asSeq(self.ctx.evaluateScript("""
+          ([1, 'a', 2.5, true, null, undefined, 1, {x: 1}])
+          """))
+
+    def testContains(self):
+        for value in (1, 'a', 2.5, True, jscore.Null, None):
+            self.assertTrue(value in self.seq)
+        self.assertFalse('1' in self.seq)
+        self.assertFalse(3 in self.seq)
+
+    def testIndex(self):
+        self.assertEqual(self.seq.index(1), 0)
+        self.assertEqual(self.seq.index(1, 1), 3)
+        self.assertEqual(self.seq.index(1, 4), 6)
+        self.assertEqual(self.seq.index(2.5), 2)
+        self.assertEqual(self.seq.index('a', -8, 2), 1)
+        self.assertRaises(ValueError, self.seq.index, 'a', 2)
+        self.assertRaises(ValueError, self.seq.index, 1, 4, 6)
+        self.assertRaises(ValueError, self.seq.index, 'b')
+
+    def testIndexBool(self):
+        seq = asSeq(self.ctx.evaluateScript('[true, 0, 1]'))
+        self.assertEqual(seq.index(1), 0)
+        self.assertEqual(seq.index(True), 0)
+        self.assertEqual(seq.index(False), 1)
+
+    def testHoles(self):
+        seq = asSeq(self.ctx.evaluateScript('[1, , 3]'))
+        self.assertTrue(None in seq)
+        self.assertEqual(seq.index(None), 1)
+
+    def testIndexObject(self):
+        obj = self.seq[7]
+        self.assertEqual(self.seq.index(obj), 7)
+
+    def testIndexArrayLike(self):
+        seq = asSeq(self.ctx.evaluateScript("({length: 2, 0: 'a', 1: 'b'})"))
+        self.assertEqual(seq.index('b'), 1)
+        self.assertTrue('a' in seq)
+
+    def testCount(self):
+        self.assertEqual(self.seq.count(1), 3)
+        self.assertEqual(self.seq.count('z'), 0)
+
+    def testBuildIndex(self):
+        index = self.seq.buildIndex()
+        self.assertEqual(len(index), 8)
+        self.assertTrue('a' in index)
+        self.assertFalse('b' in index)
+        self.assertEqual(index.index(1), 0)
+        self.assertEqual(index.positions(1), [0, 3, 6])
+        self.assertEqual(index.count(jscore.Null), 1)
+        self.assertRaises(ValueError, index.index, 'b')
+
+    def testBuildIndexSnapshot(self):
+        index = self.seq.buildIndex()
+        self.seq.append('b')
+        self.assertFalse('b' in index)
+        self.assertTrue('b' in self.seq.buildIndex())
+
+
+class MappingViewTestCase(TestCaseWithContext):
+    """Use the keys, values and items views of JavaScript objects."""
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+        self.obj = self.ctx.evaluateScript("""
+          ({a: 1, b: 'x', c: undefined})
+          """)
+
+    def testKeys(self):
+        keys = self.obj.keys()
+        self.assertEqual(len(keys), 3)
+        self.assertEqual(sorted(keys), ['a', 'b', 'c'])
+        self.assertTrue('a' in keys)
+        self.assertFalse('d' in keys)
+
+    def testValues(self):
+        values = self.obj.values()
+        self.assertEqual(len(values), 3)
+        self.assertEqual(sorted(values, key=repr), [1, None, 'x'])
+        self.assertTrue('x' in values)
+        self.assertFalse(2 in values)
+
+    def testItems(self):
+        items = self.obj.items()
+        self.assertEqual(dict(items), {'a': 1, 'b': 'x', 'c': None})
+        self.assertTrue(('a', 1) in items)
+        self.assertFalse(('a', 2) in items)
+
+    def testKeysEquality(self):
+        keys = self.obj.keys()
+        self.assertTrue(keys == {'a', 'b', 'c'})
+        self.assertTrue({'a', 'b', 'c'} == keys)
+        self.assertTrue(keys != {'a', 'b'})
+        self.assertTrue(keys == {'a': 0, 'b': 0, 'c': 0}.keys())
+        self.assertTrue(keys > {'a'})
+        self.assertTrue(keys <= {'a', 'b', 'c', 'd'})
+        self.assertFalse(keys < {'a', 'b', 'c'})
+
+    def testKeysSetOperations(self):
+        keys = self.obj.keys()
+        self.assertEqual(keys & {'a', 'd'}, {'a'})
+        self.assertEqual({'a', 'd'} & keys, {'a'})
+        self.assertEqual(keys | ['d'], {'a', 'b', 'c', 'd'})
+        self.assertEqual(keys - {'a'}, {'b', 'c'})
+        self.assertEqual({'a', 'd'} - keys, {'d'})
+        self.assertEqual(keys ^ {'a', 'd'}, {'b', 'c', 'd'})
+        self.assertTrue(keys.isdisjoint(['d', 'e']))
+        self.assertFalse(keys.isdisjoint(['a']))
+
+    def testItemsSetOperations(self):
+        items = self.obj.items()
+        self.assertTrue(items == {('a', 1), ('b', 'x'), ('c', None)})
+        self.assertEqual(items & {('a', 1), ('b', 'y')}, {('a', 1)})
+        self.assertEqual(items - {('a', 1), ('b', 'x')}, {('c', None)})
+
+    def testSnapshot(self):
+        keys = self.obj.keys()
+        self.obj.d = 4
+        self.assertEqual(len(keys), 3)
+        self.assertEqual(len(self.obj), 4)
+        self.assertEqual(len(self.obj.keys()), 4)
+
+    def testReiterate(self):
+        items = self.obj.items()
+        self.assertEqual(list(items), list(items))
+
+    def testABC(self):
+        import collections.abc
+        self.assertTrue(isinstance(self.obj.keys(), collections.abc.KeysView))
+        self.assertTrue(isinstance(self.obj.items(),
+                                   collections.abc.ItemsView))
+
+
+class JSConverterTestCase(TestCaseWithContext):
+    """Convert JavaScript objects with custom converters."""
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+        jscore.registerJSConverter('Date', lambda d: d.getTime())
+
+    def tearDown(self):
+        jscore.registerJSConverter('Date', None)
+        TestCaseWithContext.tearDown(self)
+
+    def testConverted(self):
+        self.assertEqual(self.ctx.evaluateScript('new Date(5000)'), 5000)
+
+    def testSubclass(self):
+        self.assertEqual(self.ctx.evaluateScript("""
+          class MyDate extends Date {};
+          new MyDate(7000)
+          """), 7000)
+
+    def testOtherObjects(self):
+        obj = self.ctx.evaluateScript('({a: new Date(1)})')
+        self.assertEqual(obj.a, 1)
+        self.assertEqual(obj.toDict(), {'a': 1})
+
+    def testDotted(self):
+        jscore.registerJSConverter('ns.Point', lambda p: (p.x, p.y))
+        try:
+            self.assertEqual(self.ctx.evaluateScript("""
+              var ns = {Point: function (x, y) { this.x = x; this.y = y; }};
+              new ns.Point(1, 2)
+              """), (1, 2))
+        finally:
+            jscore.registerJSConverter('ns.Point', None)
+
+    def testUnregister(self):
+        jscore.registerJSConverter('Date', None)
+        date = self.ctx.evaluateScript('new Date(5000)')
+        self.assertEqual(date.getTime(), 5000)
+
+    def testContextCycle(self):
+        # The converter closes over the context and a wrapper, which
+        # makes a reference cycle through the context.
+        ctx = jscore.JSContext()
+        wrapper = ctx.evaluateScript('({a: 1})')
+        jscore.registerJSConverter('Date', lambda d: (ctx, wrapper))
+        ctx.evaluateScript('new Date(0)')
+        del ctx, wrapper
+        gc.collect()
+        self.assertEqual(self.ctx.evaluateScript('({b: 2})').b, 2)
+
+
+class ScopeTestCase(TestCaseWithContext):
+    """Test scopes for temporary wrappers."""
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+        self.obj = self.ctx.evaluateScript("""
+          ({items: [{a: 1}, {a: 2}, {a: 3}]})
+          """)
+
+    def testTemporary(self):
+        total = 0
+        with self.ctx.scope():
+            for item in asSeq(self.obj.items):
+                total += item.a
+        self.assertEqual(total, 6)
+
+    def testEscape(self):
+        with self.ctx.scope():
+            item = asSeq(self.obj.items)[1]
+        self.ctx.evaluateScript('obj = null; for (var i = 0; i < 1000; i++) '
+                                '{ [{}, {}]; }')
+        self.assertEqual(item.a, 2)
+        self.assertEqual(item.toDict(), {'a': 2})
+
+    def testNested(self):
+        with self.ctx.scope():
+            with self.ctx.scope():
+                item = asSeq(self.obj.items)[0]
+            self.assertEqual(item.a, 1)
+        self.assertEqual(item.a, 1)
+
+    def testCached(self):
+        with self.ctx.scope():
+            items = self.obj.items
+            self.assertTrue(self.obj.items is items)
+        self.assertTrue(self.obj.items is items)
+
+    def testException(self):
+        def f():
+            with self.ctx.scope():
+                self.obj.items
+                raise KeyError
+        self.assertRaises(KeyError, f)
+        self.assertEqual(self.ctx.evaluateScript('1 + 1'), 2)
+
+    def testReenter(self):
+        scope = self.ctx.scope()
+        with scope:
+            self.assertRaises(RuntimeError, scope.__enter__)
+
+
+class AwaitTestCase(TestCaseWithContext):
+    """Await JavaScript promises from Python coroutines."""
+
+    def awaitJS(self, jsExpr):
+        async def main():
+            return await self.ctx.evaluateScript(jsExpr)
+
+        return asyncio.run(main())
+
+    def testResolved(self):
+        self.assertEqual(self.awaitJS('Promise.resolve(42)'), 42)
+
+    def testChained(self):
+        self.assertEqual(self.awaitJS('Promise.resolve(1)'
+                                      '    .then(function (x) {'
+                                      '        return x + 1;'
+                                      '    })'), 2)
+
+    def testPending(self):
+        self.ctx.evaluateScript("""
+            var resolveIt;
+            var p = new Promise(function (resolve) { resolveIt = resolve; });
+            """)
+
+        async def main():
+            task = asyncio.ensure_future(self.ctx.globalObject.p)
+            await asyncio.sleep(0)
+            self.assertFalse(task.done())
+            self.ctx.evaluateScript('resolveIt("done")')
+            return await task
+
+        self.assertEqual(asyncio.run(main()), 'done')
+
+    def testRejected(self):
+        try:
+            self.awaitJS('Promise.reject(new TypeError("bad"))')
+        except jscore.JSException as e:
+            self.assertEqual(e.name, 'TypeError')
+            self.assertEqual(e.message, 'bad')
+        else:
+            self.fail("JSException not raised")
+
+    def testThenable(self):
+        self.assertEqual(self.awaitJS('({then: function (resolve) {'
+                                      '    resolve(7);'
+                                      '}})'), 7)
+
+    def testNotAwaitable(self):
+        self.assertRaises(TypeError, self.awaitJS, '({})')
+
+
+class AsyncEvaluationTestCase(unittest.TestCase):
+    """Run JavaScript code in the worker thread of a context."""
+
+    def setUp(self):
+        self.ctx = jscore.JSContext(releaseGIL=True)
+
+    def tearDown(self):
+        del self.ctx
+
+    def testEvaluateScript(self):
+        future = self.ctx.evaluateScriptAsync('1 + 2')
+        self.assertEqual(future.result(), 3)
+
+    def testException(self):
+        future = self.ctx.evaluateScriptAsync('throw new Error("bad")')
+        self.assertRaises(jscore.JSException, future.result)
+
+    def testWorkerThread(self):
+        self.ctx.globalObject.threadName = \
+            lambda: threading.current_thread().name
+        name = self.ctx.evaluateScriptAsync('threadName()').result()
+        self.assertNotEqual(name, threading.current_thread().name)
+        self.assertEqual(
+            self.ctx.evaluateScriptAsync('threadName()').result(), name)
+
+    def testConcurrentFirstCalls(self):
+        self.ctx.globalObject.threadName = \
+            lambda: threading.current_thread().name
+        futures = queue.Queue()
+
+        def submit():
+            futures.put(self.ctx.evaluateScriptAsync('threadName()'))
+
+        threads = [threading.Thread(target=submit) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        names = set(futures.get().result() for i in range(8))
+        self.assertEqual(len(names), 1)
+
+    def testOrder(self):
+        self.ctx.evaluateScript('var log = []')
+        futures = [self.ctx.evaluateScriptAsync('log.push(%d)' % i)
+                   for i in range(10)]
+        for future in futures:
+            future.result()
+        self.assertEqual(self.ctx.evaluateScript('log.join()'),
+                         '0,1,2,3,4,5,6,7,8,9')
+
+    def testCallAsync(self):
+        f = self.ctx.evaluateScript('(function (x) { return x * 2; })')
+        self.assertEqual(f.callAsync(21).result(), 42)
+
+    def testMethodCallAsync(self):
+        obj = self.ctx.evaluateScript('({n: 5, get: function (x) {'
+                                      '    return this.n + x;'
+                                      '}})')
+        self.assertEqual(obj.get.callAsync(1).result(), 6)
+
+    def testAwait(self):
+        async def main():
+            return await asyncio.wrap_future(
+                self.ctx.evaluateScriptAsync('6 * 7'))
+
+        self.assertEqual(asyncio.run(main()), 42)
+
+    def testLoopRuns(self):
+        async def tick(done):
+            ticks = 0
+            while not done.done():
+                ticks += 1
+                await asyncio.sleep(0)
+            return ticks
+
+        async def main():
+            done = asyncio.wrap_future(self.ctx.evaluateScriptAsync(
+                'var t = Date.now(); while (Date.now() - t < 200) {}'))
+            ticks = await tick(done)
+            await done
+            return ticks
+
+        self.assertGreater(asyncio.run(main()), 1)
+
+    def testHoldsGIL(self):
+        ctx = jscore.JSContext()
+        self.assertRaises(ValueError, ctx.evaluateScriptAsync, '1')
+        f = ctx.evaluateScript('(function () {})')
+        self.assertRaises(ValueError, f.callAsync)
@@ -19,6 +19,8 @@
 # Boston, MA 02111-1307, USA. 
 
 import unittest
+import array
+import asyncio
 
 import javascriptcore as jscore
 from javascriptcore import asSeq
@@ -62,6 +64,20 @@ class WrapUnwrapTestCase(TestCaseWithContext):
         self.ctx.globalObject.obj2 = (self.obj, 4)
         self.assertTrueJS('obj === obj2[0]')
 
+    def testSeveralContexts(self):
+        ctx2 = jscore.JSContext()
+        self.ctx.globalObject.obj = self.obj
+        ctx2.globalObject.obj = self.obj
+        self.assertTrue(ctx2.evaluateScript('obj') is self.obj)
+        self.assertEqual(ctx2.cachedStats()['wrappedPyObjsCount'], 1)
+
+    def testCachedStats(self):
+        count = self.ctx.cachedStats()['wrappedPyObjsCount']
+        self.ctx.globalObject.obj = self.obj
+        self.ctx.globalObject.obj2 = self.obj
+        self.assertEqual(self.ctx.cachedStats()['wrappedPyObjsCount'],
+                         count + 1)
+
 
 class NullUndefTestCase(TestCaseWithContext):
     """Access JavaScript's null and undefined values."""
@@ -315,6 +331,72 @@ class ListAccessTestCase(TestCaseWithContext):
     def testDel4(self):
         self.evalJS('delete obj[8]')
 
+    def testNonIndexNames(self):
+        self.assertTrueJS("obj['01'] === undefined")
+        self.assertTrueJS("obj['+1'] === undefined")
+        self.assertTrueJS("obj[' 1'] === undefined")
+        self.assertTrueJS("obj['4294967295'] === undefined")
+        self.assertTrueJS("!('01' in obj)")
+
+    def testIn(self):
+        self.assertTrueJS("'0' in obj")
+        self.assertTrueJS("4 in obj")
+        self.assertTrueJS("!(5 in obj)")
+
+    def testLoop(self):
+        self.assertEqualJS('var s = 0; '
+                           'for (var i = 0; i < obj.length; i++) '
+                           '    s += obj[i]; '
+                           's', 165)
+
+    def testTuple(self):
+        self.ctx.globalObject.tup = (11, 22, 33)
+        self.assertEqualJS('tup[2]', 33)
+        self.assertTrueJS('tup[3] === undefined')
+        self.assertTrueJS("2 in tup && !(3 in tup)")
+
+
+class ArrayMethodsTestCase(TestCaseWithContext):
+    """Use array methods and iteration on Python sequences from
+    JavaScript."""
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+        self.ctx.globalObject.obj = [11, 22, 33, 44, 55]
+
+    def testArrayMethods(self):
+        self.assertEqualJS("obj.map(function (x) { return x + 1; })"
+                           "   .join(',')", '12,23,34,45,56')
+        self.assertEqualJS("obj.indexOf(33)", 2)
+        self.assertEqualJS("obj.reduce(function (a, b) { return a + b; })",
+                           165)
+        self.assertTrueJS("obj instanceof Array")
+
+    def testToArray(self):
+        self.assertTrueJS("Array.isArray(obj.toArray())")
+        self.assertEqualJS("obj.toArray().join(',')", '11,22,33,44,55')
+        self.assertEqualJS("obj.toArray(1, 3).join(',')", '22,33')
+
+    def testSlice(self):
+        self.assertEqualJS("obj.slice(-2).join(',')", '44,55')
+        self.assertEqualJS("obj.slice(3, 1).length", 0)
+        self.assertEqualJS("obj.slice(NaN, 2).join(',')", '11,22')
+
+    def testIteration(self):
+        self.assertEqualJS("var s = 0; for (var x of obj) s += x; s", 165)
+        self.assertEqualJS("[...obj].length", 5)
+
+    def testTuple(self):
+        self.ctx.globalObject.tup = (1, 2, 3)
+        self.assertEqualJS("Array.from(tup).join(',')", '1,2,3')
+
+    def testNotEnumerable(self):
+        self.assertEqualJS("Object.keys(Object.getPrototypeOf(obj)).length",
+                           0)
+
+    def testIncompatible(self):
+        self.assertRaisesJS("obj.toArray.call({})")
+
 
 class FunctionCallTestCase(TestCaseWithContext):
     """Call Python functions from JavaScript."""
@@ -361,3 +443,281 @@ class FunctionCallTestCase(TestCaseWithContext):
             self.fail("No exception raised")
         except jscore.JSException as e:
             self.assertEqual(str(e), '-*Message*-')
+
+
+class BufferTestCase(TestCaseWithContext):
+    """Access Python objects supporting the buffer protocol from
+    JavaScript as typed arrays."""
+
+    def testBytes(self):
+        self.ctx.globalObject.b = b'\x01\x02\xff'
+        self.assertTrueJS('b instanceof Uint8Array')
+        self.assertEqualJS('b.length', 3)
+        self.assertEqualJS('b[2]', 255)
+
+    def testBytesCopied(self):
+        data = b'\x01'
+        self.ctx.globalObject.b = data
+        self.ctx.evaluateScript('b[0] = 7')
+        self.assertEqual(data, b'\x01')
+
+    def testByteArrayShared(self):
+        data = bytearray(b'\x01\x02')
+        self.ctx.globalObject.b = data
+        self.ctx.evaluateScript('b[0] = 7')
+        self.assertEqual(data, bytearray(b'\x07\x02'))
+
+    def testArray(self):
+        data = array.array('d', [1.5, 2.5])
+        self.ctx.globalObject.a = data
+        self.assertTrueJS('a instanceof Float64Array')
+        self.ctx.evaluateScript('a[1] = a[0] * 2')
+        self.assertEqual(data[1], 3.0)
+
+    def testIntArray(self):
+        self.ctx.globalObject.a = array.array('h', [-1, 2])
+        self.assertTrueJS('a instanceof Int16Array')
+        self.assertEqualJS('a[0]', -1)
+
+    def testNonContiguous(self):
+        view = memoryview(bytearray(b'abcd'))[::2]
+        self.ctx.globalObject.v = view
+        self.assertTrueJS('!(v instanceof Uint8Array)')
+
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class Point3D(Point):
+    pass
+
+
+class ConverterTestCase(TestCaseWithContext):
+    """Convert Python objects with custom converters."""
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+        jscore.registerConverter(Point, lambda ctx, p: [p.x, p.y])
+
+    def tearDown(self):
+        jscore.registerConverter(Point, None)
+        TestCaseWithContext.tearDown(self)
+
+    def testConverted(self):
+        self.ctx.globalObject.p = Point(1, 2)
+        self.assertEqualJS('p.length', 2)
+        self.assertEqualJS('p[1]', 2)
+
+    def testSubclass(self):
+        self.ctx.globalObject.p = Point3D(3, 4)
+        self.assertEqualJS('p[0]', 3)
+
+    def testUnregister(self):
+        jscore.registerConverter(Point, None)
+        self.ctx.globalObject.p = Point(1, 2)
+        self.assertEqualJS('p.x', 1)
+        self.assertEqualJS('p.length', None)
+
+    def testBuiltin(self):
+        self.assertRaises(TypeError, jscore.registerConverter, int, str)
+        self.assertRaises(TypeError, jscore.registerConverter, 'x', str)
+
+
+class TypeDispatchTestCase(TestCaseWithContext):
+    """Test conversion of builtin values and their subclasses."""
+
+    def testIntSubclass(self):
+        class MyInt(int):
+            pass
+        self.ctx.globalObject.n = MyInt(5)
+        self.assertEqualJS('typeof n', 'number')
+        self.assertEqualJS('n + 1', 6)
+
+    def testStrSubclass(self):
+        class MyStr(str):
+            pass
+        self.ctx.globalObject.s = MyStr('abc')
+        self.assertEqualJS('typeof s', 'string')
+
+    def testWrapperClasses(self):
+        self.ctx.globalObject.l = [1, 2]
+        self.ctx.globalObject.d = {'a': 1}
+        self.assertEqualJS('l.length', 2)
+        self.assertEqualJS('d.a', 1)
+
+
+class Counter(object):
+    def __init__(self):
+        self.count = 0
+        self.step = 1
+
+    def increment(self, n=1):
+        self.count += n * self.step
+        return self.count
+
+    @property
+    def double(self):
+        return 2 * self.count
+
+    @staticmethod
+    def helper():
+        return 'static'
+
+
+class StepCounter(Counter):
+    def increment(self, n=1):
+        return Counter.increment(self, 10 * n)
+
+
+class Registry(dict):
+    def total(self):
+        return sum(self.values())
+
+
+class Stack(list):
+    def top(self):
+        return self[-1]
+
+
+class ExposeClassTestCase(TestCaseWithContext):
+    """Access Python objects of exposed classes from JavaScript."""
+
+    @classmethod
+    def setUpClass(cls):
+        jscore.exposeClass(Counter, properties=['double', 'step'])
+        jscore.exposeClass(Registry, methods=['total'])
+        jscore.exposeClass(Stack, methods=['top'])
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+        self.obj = Counter()
+        self.ctx.globalObject.c = self.obj
+
+    def testCall(self):
+        self.assertEqualJS('c.increment()', 1)
+        self.assertEqualJS('c.increment(2)', 3)
+        self.assertEqual(self.obj.count, 3)
+
+    def testSameFunction(self):
+        self.assertTrueJS('c.increment === c.increment')
+
+    def testDetachedCall(self):
+        self.assertRaisesJS('c.increment.call({})')
+
+    def testOtherClassCall(self):
+        self.ctx.globalObject.r = Registry(a=1)
+        self.assertEqualJS('r.total()', 1)
+        self.assertRaisesJS('c.increment.call(r)')
+
+    def testSequence(self):
+        self.ctx.globalObject.s = Stack([1, 2, 3])
+        self.assertEqualJS('s.top()', 3)
+        self.assertEqualJS('s[0]', 1)
+        self.assertEqualJS('s.map(function (x) { return x * 2; }).join()',
+                           '2,4,6')
+        self.assertEqualJS('[...s].length', 3)
+
+    def testRenamedFunction(self):
+        self.ctx.evaluateScript("""
+            Object.defineProperty(c.increment, 'name', {value: 'total'});
+            """)
+        self.assertEqualJS('c.increment()', 1)
+
+    def testSeveralContexts(self):
+        ctx2 = jscore.JSContext()
+        ctx2.globalObject.c = self.obj
+        self.assertEqual(ctx2.evaluateScript('c.increment()'), 1)
+        self.assertEqualJS('c.increment()', 2)
+
+    def testProperties(self):
+        self.ctx.evaluateScript('c.increment(); c.step = 5; c.increment()')
+        self.assertEqual(self.obj.count, 6)
+        self.assertEqualJS('c.double', 12)
+
+    def testOtherAttributes(self):
+        self.assertEqualJS('c.count', 0)
+        self.assertEqualJS('c.helper()', 'static')
+
+    def testSubclass(self):
+        self.ctx.globalObject.s = StepCounter()
+        self.assertEqualJS('s.increment()', 10)
+
+    def testExplicitMethods(self):
+        self.assertRaises(TypeError, jscore.exposeClass, Counter,
+                          methods=['double'])
+
+    def testExposeTwice(self):
+        self.assertRaises(ValueError, jscore.exposeClass, Counter)
+
+    def testSameMappingFunction(self):
+        self.ctx.globalObject.r = Registry(a=1)
+        self.assertTrueJS('r.total === r.total')
+        self.assertTrueJS('!r.hasOwnProperty("total")')
+
+    def testCopy(self):
+        self.assertTrue(self.ctx.fromPython(self.obj) is self.obj)
+        self.ctx.globalObject.o = self.ctx.fromPython(Registry(a=1, b=2))
+        self.assertTrueJS('!Array.isArray(o)')
+        self.assertEqualJS('o.a + o.b', 3)
+
+
+class CoroutineTestCase(TestCaseWithContext):
+    """Call Python coroutine functions from JavaScript."""
+
+    def setUp(self):
+        TestCaseWithContext.setUp(self)
+
+        async def double(x):
+            await asyncio.sleep(0)
+            return 2 * x
+
+        async def fail(message):
+            await asyncio.sleep(0)
+            raise ValueError(message)
+
+        self.ctx.globalObject.double = double
+        self.ctx.globalObject.fail = fail
+
+    def awaitJS(self, jsExpr):
+        async def main():
+            return await self.ctx.evaluateScript(jsExpr)
+
+        return asyncio.run(main())
+
+    def testPromise(self):
+        async def main():
+            return self.ctx.evaluateScript('double(1) instanceof Promise')
+
+        self.assertTrue(asyncio.run(main()))
+
+    def testResult(self):
+        self.assertEqual(self.awaitJS('double(21).then(function (x) {'
+                                      '    return x + 1;'
+                                      '})'), 43)
+
+    def testAsyncFunction(self):
+        self.assertEqual(self.awaitJS('(async function () {'
+                                      '    return await double(2) +'
+                                      '        await double(3);'
+                                      '})()'), 10)
+
+    def testError(self):
+        self.assertEqual(self.awaitJS('fail("bad").catch(function (e) {'
+                                      '    return e.message;'
+                                      '})'), 'bad')
+
+    def testFuture(self):
+        async def main():
+            future = asyncio.get_running_loop().create_future()
+            self.ctx.globalObject.future = future
+            promise = self.ctx.evaluateScript('future')
+            future.set_result('done')
+            return await promise
+
+        self.assertEqual(asyncio.run(main()), 'done')
+
+    def testNoEventLoop(self):
+        self.assertRaisesJS('double(1)')